@@ -19,7 +19,10 @@ Currently supported are:
   * ssh
 """
 
-from .fs import URI, FileSystem, BaseUri, RevisionedFileSystem, RevisionedUri
+import importlib
+
+from .fs import (URI, FileSystem, BaseUri, RevisionedFileSystem, RevisionedUri,
+                 intern_uri)
 from .misc import WorkingDirectory
 from .exceptions import *
 
@@ -28,5 +31,30 @@ from abl.util import NullHandler
 
 logging.getLogger("abl.vpath").addHandler(NullHandler())
 
-from . import _version
-__version__ = _version.get_versions()['version']
+
+# the rest of the public classes, imported on first access
+_LAZY_ATTRIBUTES = {
+    'ConnectionPool': '.pool',
+    'CopyReport': '.transfer',
+    'DirEntry': '.direntry',
+    'URIArray': '.uriarray',
+    }
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is not None:
+        value = getattr(importlib.import_module(module, __name__), name)
+        globals()[name] = value
+        return value
+    # resolving the version can run git, so it only happens on demand
+    if name == '__version__':
+        try:
+            # written by setuptools-scm when the package is built
+            from abl.vpath._version import version
+        except ImportError:
+            from . import _version
+            version = _version.get_versions()['version']
+        globals()['__version__'] = version
+        return version
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
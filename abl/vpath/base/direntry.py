@@ -0,0 +1,119 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+direntry.py contains the DirEntry class, the entries FileSystem.scandir
+and FileSystem.walk_entries yield.
+"""
+
+import datetime
+
+
+FILE = 'file'
+DIR = 'dir'
+LINK = 'link'
+OTHER = 'other'
+
+
+class DirEntry(object):
+    """
+    DirEntry: one entry of a directory, carrying what the backend knew
+    about it when listing the directory (like os.DirEntry).
+
+    'kind' is the type of the entry itself. is_dir() and is_file()
+    follow symbolic links (unless told otherwise), so that a link to a
+    directory is walked like a directory. size, mtime and mode are those
+    info() reports for the path (following links); backends fill them in
+    while listing where they come for free, otherwise they are looked up
+    on first access.
+
+    @type parent: BaseUri
+    @ivar parent: the directory the entry was found in
+
+    @type name: str
+    @ivar name: the name of the entry
+
+    @type kind: str
+    @ivar kind: FILE, DIR, LINK or OTHER
+
+    @type target_kind: str|None
+    @ivar target_kind: for links, the kind of the link target (None for
+                       broken links); for other entries the same as kind
+    """
+
+    __slots__ = ('parent', 'name', 'kind', 'target_kind',
+                 '_size', '_mtime', '_mode')
+
+    def __init__(self, parent, name, kind, target_kind=None,
+                 size=None, mtime=None, mode=None):
+        if target_kind is None and kind != LINK:
+            target_kind = kind
+        self.parent = parent
+        self.name = name
+        self.kind = kind
+        self.target_kind = target_kind
+        self._size = size
+        self._mtime = mtime
+        self._mode = mode
+
+
+    def __repr__(self):
+        return '<%s %s %s>' % (self.__class__.__name__, self.kind, self.name)
+
+
+    @property
+    def path(self):
+        "path: the URI of the entry"
+        return self.parent / self.name
+
+
+    def is_dir(self, follow_symlinks=True):
+        kind = self.target_kind if follow_symlinks else self.kind
+        return kind == DIR
+
+
+    def is_file(self, follow_symlinks=True):
+        kind = self.target_kind if follow_symlinks else self.kind
+        return kind == FILE
+
+
+    def is_symlink(self):
+        return self.kind == LINK
+
+
+    def _load(self):
+        """
+        _load: look up size, mtime and mode; for backends that do not
+        know them while listing a directory.
+        """
+        info = self.path.info()
+        mtime = info.mtime
+        if isinstance(mtime, datetime.datetime):
+            mtime = mtime.timestamp()
+        self._size = info.size
+        self._mtime = mtime
+        self._mode = info.mode
+
+
+    @property
+    def size(self):
+        "size: the size in bytes"
+        if self._size is None:
+            self._load()
+        return self._size
+
+
+    @property
+    def mtime(self):
+        "mtime: the time of the last modification, in seconds since the epoch"
+        if self._mtime is None:
+            self._load()
+        return self._mtime
+
+
+    @property
+    def mode(self):
+        "mode: the permission bits and type, like os.stat().st_mode"
+        if self._mode is None:
+            self._load()
+        return self._mode
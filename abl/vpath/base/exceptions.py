@@ -33,3 +33,26 @@ class RemoteConnectionTimeout(PathError):
 class OperationIsNotSupportedOnPlatform(PathError):
     "This operation is not supported on this platform"
 
+
+
+class ConnectionPoolTimeout(PathError):
+    "No connection of a connection pool became available in time"
+
+
+class SymlinkLoopError(PathError):
+    "A walk reached a directory a second time through symbolic links"
+
+
+class CopyError(PathError):
+    "Some files of a parallel copy could not be copied"
+
+    def __init__(self, report):
+        source, dest, error = report.errors[0]
+        super(CopyError, self).__init__(
+            "%d of the copies failed, the first %s to %s: %s"
+            % (len(report.errors), source, dest, error))
+        self.report = report
+
+
+class ChecksumError(PathError):
+    "A chunk of a copied file reads back differently from the original"
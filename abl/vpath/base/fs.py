@@ -1,8 +1,11 @@
 import atexit
-from collections import defaultdict
+from collections import deque
 import fnmatch
+from functools import wraps
 import hashlib
-from importlib.metadata import entry_points
+import heapq
+import itertools
+import importlib
 import os
 import stat
 import re
@@ -10,25 +13,58 @@ import shutil
 import threading
 import time
 import traceback
+import weakref
+from types import GeneratorType
 
-from decorator import decorator
-from .simpleuri import UriParse, uri_from_parts
+from .direntry import DirEntry, FILE, DIR, LINK, OTHER
+from .pool import ConnectionPool
+from .simpleuri import UriParse, uri_from_parts, EMPTY_QUERY
 from .exceptions import (NoSchemeError,
                          FileDoesNotExistError,
-                         OperationIsNotSupportedOnPlatform)
+                         OperationIsNotSupportedOnPlatform,
+                         SymlinkLoopError)
 
 
 class ConnectionRegistry(object):
     """
     ConnectionRegistry: Singleton for file system backend registry
 
-    Not ready for multithreaded code yet!!!
-
     Any backend must register itself (or must be registered).
     The URI object will ask the registry for the backend to use.
 
+    The registry can be used from several threads: looking up an
+    existing connection takes no lock, and a missing connection is
+    created exactly once even if many threads ask for it at the same
+    time (creating connections for different keys does not block each
+    other). While a backend method runs, the URI holds a lease on the
+    connection, and cleanup() never closes a leased connection unless
+    forced to.
+
+    Keys can be configured to use a ConnectionPool (see configure_pool),
+    so that threads working with the same host and user do not all
+    share one connection.
+
     @type connections: dict
-    @ivar connections: holds all open connections
+    @ivar connections: holds all open connections (or connection pools)
+
+    @type pool_configs: dict
+    @ivar pool_configs: key is (scheme, hostname), hostname None applying
+                        to all hosts of scheme;
+                        value are the ConnectionPool arguments
+
+    @type generation: int
+    @ivar generation: incremented whenever connections are removed or
+                      replaced, or a scheme is (re-)registered. URIs
+                      keep the connection they looked up together with
+                      the generation and only look it up again when the
+                      generation has changed.
+
+    @type lookups: int
+    @ivar lookups: number of connection lookups (calls of get_connection)
+
+    @type creation_locks: dict
+    @ivar creation_locks: key is a connection key;
+                          value is the lock held while creating it
 
     @type schemes: dict
     @ivar schemes: key is a scheme;
@@ -39,14 +75,20 @@ class ConnectionRegistry(object):
                             should run, or not (shut down)
 
     @type clean_interval: int
-    @ivar clean_interval: run the cleaning session every
-                          <clean_interval> seconds
+    @ivar clean_interval: look at a connection that is due but still in
+                          use again after <clean_interval> seconds
     @type clean_timeout: int
     @ivar clean_timeout: close an open backend session after
                          <clean_timeout> seconds and remove
                          it.
-    @type cleaner_thread: threading.Thread
-    @ivar cleaner_thread: thread do run the cleaner method.
+    @type clock: callable
+    @ivar clock: returns the current time; tests can replace it
+
+    @type cleaner_thread: threading.Thread|None
+    @ivar cleaner_thread: thread to run the scheduler. It is started
+                          when the first connection of an 'evictable'
+                          backend is created and sleeps until the next
+                          connection is due (see run_due).
 
     @type creation_queue: Queue.Queue
     @ivar creation_queue: queue for creating connections
@@ -62,21 +104,128 @@ class ConnectionRegistry(object):
     """
 
     def __init__(self, clean_interval=300, clean_timeout=1800):
-        self.connections = {}
+        self.generation = 0
+        self.lookups = 0
+        self._lock = threading.Lock()
+        self._connections = {}
+        self.pool_configs = {}
         self.schemes = {}
         self.run_clean_thread = True
         self.clean_interval = clean_interval
         self.clean_timeout = clean_timeout
-        self.cleaner_thread = threading.Thread(target=self.cleaner)
-        self.cleaner_thread.setDaemon(True)
-        self.cleaner_thread.start()
-        self.creation_locks = defaultdict(threading.Lock)
+        self.clock = time.time
+        self.cleaner_thread = None
+        self.creation_locks = {}
+        self._plugin_lock = threading.RLock()
+        self._entry_points = None
+        self._legacy_plugins_loaded = False
+        # entries are (due time, sequence number, key, weakref to the
+        # connection); the sequence number keeps keys from being compared
+        self._schedule = []
+        self._sequence = itertools.count()
+        self._schedule_condition = threading.Condition(threading.Lock())
+
+
+    def _now(self):
+        # connections refresh their last_used with this, so that they
+        # follow a replaced clock
+        return self.clock()
+
+
+    def _get_connections(self):
+        return self._connections
+
+
+    def _set_connections(self, connections):
+        with self._lock:
+            self._connections = connections
+            self.generation += 1
+
+
+    connections = property(_get_connections, _set_connections)
 
 
     def create(self, scheme, key, extras):
-        with self.creation_locks[scheme]:
-            conn = self.schemes[scheme](*key[1:-1], **extras)
-            self.connections[key] = conn
+        """
+        create: create the connection for key, unless another thread
+        has done so in the meantime, and return it.
+        """
+        with self._lock:
+            creation_lock = self.creation_locks.get(key)
+            if creation_lock is None:
+                creation_lock = self.creation_locks[key] = threading.Lock()
+        with creation_lock:
+            conn = self._connections.get(key)
+            if conn is None:
+                factory = self.schemes[scheme]
+                config = self.pool_configs.get((scheme, key[1]),
+                                               self.pool_configs.get((scheme, None)))
+                evictable = getattr(factory, 'evictable', True)
+                if config is None:
+                    conn = factory(*key[1:-1], **extras)
+                    conn._clock = self._now
+                    conn.last_used = self.clock()
+                    due = conn.last_used + self.clean_timeout
+                else:
+                    config = dict(config)
+                    if config.get('max_idle') is None:
+                        config['max_idle'] = self.clean_timeout
+                    conn = ConnectionPool(
+                        lambda: factory(*key[1:-1], **extras),
+                        shareable=getattr(factory, 'shareable', True),
+                        clock=lambda: self.clock(),
+                        **config
+                        )
+                    due = self.clock() + conn.max_idle
+                self._connections[key] = conn
+                if evictable:
+                    self._schedule_check(due, key, conn)
+        return conn
+
+
+    def configure_pool(self, scheme, hostname=None, min_size=0, max_size=4,
+                       max_idle=None, timeout=None):
+        """
+        configure_pool: use a ConnectionPool for the connections to
+        hostname (or, if hostname is None, all hosts) with scheme.
+
+        Only connections created after this call are pooled; use
+        cleanup(force=True) to start over with existing ones.
+
+        @type min_size: int
+        @param min_size: connections opened up front and kept open
+
+        @type max_size: int
+        @param max_size: maximal number of connections per key
+
+        @type max_idle: float|None
+        @param max_idle: close idle connections after this many seconds
+                         (default: clean_timeout)
+
+        @type timeout: float|None
+        @param timeout: seconds to wait for a connection of a backend
+                        that is not shareable; None waits forever
+        """
+        with self._lock:
+            self.pool_configs[(scheme, hostname)] = dict(
+                min_size=min_size,
+                max_size=max_size,
+                max_idle=max_idle,
+                timeout=timeout,
+                )
+
+
+    def pool_stats(self):
+        """
+        pool_stats: the state of all connection pools
+
+        @rtype: dict
+        @return: key is (scheme, hostname, port, username);
+                 value is the ConnectionPool.stats() of the pool
+        """
+        return dict((key[:4], conn.stats())
+                    for key, conn in list(self._connections.items())
+                    if isinstance(conn, ConnectionPool))
 
 
     def get_connection(self,
@@ -112,9 +261,10 @@ class ConnectionRegistry(object):
         A key is calculated from given parameters. This key is used
         to check for existing connection.
         """
-        if scheme not in self.schemes:
+        self.lookups += 1
+        if scheme not in self.schemes and not self.load_plugin(scheme):
             raise NoSchemeError(
-                'There is no handler registered for "{}" (available: {})'.format(scheme, list(self.schemes.keys()))
+                'There is no handler registered for "{}" (available: {})'.format(scheme, sorted(set(self.schemes) | set(BUILTIN_PLUGINS)))
                 )
         key = (
             scheme,
@@ -126,59 +276,258 @@ class ConnectionRegistry(object):
             frozenset(extras.items())
             )
 
-        if not key in self.connections:
-            self.create(scheme, key, extras)
-        return self.connections[key]
+        conn = self._connections.get(key)
+        if conn is None:
+            conn = self.create(scheme, key, extras)
+        return conn
+
+
+    def _expire(self, key, conn, now, force):
+        """
+        _expire: remove conn from the connections if it has not been used
+        for clean_timeout seconds and is not leased, or if 'force' is
+        set; connection pools only close their idle connections (unless
+        forced). Must be called with _lock held.
+
+        @rtype: bool
+        @return: True if conn has been removed and must be closed
+        """
+        if isinstance(conn, ConnectionPool):
+            if force:
+                del self._connections[key]
+                return True
+            # the pool stays, only its idle connections go
+            for pooled in conn.prune():
+                pooled.close()
+            return False
+        if force or (conn.evictable and
+                     now - conn.last_used >= self.clean_timeout):
+            # mark the connection before looking at the leases:
+            # a lease taken after this point sees the mark and
+            # gives the connection up again (see BaseUri.lease)
+            conn._evicted = True
+            if conn._leases and not force:
+                conn._evicted = False
+                return False
+            del self._connections[key]
+            return True
+        return False
+
+
+    def _close(self, connections):
+        for conn in connections:
+            try:
+                conn.close()
+            except:
+                print("### Exception while closing connection %s" % conn)
+                traceback.print_exc()
 
 
     def cleanup(self, force=False):
-        now = time.time()
-        for key, conn in list(self.connections.items()):
-            if ((now - conn.last_used) > self.clean_timeout) or force:
-                try:
-                    conn.close()
-                except:
-                    print("### Exception while closing connection %s" % conn)
-                    traceback.print_exc()
-                del self.connections[key]
+        """
+        cleanup: close and remove connections of 'evictable' backends
+        that have not been used for clean_timeout seconds and are not
+        leased, or all connections if 'force' is set. Connection pools
+        close their connections that have been idle for longer than their
+        max_idle.
+        """
+        now = self.clock()
+        evicted = []
+        with self._lock:
+            for key, conn in list(self._connections.items()):
+                if self._expire(key, conn, now, force):
+                    evicted.append(conn)
+            if evicted:
+                self.generation += 1
+        self._close(evicted)
+
+
+    def _schedule_check(self, due, key, conn):
+        with self._schedule_condition:
+            entry = (due, next(self._sequence), key, weakref.ref(conn))
+            heapq.heappush(self._schedule, entry)
+            if self.cleaner_thread is None:
+                if self.run_clean_thread:
+                    self.cleaner_thread = threading.Thread(target=self.cleaner)
+                    self.cleaner_thread.daemon = True
+                    self.cleaner_thread.start()
+            elif self._schedule[0] is entry:
+                # the cleaner sleeps until a later time
+                self._schedule_condition.notify()
+
+
+    def run_due(self):
+        """
+        run_due: check the connections that are due now (the cleaner
+        thread calls this when the next one is due). Connections still
+        in use are checked again when they could be due next.
+
+        @rtype: int
+        @return: the number of closed connections
+        """
+        now = self.clock()
+        due = []
+        with self._schedule_condition:
+            while self._schedule and self._schedule[0][0] <= now:
+                due.append(heapq.heappop(self._schedule))
+        evicted = []
+        again = []
+        with self._lock:
+            for _, _, key, ref in due:
+                conn = ref()
+                if conn is None or self._connections.get(key) is not conn:
+                    # already removed
+                    continue
+                if self._expire(key, conn, now, False):
+                    evicted.append(conn)
+                elif isinstance(conn, ConnectionPool):
+                    again.append((conn.next_due(now), key, conn))
+                else:
+                    when = conn.last_used + self.clean_timeout
+                    if when <= now:
+                        # leased
+                        when = now + self.clean_interval
+                    again.append((when, key, conn))
+            if evicted:
+                self.generation += 1
+        for when, key, conn in again:
+            self._schedule_check(when, key, conn)
+        self._close(evicted)
+        return len(evicted)
 
 
     def cleaner(self):
         """
-        cleaner: method to be run in a thread to check for stale connections.
+        cleaner: method to be run in a thread to close stale connections
+        when they are due.
         """
+        condition = self._schedule_condition
         while True:
-            self.cleanup()
-            now = time.time()
-            try:
-                while (time.time() - now) < self.clean_interval:
-                    if not self.run_clean_thread:
-                        return
-                    time.sleep(1)
-            except:
-                return
+            with condition:
+                while self.run_clean_thread:
+                    if not self._schedule:
+                        condition.wait()
+                        continue
+                    delay = self._schedule[0][0] - self.clock()
+                    if delay <= 0:
+                        break
+                    condition.wait(delay)
+                if not self.run_clean_thread:
+                    return
+            self.run_due()
 
 
     def register(self, scheme, factory):
         "register: register factory callable 'factory' with scheme"
 
-        self.schemes[scheme] = factory
+        with self._lock:
+            self.schemes[scheme] = factory
+            self.generation += 1
+
+
+    def _plugin_entry_points(self):
+        if self._entry_points is None:
+            # importlib.metadata is slow to import and to scan, so this
+            # only happens when a scheme is not one of BUILTIN_PLUGINS
+            from importlib.metadata import entry_points
+            try:
+                # Python 3.10 and later select the group themselves
+                self._entry_points = list(
+                    entry_points(group='abl.vpath.plugins'))
+            except TypeError:
+                # Python versions prior to 3.10 return a simple dictonary
+                # of entry points
+                self._entry_points = list(
+                    entry_points().get('abl.vpath.plugins', []))
+        return self._entry_points
+
+
+    def _register_plugin(self, plugin_class):
+        if plugin_class.scheme not in self.schemes:
+            self.register(plugin_class.scheme, plugin_class)
+        SCHEME_REGISTRY.setdefault(plugin_class.scheme, plugin_class.uri)
+
+
+    def load_plugin(self, scheme):
+        """
+        load_plugin: import and register the plugin for scheme.
+
+        Plugins are only imported when their scheme is used for the
+        first time. The plugins of this package are found in
+        BUILTIN_PLUGINS, others by their entry point in the
+        'abl.vpath.plugins' group, which is named like the scheme.
+        Entry points with other names (the naming used before) are all
+        loaded when the first unknown scheme is asked for.
+
+        @rtype: bool
+        @return: whether there is a plugin for scheme now
+        """
+        with self._plugin_lock:
+            if scheme in self.schemes:
+                return True
+            target = BUILTIN_PLUGINS.get(scheme)
+            if target is not None:
+                module, _, name = target.partition(':')
+                self._register_plugin(
+                    getattr(importlib.import_module(module), name))
+                return True
+            entrypoints = self._plugin_entry_points()
+            named = [e for e in entrypoints if e.name == scheme]
+            if not named and not self._legacy_plugins_loaded:
+                self._legacy_plugins_loaded = True
+                named = [e for e in entrypoints
+                         if e.name not in BUILTIN_PLUGINS and
+                         e.value not in BUILTIN_PLUGINS.values()]
+            for entrypoint in named:
+                try:
+                    self._register_plugin(entrypoint.load())
+                except Exception:
+                    print("Could not load entrypoint", entrypoint)
+                    traceback.print_exc()
+            return scheme in self.schemes
 
 
     def shutdown(self):
         """
         shutdown: to be run by atexit handler. All open connection are closed.
         """
-        self.run_clean_thread = False
+        with self._schedule_condition:
+            self.run_clean_thread = False
+            self._schedule_condition.notify()
         self.cleanup(True)
-        if self.cleaner_thread.is_alive():
-            self.cleaner_thread.join()
+        cleaner_thread = self.cleaner_thread
+        if (cleaner_thread is not None and cleaner_thread.is_alive() and
+            cleaner_thread is not threading.current_thread()):
+            cleaner_thread.join()
+
+
+    def _after_fork(self):
+        """
+        _after_fork: the child of a fork has only the forking thread, and
+        any lock might have been held by some other thread of the
+        parent. Start over with new locks and without a cleaner thread,
+        which is started again with the next scheduled connection.
+        """
+        self._lock = threading.Lock()
+        self._schedule_condition = threading.Condition(threading.Lock())
+        self.creation_locks = {}
+        self._plugin_lock = threading.RLock()
+        self.cleaner_thread = None
 
 
+# the plugins of this package, imported on first use
+BUILTIN_PLUGINS = {
+    'file': 'abl.vpath.base.localfs:LocalFileSystem',
+    'memory': 'abl.vpath.base.memory:MemoryFileSystem',
+    'zip': 'abl.vpath.base.zip:ZipFileSystem',
+    }
+
 CONNECTION_REGISTRY = ConnectionRegistry()
 SCHEME_REGISTRY = {}
 
 atexit.register(CONNECTION_REGISTRY.shutdown)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=CONNECTION_REGISTRY._after_fork)
 
 def normalize_uri(uri, sep='/'):
     if sep != '/':
@@ -214,20 +563,138 @@ def remove_dir_recursively(connection, path):
         return connection.removedir(path)
 
 
+def seekable(fileobj):
+    "seekable: whether the file object can seek"
+    try:
+        return fileobj.seekable()
+    except AttributeError:
+        return False
+
+
+def copy_extents(infs, outfs, extents, size, length=8192):
+    """
+    copy_extents: copy the (offset, length) extents of the file infs to
+    the same offsets of outfs, which must be empty and seekable, and
+    truncate outfs to size. The rest becomes holes, if the file behind outfs supports
+    them.
+
+    @return: the number of bytes not copied
+    """
+    copied = 0
+    for offset, extent_length in extents:
+        infs.seek(offset)
+        outfs.seek(offset)
+        remaining = extent_length
+        while remaining:
+            buf = infs.read(min(length, remaining))
+            if not buf:
+                break
+            outfs.write(buf)
+            remaining -= len(buf)
+        copied += extent_length - remaining
+    outfs.truncate(size)
+    return size - copied
+
+
 #============================================================================
 
-@decorator
-def with_connection(func, self, *args, **argd):
+class LeasedFile(object):
+    """
+    LeasedFile: a file object returned by a backend, which holds the
+    lease on the connection of the backend until it is closed (see
+    with_connection). Everything else is passed on to the file object.
+    """
+
+    def __init__(self, fileobj, connection):
+        self._fileobj = fileobj
+        self._connection = connection
+
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+
+    def __iter__(self):
+        return iter(self._fileobj)
+
+
+    def __next__(self):
+        return next(self._fileobj)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def close(self):
+        try:
+            self._fileobj.close()
+        finally:
+            self._release()
+
+
+    def _release(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            connection.checkin()
+
+
+    def __del__(self):
+        # the file object closes itself when it is collected
+        if '_connection' in self.__dict__:
+            self._release()
+
+
+def _leased_generator(generator, connection):
+    """
+    _leased_generator: pass on the items of generator and give back the
+    lease on connection when it is exhausted, closed or collected.
+    with_connection primes it, so that the finally clause also runs for
+    a walk that is never iterated.
+    """
+    try:
+        yield
+        yield from generator
+    finally:
+        connection.checkin()
+
+
+def with_connection(func):
     """
     with_connection: decorator; make sure that there is a connection available
-    for action. Set the connections 'last_used' attribute to current timestamp.
-    We always get a fresh connection from the CONNECTION REGISTRY since the
-    'extras' could have changed.
+    for action and lease it for the duration of the call (giving the
+    lease back refreshes the 'last_used' time of the connection), and run
+    the pre_call_hook of the connection if it has one.
+
+    Generators (walk and friends) keep the lease until they are
+    exhausted or closed. So do file objects returned by connections the
+    lease protects (evictable or pooled ones), which are wrapped in a
+    LeasedFile for that.
     """
-    self.connection = self.get_connection()
-    self.connection.last_used = time.time()
-    self.connection.pre_call_hook(self, func)
-    return func(self, *args, **argd)
+    @wraps(func)
+    def dispatch(self, *args, **argd):
+        connection = self.connection = self.lease()
+        try:
+            if connection._pre_call_hook is not None:
+                connection._pre_call_hook(self, func)
+            result = func(self, *args, **argd)
+        except:
+            connection.checkin()
+            raise
+        if isinstance(result, GeneratorType):
+            result = _leased_generator(result, connection)
+            next(result)
+        elif ((connection.evictable or connection._pool is not None) and
+              hasattr(result, 'close')):
+            result = LeasedFile(result, connection)
+        else:
+            connection.checkin()
+        return result
+    return dispatch
 
 
 #============================================================================
@@ -243,7 +710,11 @@ def URI(uri, sep=os.sep, **extras):
         if m is not None:
             scheme = m.group(1)
 
-    return SCHEME_REGISTRY.get(scheme, BaseUri)(
+    uri_class = SCHEME_REGISTRY.get(scheme)
+    if uri_class is None:
+        CONNECTION_REGISTRY.load_plugin(scheme)
+        uri_class = SCHEME_REGISTRY.get(scheme, BaseUri)
+    return uri_class(
         uri,
         sep=sep,
         **extras
@@ -263,16 +734,38 @@ class BaseUri(object):
 
     The 'join' (as in os.path.join) can be used with the operator '/' which
     leads to more readable code.
+
+    URIs are slotted and share the interned components of their parse
+    result with all other URIs of the same host. A URI with a 40
+    character path costs about 330 bytes on CPython 3.11, including its
+    path string (see benchmarks/bench_uri_memory.py). Subclasses should
+    declare __slots__ as well to keep it that way.
     """
 
+    __slots__ = (
+        '_scheme',
+        'connection',
+        '_uri',
+        'sep',
+        'parse_result',
+        '_extra_args',
+        '_username',
+        '_password',
+        '_hash',
+        '_cached_connection',
+        '__weakref__',
+        )
+
     def __init__(self, uri, sep=os.sep, **extras):
         self._scheme = ''
+        self._hash = None
+        self._cached_connection = None
         self.connection = None
         if isinstance(uri, BaseUri):
-            self.uri = uri.uri
+            self._uri = uri.uri
             self.sep = uri.sep
             self.parse_result = UriParse(uri.uri)
-            self.extras = uri.extras.copy()
+            extras = dict(uri._extra_args or ())
         else:
             if uri.startswith('file://'):
                 uri = uri[7:]
@@ -281,30 +774,106 @@ class BaseUri(object):
                 uri = './'+uri
             if not '://' in uri:
                 uri = 'file://'+uri
-            self.uri = uri
+            self._uri = uri
             self.sep = sep
             self.parse_result = UriParse(uri)
-            self.extras = extras
-        if self.username is None:
-            if 'username' in self.extras:
-                self.username = self.extras.pop('username')
-            elif 'username' in self.parse_result.query:
-                self.username = self.parse_result.query['username']
-        if self.password is None:
-            if 'password' in self.extras:
-                self.password = self.extras.pop('password')
-            elif 'password' in self.parse_result.query:
-                self.password = self.parse_result.query['password']
+        self._username = self.parse_result.username
+        self._password = self.parse_result.password
+        if self._username is None:
+            if 'username' in extras:
+                self._username = extras.pop('username')
+            elif 'username' in self.parse_result._query:
+                self._username = self.parse_result._query['username']
+        if self._password is None:
+            if 'password' in extras:
+                self._password = extras.pop('password')
+            elif 'password' in self.parse_result._query:
+                self._password = self.parse_result._query['password']
+        # most URIs have no extras, they get a dict once they are asked for
+        self._extra_args = extras or None
+
+
+    @property
+    def uri(self):
+        if self._uri is None:
+            # URIs derived from others build their uri string on demand
+            self._uri = uri_from_parts(self.parse_result.as_list())
+        return self._uri
+
+
+    def _registry_entry(self):
+        """
+        _registry_entry: the connection (or ConnectionPool) of self in
+        the CONNECTION_REGISTRY.
+
+        The entry is looked up once and then kept on the URI (and handed
+        on to URIs derived from it by join, split etc.) until the
+        registry generation changes.
+        """
+        cached = self._cached_connection
+        registry = CONNECTION_REGISTRY
+        if cached is not None and cached[0] == registry.generation:
+            return cached[1]
+        generation = registry.generation
+        connection = registry.get_connection(*self._key(), **self._extras())
+        self._cached_connection = (generation, connection)
+        return connection
 
 
     def get_connection(self):
-        return CONNECTION_REGISTRY.get_connection(*self._key(), **self._extras())
+        """
+        get_connection: the backend connection of self.
+
+        For pooled connections, this is one of the connections of the
+        pool, which is not checked out (see lease).
+        """
+        connection = self._registry_entry()
+        if isinstance(connection, ConnectionPool):
+            return connection.any_connection()
+        return connection
+
+
+    def lease(self):
+        """
+        lease: get the connection and lease it (check it out of its
+        pool), so that the connection registry does not close it and no
+        other thread gets an exclusive connection at the same time. The
+        lease must be given back with connection.checkin().
+
+        Leases are re-entrant: a thread that already holds a connection
+        of the pool gets that one, instead of waiting for another one
+        while it holds the first.
+        """
+        while True:
+            connection = self._registry_entry().checkout(reentrant=True)
+            if connection is not None:
+                return connection
+            # lost the race against ConnectionRegistry.cleanup
+            self._cached_connection = None
+
+
+    def _get_extras(self):
+        # like the query, the extras are given to the backend, and we
+        # can't know what the caller does with them
+        self._cached_connection = None
+        extras = self._extra_args
+        if extras is None:
+            extras = self._extra_args = {}
+        return extras
+
+
+    def _set_extras(self, extras):
+        self._cached_connection = None
+        self._extra_args = extras
+
+
+    extras = property(_get_extras, _set_extras)
 
 
     def _extras(self):
-        extras = self.extras.copy()
+        extras = dict(self._extra_args or ())
         if self.scheme not in ('http','https'):
-            extras.update(self.query)
+            extras.update(self.parse_result._query)
 
         return extras
 
@@ -319,10 +888,98 @@ class BaseUri(object):
     def _set_scheme(self, scheme):
         self._scheme = scheme
         self.parse_result.scheme = scheme
+        self._hash = None
+        self._cached_connection = None
 
 
     scheme = property(_get_scheme, _set_scheme)
 
+    def _get_hostname(self):
+        return self.parse_result.hostname
+
+
+    def _set_hostname(self, hostname):
+        self._cached_connection = None
+        self.parse_result.hostname = hostname
+
+
+    hostname = property(_get_hostname, _set_hostname)
+
+
+    def _get_netloc(self):
+        return self.parse_result.netloc
+
+
+    def _set_netloc(self, netloc):
+        self._hash = None
+        self.parse_result.netloc = netloc
+
+
+    netloc = property(_get_netloc, _set_netloc)
+
+
+    def _get_vpath_connector(self):
+        return self.parse_result.vpath_connector
+
+
+    def _set_vpath_connector(self, vpath_connector):
+        self._cached_connection = None
+        self.parse_result.vpath_connector = vpath_connector
+
+
+    vpath_connector = property(_get_vpath_connector, _set_vpath_connector)
+
+
+    def _get_fragment(self):
+        return self.parse_result.fragment
+
+
+    def _set_fragment(self, fragment):
+        self.parse_result.fragment = fragment
+
+
+    fragment = property(_get_fragment, _set_fragment)
+
+
+    def _get_query(self):
+        # the query is part of the extras given to the backend, and
+        # we can't know what the caller does with it
+        self._cached_connection = None
+        return self.parse_result.query
+
+
+    def _set_query(self, query):
+        self._cached_connection = None
+        self.parse_result.query = query
+
+
+    query = property(_get_query, _set_query)
+
+
+    def _get_username(self):
+        return self._username
+
+
+    def _set_username(self, username):
+        self._cached_connection = None
+        self._username = username
+
+
+    username = property(_get_username, _set_username)
+
+
+    def _get_password(self):
+        return self._password
+
+
+    def _set_password(self, password):
+        self._cached_connection = None
+        self._password = password
+
+
+    password = property(_get_password, _set_password)
+
+
     @property
     def port(self):
         try:
@@ -371,16 +1028,49 @@ class BaseUri(object):
 
 
     def __getattr__(self, attr):
+        # only reached for attributes that are neither slots nor
+        # properties, e.g. 'authority'
+        if attr == 'parse_result':
+            raise AttributeError(attr)
         return getattr(self.parse_result, attr)
 
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, BaseUri):
+            if (self._hash is not None and other._hash is not None and
+                self._hash != other._hash):
+                return False
             return self.parse_result == other.parse_result
         else:
             return False
 
 
+    def __hash__(self):
+        """
+        The hash is computed once and kept on the URI. It only covers
+        the parts of the URI that can't change after creation (besides the
+        scheme, which resets it), so changing the query of a URI that is
+        used as a dict key is fine.
+        """
+        if self._hash is None:
+            self._hash = hash(self.parse_result)
+        return self._hash
+
+
+    def _intern_key(self):
+        return (
+            self.__class__,
+            self.parse_result.as_list()[1],
+            self.parse_result.path,
+            frozenset(self.parse_result._query.items()),
+            self.sep,
+            self._key(),
+            frozenset((self._extra_args or {}).items()),
+            )
+
+
     def __ne__(self, other):
         return not self == other
 
@@ -394,13 +1084,55 @@ class BaseUri(object):
 
 
     def __add__(self, suffix):
-        path = self.uri + suffix
-        result = self.__class__(
-            path,
-            sep=self.sep,
-            **self._extras()
-            )
-        result.parse_result.query = self.query.copy()
+        if '?' in suffix or '#' in suffix:
+            path = self.uri + suffix
+            result = self.__class__(
+                path,
+                sep=self.sep,
+                **self._extras()
+                )
+            result.parse_result.query = self.parse_result.shared_query()
+            return result
+        return self._derive(self.parse_result.path + suffix,
+                            self.parse_result.shared_query())
+
+
+    def _derive(self, path, query, extras=None):
+        """
+        _derive: create a URI of the same class and connection parameters as
+        self, with 'path' and 'query' as its path and query.
+
+        The new URI is built from the already parsed components of self,
+        which avoids building and re-parsing a uri string. Subclasses with
+        their own __init__ get a URI created from a uri string instead, so
+        that their initialization is not bypassed.
+
+        @type extras: dict|None
+        @param extras: the extras of the new URI (default: self._extras(),
+                       like the URIs created from a uri string get)
+        """
+        if extras is None:
+            extras = self._extras()
+        cls = self.__class__
+        if cls.__init__ is not BaseUri.__init__:
+            parts = self.parse_result.as_list()
+            parts[2] = path
+            parts[3] = {}
+            result = cls(uri_from_parts(parts), sep=self.sep, **extras)
+            result.parse_result.query = query
+            return result
+        result = cls.__new__(cls)
+        result._scheme = self._scheme
+        result._hash = None
+        # the derived URI has the same connection parameters
+        result._cached_connection = self._cached_connection
+        result.connection = None
+        result._uri = None
+        result.sep = self.sep
+        result.parse_result = self.parse_result.derive(path, query)
+        result._extra_args = extras or None
+        result._username = self._username
+        result._password = self._password
         return result
 
 
@@ -412,6 +1144,16 @@ class BaseUri(object):
         return path.startswith('/')
 
 
+    def _split_path(self):
+        head, slash, tail = self.parse_result.path.rpartition('/')
+        if not slash:
+            head = '.'
+        elif not head:
+            # we might be already on the root
+            head = '/'
+        return head, tail
+
+
     def split(self):
         """
         split: like os.path.split
@@ -420,23 +1162,8 @@ class BaseUri(object):
         @return: a 2 tuple. The first element is a URI instance and the second
                  a string, representing the basename.
         """
-        try:
-            first, second = self.uri.rsplit('/', 1)
-        except ValueError:
-            first = ''
-            second = self.uri
-        # we might be already on the root
-        if first.endswith('//'):
-            first = first + '/'
-        if not first:
-            first = '.'
-        return (self.__class__(
-            first,
-            sep=self.sep,
-            **self._extras()
-            ),
-            second.partition('?')[0]
-            )
+        head, tail = self._split_path()
+        return self._derive(head, EMPTY_QUERY), tail
 
 
     def directory(self, level=1):
@@ -458,7 +1185,7 @@ class BaseUri(object):
         """
         @return: the second part of the split method
         """
-        return self.split()[1]
+        return self._split_path()[1]
 
 
     def splitext(self):
@@ -475,16 +1202,10 @@ class BaseUri(object):
         @return: last part of uri
         @rvalue: str
         """
-        parts = self.uri.split('/')
-        if not parts:
-            return ''
-        if len(parts) > 1:
-            if not parts[-1]:
-                return parts[-2]
-            else:
-                return parts[-1]
-        else:
-            return parts[-1]
+        path = self.parse_result.path
+        if path.endswith('/'):
+            path = path[:-1]
+        return path.rpartition('/')[2]
 
 
     def join(self, *args):
@@ -502,39 +1223,61 @@ class BaseUri(object):
             [x.strip('/') for x in args[:-1]] +
             [args[-1]]
             )
-        parts = self.parse_result.as_list()
-        parts[2] = '/'.join(args)
-
-        result = self.__class__(
-            uri_from_parts(parts),
-            sep=sep,
-            **self._extras()
-            )
-
-        result.parse_result.query = self.query.copy()
-
-        return result
+        return self._derive('/'.join(args), self.parse_result.shared_query())
 
 
     @with_connection
     def copy(self, other, recursive=False, ignore=None,
-             followlinks=True):
+             followlinks=True, cycles=None, workers=None, chunk_size=None,
+             verify=False):
         """
         copy: copy self to other
 
         @type other: URI
         @param other: the path to copy itself over.
 
+        @param cycles: for recursive copies following links, the policy
+            for directories reached again (see walk)
+
+        @type workers: int
+        @param workers: for recursive copies, copy the files with this
+            many threads (see transfer.ParallelCopy). The copy then
+            returns a CopyReport, and raises a CopyError after copying
+            all other files if some of them failed. A single file is
+            copied in chunks by this many threads (see
+            transfer.RangeCopy), which pays off for very large files.
+
+        @type chunk_size: int
+        @param chunk_size: for single files copied with workers, the
+            bytes per chunk (transfer.CHUNK_SIZE by default)
+
+        @type verify: bool
+        @param verify: for single files copied with workers, read back
+            every chunk and raise a CopyError if its checksum differs
+
+        Without workers, the copy returns the number of bytes in holes
+        of sparse files, which were not copied (see CopyReport.skipped).
+
         What will really happen depends on the backend.
 
         Note that file properties are only copied when self and other are
         located in the same backend, i.e. it is not possible to copy
         permissions etc. from a memory:// to a file:// based path.
         """
+        options = {}
+        # only the options in use, so that backends with the older copy
+        # signature keep working
+        for name, value, default in [('cycles', cycles, None),
+                                     ('workers', workers, None),
+                                     ('chunk_size', chunk_size, None),
+                                     ('verify', verify, False)]:
+            if value != default:
+                options[name] = value
         return self.connection.copy(self, other,
                                     recursive=recursive,
                                     ignore=ignore,
-                                    followlinks=followlinks)
+                                    followlinks=followlinks,
+                                    **options)
 
 
     @with_connection
@@ -591,11 +1334,17 @@ class BaseUri(object):
 
 
     @with_connection
-    def open(self, options=None, mimetype='application/octet-stream'):
+    def open(self, options=None, mimetype='application/octet-stream',
+             **kwargs):
         """
         open: return a file like object for self.
         The method can be used with the 'with' statment.
+
+        Further keyword arguments are up to the backend, e.g. the
+        compression of zip:// members (see ZipFileSystem.open).
         """
+        if kwargs:
+            return self.connection.open(self, options, mimetype, **kwargs)
         return self.connection.open(self, options, mimetype)
 
 
@@ -736,7 +1485,8 @@ class BaseUri(object):
 
 
     @with_connection
-    def walk(self, topdown=True, followlinks=True):
+    def walk(self, topdown=True, followlinks=True, unsorted=False,
+             breadth_first=False, cycles=None):
         """
         walk: walk the filesystem (just like os.walk).
         Use like:
@@ -746,10 +1496,81 @@ class BaseUri(object):
             do_something()
 
         root will be an URI object.
-        """
+
+        @param unsorted: If True, dirs and files (and the order the
+            directories are walked in) come in the order the backend
+            lists them, which saves sorting them. (Default: False)
+        @param breadth_first: If True, walk all directories of one level
+            before those of the next; only for topdown walks.
+            (Default: False)
+        @param cycles: What to do, when following links, with a
+            directory that has been reached before (through a symlink
+            loop or another link to it): 'skip' leaves it out of dirs,
+            'error' raises a SymlinkLoopError, and 'yield-once' keeps it
+            in dirs but does not walk it again. Directories are told
+            apart by (st_dev, st_ino) for local files and by their node
+            in memory. None (the default) does not look for cycles and
+            walks loops until the backend gives up.
+        """
+        if unsorted or breadth_first or cycles:
+            return self.connection.walk(self, topdown=topdown,
+                                        followlinks=followlinks,
+                                        unsorted=unsorted,
+                                        breadth_first=breadth_first,
+                                        cycles=cycles)
         return self.connection.walk(self, topdown=topdown, followlinks=followlinks)
 
 
+    @with_connection
+    def walk_entries(self, topdown=True, followlinks=True, unsorted=False,
+                     breadth_first=False, cycles=None):
+        """
+        walk_entries: like walk, but dirs and files are lists of
+        DirEntry objects, which know the kind, size, mtime and mode of
+        the entries. Remove entries from dirs (topdown) to not walk into
+        them.
+        """
+        return self.connection.walk_entries(self, topdown=topdown,
+                                            followlinks=followlinks,
+                                            unsorted=unsorted,
+                                            breadth_first=breadth_first,
+                                            cycles=cycles)
+
+
+    @with_connection
+    def parallel_walk(self, max_workers=8, followlinks=True, prune=None,
+                      unsorted=False, cycles='yield-once'):
+        """
+        parallel_walk: walk the filesystem like walk, but read up to
+        max_workers directories at the same time. This pays off for
+        backends where every directory listing is a round trip.
+
+        (root, dirs, files) are yielded as the directories have been
+        read, so neither the order of the directories nor that parents
+        come before their children is guaranteed. Changing dirs has no
+        effect, the walk already went on; pass a prune callback instead.
+
+        With followlinks, every directory is walked only once, also if
+        symbolic links lead to it several times or form a loop (cycles
+        works like for walk, but None is not an option).
+
+        @type max_workers: int
+        @param max_workers: number of threads reading directories
+
+        @type prune: callable
+        @param prune: called with the URI of every subdirectory; if it
+                      returns True, the walk does not descend into it
+
+        @param unsorted: like for walk, the order of dirs and files
+        """
+        if cycles is None:
+            raise ValueError("parallel_walk needs a cycle policy")
+        return self.connection.parallel_walk(self, max_workers=max_workers,
+                                             followlinks=followlinks,
+                                             prune=prune, unsorted=unsorted,
+                                             cycles=cycles)
+
+
     @with_connection
     def listdir(self):
         """
@@ -759,6 +1580,17 @@ class BaseUri(object):
         return self.connection.listdir(self)
 
 
+    @with_connection
+    def scandir(self, unsorted=False):
+        """
+        scandir: the contents of directory self as DirEntry objects,
+        sorted by name unless 'unsorted' is set.
+        """
+        if unsorted:
+            return self.connection.scandir(self, unsorted=True)
+        return self.connection.scandir(self)
+
+
     @with_connection
     def info(self, set_info=None, followlinks=True):
         """
@@ -824,7 +1656,59 @@ class BaseUri(object):
 
 
 
+class UriInternTable(object):
+    """
+    UriInternTable: hands out one shared instance for all URIs that are
+    identical in class, scheme, authority, path, query, credentials and
+    extras.
+
+    Interned URIs can be deduplicated and compared by identity. The
+    table only holds weak references, so URIs that are not used anymore
+    are dropped from it.
+
+    Interned URIs are shared, so they must not be modified (e.g. by
+    assigning to their scheme or query).
+    """
+
+    def __init__(self):
+        self._uris = weakref.WeakValueDictionary()
+
+
+    def __len__(self):
+        return len(self._uris)
+
+
+    def intern(self, uri):
+        """
+        intern: return the shared instance equal to 'uri', making 'uri'
+        that instance if there is none yet.
+
+        URIs with unhashable query values or extras are returned as they
+        are.
+        """
+        try:
+            key = uri._intern_key()
+        except TypeError:
+            return uri
+        return self._uris.setdefault(key, uri)
+
+
+    def clear(self):
+        self._uris.clear()
+
+
+URI_INTERN_TABLE = UriInternTable()
+
+
+def intern_uri(uri):
+    "intern_uri: intern 'uri' in the default UriInternTable"
+    return URI_INTERN_TABLE.intern(uri)
+
+
+
 class RevisionedUri(BaseUri):
+    __slots__ = ()
+
     @with_connection
     def switch(self, branch):
         return self.connection.switch(self, branch)
@@ -846,6 +1730,12 @@ class RevisionedUri(BaseUri):
 
 
 
+# what walks with followlinks do when they reach a directory again:
+# leave it out of dirs, raise SymlinkLoopError, or keep it in dirs
+# without walking it again (see BaseUri.walk)
+CYCLE_POLICIES = ('skip', 'error', 'yield-once')
+
+
 class FileSystem(object):
     """
     FileSystem is the base class for any file system.
@@ -856,6 +1746,14 @@ class FileSystem(object):
 
     scheme = None
 
+    # whether one connection can serve several threads at once; a
+    # ConnectionPool checks out other connections exclusively
+    shareable = True
+
+    # whether the connection registry closes connections that have not
+    # been used for a while
+    evictable = True
+
     def __init__(self,
                  hostname=None,
                  port=None,
@@ -870,6 +1768,14 @@ class FileSystem(object):
         self.vpath_connector = vpath_connector
         self.extras = extras
         self.last_used = time.time()
+        self._clock = time.time
+        self._leases = []
+        self._evicted = False
+        self._pool = None
+        if type(self).pre_call_hook is FileSystem.pre_call_hook:
+            self._pre_call_hook = None
+        else:
+            self._pre_call_hook = self.pre_call_hook
 
         self._initialize()
 
@@ -878,6 +1784,35 @@ class FileSystem(object):
         pass
 
 
+    def checkout(self, reentrant=False):
+        """
+        checkout: lease this connection (see BaseUri.lease); without a
+        pool, the connection is shared anyway, so 'reentrant' makes no
+        difference
+
+        @return: self, or None if the connection registry is about to
+                 close the connection
+        """
+        # list.append and list.pop are atomic, so the leases need no lock
+        self._leases.append(None)
+        if self._evicted:
+            self._leases.pop()
+            return None
+        return self
+
+
+    def checkin(self):
+        "checkin: give back a lease taken by checkout or a ConnectionPool"
+        pool = self._pool
+        if pool is None:
+            # before the lease goes, so that the cleanup never sees an
+            # unleased connection with an old last_used
+            self.last_used = self._clock()
+            self._leases.pop()
+        else:
+            pool.checkin(self)
+
+
     def _path(self, uriobj):
         if isinstance(uriobj, BaseUri):
             return uriobj.path
@@ -889,6 +1824,10 @@ class FileSystem(object):
         """
         Invoked for all @with_connection decorated
         functions before they get executed.
+
+        Only called for backends that override it. A backend that only
+        needs it at times can set self._pre_call_hook to None (no hook)
+        or to self.pre_call_hook (hook active) as needed.
         """
         pass
 
@@ -901,8 +1840,26 @@ class FileSystem(object):
 
 
     def copy(self, source, dest, recursive=False, ignore=None,
-             followlinks=True):
-        if source.connection is dest.connection and hasattr(self, 'internal_copy'):
+             followlinks=True, cycles=None, workers=None, chunk_size=None,
+             verify=False):
+        # leased for the whole copy, so that the connection registry
+        # does not close it, and no other thread gets it if it is an
+        # exclusive one (see BaseUri.lease)
+        dest_connection = dest.lease()
+        try:
+            return self._copy(source, dest, dest_connection, recursive,
+                              ignore, followlinks, cycles, workers,
+                              chunk_size, verify)
+        finally:
+            dest_connection.checkin()
+
+
+    def _copy(self, source, dest, dest_connection, recursive, ignore,
+              followlinks, cycles, workers, chunk_size, verify):
+        "_copy: see copy; dest_connection is leased"
+        if self._pool is not None and dest_connection._pool is self._pool:
+            dest_connection = self
+        if dest_connection is self and hasattr(self, 'internal_copy'):
             return self.internal_copy(source, dest, recursive, ignore)
 
         use_same_backend = source.scheme == dest.scheme
@@ -912,35 +1869,52 @@ class FileSystem(object):
         else:
             ignore = set()
 
-        if not source.exists():
+        if not self.exists(source):
             raise FileDoesNotExistError(str(source))
 
         if not recursive:
-            assert source.isfile()
-            if dest.isdir():
+            assert self.isfile(source)
+            if dest_connection.isdir(dest):
                 dest = dest / source.last()
 
-            if source.islink() and not followlinks:
+            if self.islink(source) and not followlinks:
                 self._copy_link(source, dest)
+                return 0
+            elif workers is not None:
+                from .transfer import RangeCopy
+                engine = RangeCopy(workers, chunk_size, verify)
+                return engine.run(self, source, dest, dest_connection,
+                                  use_same_backend)
             else:
-                with source.open('rb') as infs, dest.open('wb') as outfs:
-                    shutil.copyfileobj(infs, outfs, 8192)
-                if use_same_backend:
-                    self.copystat(source, dest)
+                return self._copy_file(source, dest, dest_connection,
+                                       use_same_backend)
         else:
-            assert source.isdir()
-            if dest.isdir():
+            assert self.isdir(source)
+            if dest_connection.isdir(dest):
                 droot = dest / source.last()
             else:
                 droot = dest
 
-            if source.islink() and not followlinks:
+            skipped = 0
+            if self.islink(source) and not followlinks:
                 self._copy_link(source, droot)
             else:
-                droot.makedirs()
+                dest_connection.makedirs(droot)
+                if workers is not None:
+                    from .transfer import ParallelCopy
+                    engine = ParallelCopy(self, dest_connection, workers,
+                                          ignore, followlinks, cycles,
+                                          use_same_backend)
+                    engine.plan(source, droot)
+                    return engine.run()
                 spth = source.path
-                spth_len = len(spth) + 1
-                for root, dirs, files in source.walk(followlinks=followlinks):
+                spth_len = len(spth.rstrip('/')) + 1
+                if cycles is not None:
+                    walk = self.walk(source, followlinks=followlinks,
+                                     cycles=cycles)
+                else:
+                    walk = self.walk(source, followlinks=followlinks)
+                for root, dirs, files in walk:
                     rpth = root.path
                     tojoin = rpth[spth_len:].strip()
                     if tojoin:
@@ -954,33 +1928,129 @@ class FileSystem(object):
                             continue
                         ddir = dbase / folder
                         srcp = root / folder
-                        if srcp.islink() and not followlinks:
+                        if self.islink(srcp) and not followlinks:
                             self._copy_link(srcp, ddir)
                         else:
-                            ddir.makedirs()
+                            dest_connection.makedirs(ddir)
 
                     for fname in files:
                         srcf = root / fname
                         destf = dbase / fname
-                        if srcf.islink() and not followlinks:
+                        if self.islink(srcf) and not followlinks:
                             self._copy_link(srcf, destf)
                         else:
-                            with srcf.open('rb') as infs, destf.open('wb') as outfs:
-                                shutil.copyfileobj(infs, outfs, 8192)
-                            if use_same_backend:
-                                self.copystat(srcf, destf)
+                            skipped += self._copy_file(srcf, destf,
+                                                       dest_connection,
+                                                       use_same_backend)
+            return skipped
+
+
+    def _copy_file(self, source, dest, dest_connection, use_same_backend):
+        """
+        _copy_file: copy the content of the file source to dest, and its
+        metadata as well if both are in the same backend.
+
+        Of sparse files (see _data_extents), only the data is copied,
+        and dest gets holes where source has them (if its backend
+        supports that; otherwise they are filled with zeros).
+
+        @rtype: int
+        @return: the number of bytes in holes, which were not copied
+        """
+        skipped = 0
+        with self.open(source, 'rb', 'application/octet-stream') as infs, \
+             dest_connection.open(dest, 'wb', 'application/octet-stream') as outfs:
+            sparse = self._data_extents(source, infs)
+            if sparse is None or not seekable(outfs):
+                # e.g. zip members are written as a stream
+                shutil.copyfileobj(infs, outfs, 8192)
+            else:
+                skipped = copy_extents(infs, outfs, *sparse)
+        if use_same_backend:
+            self.copystat(source, dest)
+        return skipped
+
+
+    def _copy_file_ranges(self, source, dest, dest_connection,
+                          use_same_backend, engine):
+        """
+        _copy_file_ranges: copy the file source to dest in chunks, with
+        the workers of engine (see transfer.RangeCopy). Here, they take
+        turns on one file object for each file; files that cannot seek
+        are copied as a whole, and not verified.
+
+        @type engine: transfer.RangeCopy
+
+        @rtype: int
+        @return: the number of bytes in holes, which were not copied
+        """
+        from .transfer import locked_reader, locked_writer
+        with self.open(source, 'rb', 'application/octet-stream') as infs, \
+             dest_connection.open(dest, 'wb', 'application/octet-stream') as outfs:
+            if not (seekable(infs) and seekable(outfs)):
+                engine.verify = False
+                skipped = 0
+                while True:
+                    buf = infs.read(8192)
+                    if not buf:
+                        break
+                    outfs.write(buf)
+                    engine.copied += len(buf)
+            else:
+                sparse = self._data_extents(source, infs)
+                if sparse is None:
+                    infs.seek(0, 2)
+                    size = infs.tell()
+                    extents = [(0, size)]
+                else:
+                    extents, size = sparse
+                outfs.truncate(size)
+                engine.copy(locked_reader(infs), locked_writer(outfs),
+                            extents)
+                skipped = size - engine.copied
+        if engine.verify:
+            with dest_connection.open(dest, 'rb',
+                                      'application/octet-stream') as checkfs:
+                engine.check(locked_reader(checkfs), extents)
+        if use_same_backend:
+            self.copystat(source, dest)
+        return skipped
+
+
+    def _data_extents(self, path, fileobj):
+        """
+        _data_extents: where the data of a sparse file is.
+
+        @param fileobj: path, opened for reading
+
+        @rtype: tuple(list, int)|None
+        @return: the (offset, length) of the parts of the file that are
+                 not holes, and the size of the file; None for files
+                 without holes, and for backends that do not know
+        """
+        return None
 
 
     def makedirs(self, path):
-        if path.isdir():
-            return path
-        pth, tail = path.split()
-        if not pth.isdir():
-            self.makedirs(pth)
-        if tail:
-            return path.mkdir()
-        else:
+        if self.isdir(path):
             return path
+        # the missing directories, innermost first; collected in a loop
+        # instead of recursing, so that deep paths work
+        missing = []
+        current = path
+        while not self.isdir(current):
+            parent, tail = current.split()
+            if tail:
+                missing.append(current)
+            elif parent == current:
+                break
+            current = parent
+        result = path
+        for directory in reversed(missing):
+            result = self.mkdir(directory)
+        if missing and missing[0] is path:
+            return result
+        return path
 
 
     def move(self, source, destination):
@@ -995,32 +2065,399 @@ class FileSystem(object):
             source.remove('r')
 
 
-    def walk(self, top, topdown=True, followlinks=True):
-        names = sorted(self.listdir(top))
+    def _walk(self, top, topdown, followlinks, breadth_first, read,
+              cycles=None):
+        """
+        _walk: the walk of walk and walk_entries.
+
+        The walk keeps the directories still to be read in a stack (or,
+        breadth-first, a queue) instead of recursing, so the depth of
+        the tree costs neither stack frames nor time per result, and the
+        memory used is bounded by the directories waiting to be walked.
+
+        @type read: callable
+        @param read: read(top) returns (dirs, files, links) for
+                     directory top: the lists to yield and a dict telling
+                     for the names of the subdirectories whether they are
+                     symlinks (or None, if islink is to be asked).
+
+        @param cycles: the policy for directories reached again through
+                       symbolic links (see BaseUri.walk)
+        """
+        if breadth_first and not topdown:
+            raise ValueError("a breadth-first walk can only be topdown")
+        seen = self._walk_seen(top, followlinks, cycles)
+        lock = threading.Lock()
+        repeated = ()
+        # besides directories, when walking bottom-up, the queue holds
+        # (top, dirs, files) results waiting for their subdirectories
+        pending = deque([top])
+        take = pending.popleft if breadth_first else pending.pop
+        while pending:
+            top = take()
+            if top.__class__ is tuple:
+                yield top
+                continue
+            dirs, files, links = read(top)
+            if seen is not None:
+                repeated, identities = self._walk_cycles(top, dirs, seen,
+                                                         lock, cycles)
+            if topdown:
+                yield top, dirs, files
+            else:
+                pending.append((top, dirs, files))
+            # the caller may have changed dirs (topdown)
+            children = self._walk_children(top, dirs, links, followlinks,
+                                           repeated)
+            if seen is not None:
+                # only now, for the directories the caller left in dirs
+                children = [child for child in children
+                            if self._walk_claim(child, identities.get(child),
+                                                seen, lock, cycles)]
+            if breadth_first:
+                pending.extend(children)
+            else:
+                children.reverse()
+                pending.extend(children)
+
+
+    def _walk_children(self, top, dirs, links, followlinks, repeated=()):
+        """
+        _walk_children: the URIs of the subdirectories of top to walk
+        into, for dirs and links as returned by a _walk read function,
+        leaving out the names in repeated.
+        """
+        children = []
+        for item in dirs:
+            name = item if item.__class__ is str else item.name
+            if name in repeated:
+                continue
+            child = top / name
+            if not followlinks:
+                if links is not None and name in links:
+                    if links[name]:
+                        continue
+                elif self.islink(child):
+                    continue
+            children.append(child)
+        return children
+
+
+    def _walk_seen(self, top, followlinks, cycles):
+        """
+        _walk_seen: the set of directory identities a walk from top
+        starts with, or None if the walk does not look for cycles (it
+        cannot run into one without following links).
+        """
+        if cycles is None:
+            return None
+        if cycles not in CYCLE_POLICIES:
+            raise ValueError("unknown cycle policy %r" % (cycles,))
+        if not followlinks:
+            return None
+        return set([self._dir_identity(top)])
 
+
+    def _walk_cycles(self, top, dirs, seen, lock, cycles):
+        """
+        _walk_cycles: apply the cycle policy to the subdirectories dirs
+        of top: remove those that have been walked already, or come
+        twice in dirs, from dirs ('skip') or raise ('error').
+
+        The identities of the new ones are not added to seen yet: the
+        caller may still prune dirs, and a directory left out there has
+        to be walked when it is reached another way. _walk_claim adds
+        them for the directories that are walked into.
+
+        @rtype: tuple(set, dict)
+        @return: the names of the repeated directories, not to be walked,
+                 and the identities of the others by their URI
+        """
+        # look up the identities first, that may take a round trip each
+        identities = []
+        for item in dirs:
+            name = item if item.__class__ is str else item.name
+            path = top / name
+            identities.append((item, name, path, self._dir_identity(path)))
+        repeated = set()
+        new = {}
+        listed = set()
+        with lock:
+            for item, name, path, identity in identities:
+                if identity not in seen and identity not in listed:
+                    new[path] = identity
+                    listed.add(identity)
+                    continue
+                if cycles == 'error':
+                    raise SymlinkLoopError(
+                        "%s has been walked already" % path)
+                if cycles == 'skip':
+                    dirs.remove(item)
+                repeated.add(name)
+        return repeated, new
+
+
+    def _walk_claim(self, path, identity, seen, lock, cycles):
+        """
+        _walk_claim: add the identity of the directory path, which is
+        about to be walked, to seen (see _walk_cycles).
+
+        @param identity: the identity of path, None if it has not been
+                         looked up (e.g. the caller added path to dirs)
+
+        @rtype: bool
+        @return: False if it has been claimed in the meantime, e.g. by
+                 another thread of a parallel walk, and is not to be
+                 walked
+        """
+        if identity is None:
+            identity = self._dir_identity(path)
+        with lock:
+            if identity not in seen:
+                seen.add(identity)
+                return True
+        if cycles == 'error':
+            raise SymlinkLoopError("%s has been walked already" % path)
+        return False
+
+
+    def _read_entries(self, top, unsorted):
+        if unsorted:
+            entries = self.scandir(top, unsorted=True)
+        else:
+            entries = self.scandir(top)
         dirs = []
-        nondirs = []
-        for name in names:
-            if self.isdir(top / name):
-                dirs.append(name)
+        files = []
+        links = {}
+        for entry in entries:
+            if entry.is_dir():
+                dirs.append(entry)
+                links[entry.name] = entry.is_symlink()
             else:
-                nondirs.append(name)
+                files.append(entry)
+        return dirs, files, links
 
-        if topdown:
-            yield top, dirs, nondirs
-        for name in dirs:
-            path = top / name
-            if not path.islink() or followlinks:
-                for x in self.walk(path, topdown=topdown, followlinks=followlinks):
-                    yield x
-        if not topdown:
-            yield top, dirs, nondirs
+
+    def _walk_reader(self, unsorted, names=True):
+        """
+        _walk_reader: the read function for _walk (see there), giving the
+        names of dirs and files, or with names=False their DirEntry
+        objects.
+
+        Backends with their own scandir are read with it, others with
+        listdir and an isdir call per entry.
+        """
+        if not names:
+            return lambda top: self._read_entries(top, unsorted)
+        if type(self).scandir is not FileSystem.scandir:
+            def read(top):
+                dirs, files, links = self._read_entries(top, unsorted)
+                return ([e.name for e in dirs], [e.name for e in files],
+                        links)
+        else:
+            def read(top):
+                names = self.listdir(top)
+                if not unsorted:
+                    names = sorted(names)
+                dirs = []
+                files = []
+                for name in names:
+                    if self.isdir(top / name):
+                        dirs.append(name)
+                    else:
+                        files.append(name)
+                return dirs, files, None
+        return read
+
+
+    def walk(self, top, topdown=True, followlinks=True, unsorted=False,
+             breadth_first=False, cycles=None):
+        "walk: see BaseUri.walk"
+        return self._walk(top, topdown, followlinks, breadth_first,
+                          self._walk_reader(unsorted), cycles)
+
+
+    def scandir(self, path, unsorted=False):
+        """
+        scandir: DirEntry objects for the contents of path, sorted by
+        name unless 'unsorted' is set.
+
+        This implementation asks the backend for the kind of every entry,
+        and size, mtime and mode are looked up with info() when they are
+        needed. Backends that know more when listing a directory should
+        override it.
+        """
+        entries = []
+        for name in self.listdir(path):
+            child = path / name
+            if self.islink(child):
+                kind = LINK
+                if self.isdir(child):
+                    target_kind = DIR
+                elif self.isfile(child):
+                    target_kind = FILE
+                else:
+                    target_kind = None
+                entries.append(DirEntry(path, name, kind, target_kind))
+                continue
+            if self.isdir(child):
+                kind = DIR
+            elif self.isfile(child):
+                kind = FILE
+            else:
+                kind = OTHER
+            entries.append(DirEntry(path, name, kind))
+        if not unsorted:
+            entries.sort(key=lambda entry: entry.name)
+        return entries
+
+
+    def walk_entries(self, top, topdown=True, followlinks=True,
+                     unsorted=False, breadth_first=False, cycles=None):
+        """
+        walk_entries: see BaseUri.walk_entries; built on scandir.
+        """
+        return self._walk(top, topdown, followlinks, breadth_first,
+                          self._walk_reader(unsorted, names=False), cycles)
+
+
+    def _dir_identity(self, path):
+        """
+        _dir_identity: a value telling the directory path apart from all
+        other directories, also when path is reached through symbolic
+        links; parallel_walk uses it to walk every directory only once.
+
+        The path itself does for backends without symlinks, backends
+        with symlinks have to override it.
+        """
+        return self._path(path)
+
+
+    def parallel_walk(self, top, max_workers=8, followlinks=True,
+                      prune=None, unsorted=False, cycles='yield-once'):
+        """
+        parallel_walk: see BaseUri.parallel_walk.
+
+        Every directory is read by a worker thread holding its own lease
+        (see BaseUri.lease), so for a pooled backend the workers use as
+        many connections as the pool allows besides the one of the walk
+        (see _parallel_workers). Exclusive connections that cannot be
+        had for the workers are read one directory after the other by
+        the thread consuming the walk, with its own connection. prune is
+        called in the thread consuming the walk.
+        """
+        seen = self._walk_seen(top, followlinks, cycles)
+        lock = threading.Lock()
+        workers = self._parallel_workers(max_workers)
+
+        def read(path):
+            connection = path.lease()
+            try:
+                dirs, files, links = connection._walk_reader(unsorted)(path)
+                repeated = ()
+                identities = {}
+                if seen is not None:
+                    repeated, identities = connection._walk_cycles(
+                        path, dirs, seen, lock, cycles)
+                children = connection._walk_children(path, dirs, links,
+                                                     followlinks, repeated)
+                return (path, dirs, files,
+                        [(child, identities.get(child))
+                         for child in children])
+            finally:
+                connection.checkin()
+
+        if workers:
+            from concurrent.futures import ThreadPoolExecutor
+            import queue
+            done = queue.SimpleQueue()
+            executor = ThreadPoolExecutor(workers,
+                                          thread_name_prefix='vpath-walk')
+
+            def submit(path):
+                executor.submit(read, path).add_done_callback(done.put)
+
+            def take():
+                return done.get().result()
+        else:
+            # the lease of read is the one this thread holds already
+            executor = None
+            pending = deque()
+            submit = pending.append
+
+            def take():
+                return read(pending.popleft())
+
+        try:
+            submit(top)
+            outstanding = 1
+            while outstanding:
+                path, dirs, files, children = take()
+                outstanding -= 1
+                # hand out the subdirectories before yielding, so that the
+                # workers stay busy while the caller looks at the result
+                for child, identity in children:
+                    if prune is not None and prune(child):
+                        continue
+                    if seen is not None and not self._walk_claim(
+                            child, identity, seen, lock, cycles):
+                        continue
+                    submit(child)
+                    outstanding += 1
+                yield path, dirs, files
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+    def _parallel_workers(self, workers):
+        """
+        _parallel_workers: how many of workers threads can get a
+        connection of this backend at the same time while the calling
+        thread holds one (see BaseUri.lease); 0 if none can, and the
+        calling thread has to do the work with its own connection.
+
+        Shareable connections are used by any number of threads. Of an
+        exclusive pool, the workers get the connections besides the one
+        of the calling thread, while other exclusive connections cannot
+        be used by several threads at all.
+        """
+        if self.shareable:
+            return workers
+        if self._pool is None:
+            return 0
+        return min(workers, self._pool.max_size - 1)
+
+
+    def exists_many(self, paths):
+        """
+        exists_many: exists() for many paths of this backend in one call.
+
+        This is used by URIArray. The default implementation asks for one
+        path after the other; backends that can do better (e.g. a single
+        remote call) should override it, as well as isdir_many and
+        isfile_many.
+
+        @type paths: iterable of URIs, e.g. an URIArray
+        @rtype: list(bool)
+        """
+        return [self.exists(path) for path in paths]
+
+
+    def isdir_many(self, paths):
+        "isdir_many: isdir() for many paths, see exists_many"
+        return [self.isdir(path) for path in paths]
+
+
+    def isfile_many(self, paths):
+        "isfile_many: isfile() for many paths, see exists_many"
+        return [self.isfile(path) for path in paths]
 
 
     def glob(self, path, pattern):
         # TODO-std: is this working with separators?
         res = []
-        for f in path.listdir():
+        for f in self.listdir(path):
             if fnmatch.fnmatch(f, pattern):
                 res.append(path / f)
         return res
@@ -1113,23 +2550,3 @@ class RevisionedFileSystem(FileSystem):
 
     def log_by_time(self, path, start_time=None, stop_time=None):
         raise NotImplementedError
-
-
-entry_points = entry_points()
-try:
-    # Python versions prior to 3.10 return a simple dictonary of entry points
-    selected_entry_points = entry_points.get('abl.vpath.plugins', [])
-except AttributeError:
-    # Python 3.10 returns a dedicated selection interface
-    # Python 3.12 removed the old dictionary interface
-    selected_entry_points = entry_points.select(group='abl.vpath.plugins')
-
-for entrypoint in selected_entry_points:
-    try:
-        plugin_class = entrypoint.load()
-    except Exception as exp:
-        print("Could not load entrypoint", entrypoint)
-        traceback.print_exc()
-        continue
-    CONNECTION_REGISTRY.register(plugin_class.scheme, plugin_class)
-    SCHEME_REGISTRY[plugin_class.scheme] = plugin_class.uri
@@ -4,6 +4,7 @@
 #******************************************************************************
 
 import datetime
+import errno
 import logging
 import os
 import shutil
@@ -13,13 +14,36 @@ import sys
 from functools import partial
 
 from .fs import FileSystem, BaseUri, denormalize_path, URI
+from .direntry import DirEntry, FILE, DIR, LINK, OTHER
 from .exceptions import OperationIsNotSupportedOnPlatform
 
 from abl.util import Bunch, LockFile
 
+try:
+    import fcntl
+except ImportError:
+    # not on Windows
+    fcntl = None
+
 
 LOGGER = logging.getLogger(__name__)
 
+# ioctl to share the blocks of a file with another one (linux/fs.h), on
+# copy-on-write file systems like btrfs and xfs
+FICLONE = 0x40049409
+
+# errors telling that a way of copying is not available for the files
+# at hand, so that the next one has to be tried
+COPY_FALLBACK_ERRNOS = frozenset(
+    getattr(errno, name) for name in ('ENOSYS', 'EXDEV', 'EINVAL', 'ENOTTY',
+                                      'EOPNOTSUPP', 'ENOTSUP', 'EBADF')
+    if hasattr(errno, name))
+
+# bytes per system call for the kernel copies, and buffer size for
+# copying in userspace
+KERNEL_COPY_CHUNK = 1 << 30
+COPY_BUFFER_SIZE = 1 << 20
+
 
 def lchmod(filename, mode):
     if sys.version_info[0] >= 3:
@@ -29,6 +53,8 @@ def lchmod(filename, mode):
 
 
 class LocalFileSystemUri(BaseUri):
+    __slots__ = ()
+
     def __str__(self):
         return self.path
 
@@ -41,12 +67,64 @@ class LocalFileSystemUri(BaseUri):
             return super(LocalFileSystemUri, self).path
 
 
+class LocalDirEntry(DirEntry):
+    """
+    LocalDirEntry: a DirEntry taking its kind from an os.DirEntry, and
+    size, mtime and mode from its (cached) stat() when asked for.
+    """
+
+    __slots__ = ('_entry',)
+
+    def __init__(self, parent, entry):
+        if entry.is_symlink():
+            kind = LINK
+            try:
+                if entry.is_dir():
+                    target_kind = DIR
+                elif entry.is_file():
+                    target_kind = FILE
+                else:
+                    target_kind = OTHER if os.path.exists(entry.path) else None
+            except OSError:
+                target_kind = None
+        else:
+            target_kind = None
+            if entry.is_dir(follow_symlinks=False):
+                kind = DIR
+            elif entry.is_file(follow_symlinks=False):
+                kind = FILE
+            else:
+                kind = OTHER
+        super(LocalDirEntry, self).__init__(parent, entry.name, kind,
+                                            target_kind)
+        self._entry = entry
+
+
+    def _load(self):
+        try:
+            stats = self._entry.stat()
+        except OSError:
+            # a broken link
+            stats = self._entry.stat(follow_symlinks=False)
+        self._size = stats.st_size
+        self._mtime = stats.st_mtime
+        self._mode = stats.st_mode
+
+
+
 class LocalFileSystem(FileSystem):
     scheme = 'file'
     uri = LocalFileSystemUri
+    # holds no resources, so there is nothing to gain from closing it
+    evictable = False
+
+    # the ways _copy_data tries to copy a file, in this order; the last
+    # resort is copying with a buffer
+    copy_methods = ('reflink', 'copy_file_range', 'sendfile')
 
     def _initialize(self):
-        pass
+        # (method, source device, dest device) known not to work
+        self._unsupported = set()
 
 
     def info(self, unc, set_info=None, followlinks=True):
@@ -85,6 +163,51 @@ class LocalFileSystem(FileSystem):
         return sorted(os.listdir(self._path(unc)))
 
 
+    def scandir(self, path, unsorted=False):
+        with os.scandir(self._path(path)) as scanner:
+            entries = [LocalDirEntry(path, entry) for entry in scanner]
+        if not unsorted:
+            entries.sort(key=lambda entry: entry.name)
+        return entries
+
+
+    def _walk_reader(self, unsorted, names=True):
+        """
+        _walk_reader: like FileSystem._walk_reader, but reads each
+        directory with one os.scandir call and takes the file types from
+        its entries, instead of asking isdir and islink for every name.
+        URIs are only created for the directories that are walked.
+        """
+        if not names:
+            return super(LocalFileSystem, self)._walk_reader(unsorted, names)
+        def read(top):
+            with os.scandir(self._path(top)) as scanner:
+                entries = list(scanner)
+            if not unsorted:
+                entries.sort(key=lambda entry: entry.name)
+            dirs = []
+            files = []
+            # for the subdirectories: whether they are symlinks
+            links = {}
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dirs.append(entry.name)
+                    links[entry.name] = entry.is_symlink()
+                else:
+                    files.append(entry.name)
+            return dirs, files, links
+        return read
+
+
+    def _dir_identity(self, path):
+        stats = os.stat(self._path(path))
+        return stats.st_dev, stats.st_ino
+
+
     def removefile(self, unc):
         pth = self._path(unc)
         if sys.platform == 'win32':
@@ -162,6 +285,270 @@ class LocalFileSystem(FileSystem):
         shutil.copystat(source.path, dest.path)
 
 
+    def _copy_file(self, source, dest, dest_connection, use_same_backend):
+        """
+        _copy_file: for copies to local files, let the kernel copy the
+        data (see _copy_data).
+        """
+        if not isinstance(dest_connection, LocalFileSystem):
+            return super(LocalFileSystem, self)._copy_file(
+                source, dest, dest_connection, use_same_backend)
+        with open(self._path(source), 'rb') as infs, \
+             open(dest_connection._path(dest), 'wb') as outfs:
+            _, skipped = self._copy_data(infs.fileno(), outfs.fileno())
+        if use_same_backend:
+            self.copystat(source, dest)
+        return skipped
+
+
+    def _copy_file_ranges(self, source, dest, dest_connection,
+                          use_same_backend, engine):
+        """
+        _copy_file_ranges: for copies to local files, preallocate dest
+        (see _preallocate) and let the workers copy the chunks with
+        os.pread and os.pwrite, which need no lock. Only the data of
+        sparse files is copied, and dest gets the same holes.
+        """
+        if not isinstance(dest_connection, LocalFileSystem):
+            return super(LocalFileSystem, self)._copy_file_ranges(
+                source, dest, dest_connection, use_same_backend, engine)
+        infd = os.open(self._path(source), os.O_RDONLY)
+        try:
+            outfd = os.open(dest_connection._path(dest),
+                            os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o666)
+            try:
+                stats = os.fstat(infd)
+                size = stats.st_size
+                extents = self._fd_extents(infd, stats)
+                if extents is None:
+                    extents = [(0, size)]
+                    self._preallocate(outfd, size)
+                else:
+                    os.ftruncate(outfd, size)
+
+                def read(offset, length):
+                    return os.pread(infd, length, offset)
+
+                def write(offset, data):
+                    view = memoryview(data)
+                    while view:
+                        written = os.pwrite(outfd, view, offset)
+                        view = view[written:]
+                        offset += written
+
+                engine.copy(read, write, extents)
+                if engine.verify:
+                    engine.check(lambda offset, length:
+                                 os.pread(outfd, length, offset), extents)
+            finally:
+                os.close(outfd)
+        finally:
+            os.close(infd)
+        if use_same_backend:
+            self.copystat(source, dest)
+        return size - engine.copied
+
+
+    def _preallocate(self, fd, size):
+        """
+        _preallocate: make the empty file fd size bytes large, with
+        os.posix_fallocate if the file system supports it, so that the
+        chunks written out of order do not fragment it, and a full disk
+        shows before copying
+        """
+        fallocate = getattr(os, 'posix_fallocate', None)
+        if fallocate is not None and size:
+            try:
+                fallocate(fd, 0, size)
+                return
+            except OSError as exc:
+                if exc.errno not in COPY_FALLBACK_ERRNOS:
+                    raise
+        os.ftruncate(fd, size)
+
+
+    def _copy_data(self, infd, outfd):
+        """
+        _copy_data: copy the content of the file infd to the empty file
+        outfd, trying copy_methods one after the other: a reflink, which
+        shares the blocks of the file instead of copying them,
+        os.copy_file_range, which copies within the kernel (and on some
+        file systems on the server or the device), and os.sendfile. If
+        none of them works, the data is copied with a large buffer.
+
+        Sparse files are reflinked or else copied extent by extent (see
+        _data_extents), so that outfd gets the same holes; the other
+        methods would fill them.
+
+        Methods failing for a pair of file systems are not tried again
+        for it.
+
+        @rtype: tuple(str, int)
+        @return: the method used ('sparse' for the copy by extents,
+                 'buffer' for the last resort), and the number of bytes
+                 in holes, which were not copied
+        """
+        stats = os.fstat(infd)
+        size = stats.st_size
+        devices = (stats.st_dev, os.fstat(outfd).st_dev)
+        extents = self._fd_extents(infd, stats)
+        skipped = 0
+        if extents is not None:
+            skipped = size - sum(length for _, length in extents)
+        # files claiming to be empty may still have content (/proc)
+        if size:
+            for method in self.copy_methods:
+                if extents is not None and method != 'reflink':
+                    break
+                if (method, devices) in self._unsupported:
+                    continue
+                try:
+                    copied = getattr(self, '_copy_with_' + method)(infd, outfd)
+                except OSError as exc:
+                    if exc.errno not in COPY_FALLBACK_ERRNOS:
+                        raise
+                    # start over, the method may have failed halfway
+                    os.ftruncate(outfd, 0)
+                    copied = False
+                if copied:
+                    return method, skipped
+                self._unsupported.add((method, devices))
+        if extents is not None:
+            for offset, length in extents:
+                self._copy_range(infd, outfd, offset, length, devices)
+            os.ftruncate(outfd, size)
+            return 'sparse', skipped
+        os.lseek(infd, 0, os.SEEK_SET)
+        os.lseek(outfd, 0, os.SEEK_SET)
+        with open(infd, 'rb', buffering=0, closefd=False) as infs, \
+             open(outfd, 'wb', buffering=0, closefd=False) as outfs:
+            shutil.copyfileobj(infs, outfs, COPY_BUFFER_SIZE)
+        return 'buffer', 0
+
+
+    def _copy_range(self, infd, outfd, offset, length, devices):
+        """
+        _copy_range: copy length bytes at offset of infd to the same
+        offset of outfd, with os.copy_file_range if possible
+        """
+        start = offset
+        end = offset + length
+        method = 'copy_file_range'
+        copy_file_range = getattr(os, method, None)
+        if (copy_file_range is not None and method in self.copy_methods and
+            (method, devices) not in self._unsupported):
+            try:
+                while offset < end:
+                    copied = copy_file_range(infd, outfd, end - offset,
+                                             offset, offset)
+                    if not copied:
+                        if offset == start:
+                            # copies nothing at all on some file systems
+                            raise OSError(errno.EINVAL, "nothing copied")
+                        return
+                    offset += copied
+                return
+            except OSError as exc:
+                if exc.errno not in COPY_FALLBACK_ERRNOS:
+                    raise
+                self._unsupported.add((method, devices))
+        while offset < end:
+            buf = os.pread(infd, min(COPY_BUFFER_SIZE, end - offset), offset)
+            if not buf:
+                return
+            view = memoryview(buf)
+            while view:
+                written = os.pwrite(outfd, view, offset)
+                view = view[written:]
+                offset += written
+
+
+    def _fd_extents(self, fd, stats):
+        """
+        _fd_extents: the (offset, length) of the data in the file fd,
+        found with SEEK_DATA and SEEK_HOLE; None if the file has no
+        holes or the platform or file system cannot tell.
+        """
+        size = stats.st_size
+        blocks = getattr(stats, 'st_blocks', None)
+        # a file without holes has at least as many blocks as bytes
+        if (not hasattr(os, 'SEEK_DATA') or blocks is None or
+            blocks * 512 >= size):
+            return None
+        extents = []
+        data = 0
+        offset = 0
+        try:
+            while offset < size:
+                try:
+                    start = os.lseek(fd, offset, os.SEEK_DATA)
+                except OSError as exc:
+                    if exc.errno == errno.ENXIO:
+                        # a hole up to the end
+                        break
+                    raise
+                end = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+                extents.append((start, end - start))
+                data += end - start
+                offset = end
+        except OSError as exc:
+            if exc.errno in COPY_FALLBACK_ERRNOS:
+                return None
+            raise
+        finally:
+            os.lseek(fd, 0, os.SEEK_SET)
+        if data >= size:
+            # e.g. compressed by the file system
+            return None
+        return extents
+
+
+    def _data_extents(self, path, fileobj):
+        fd = fileobj.fileno()
+        stats = os.fstat(fd)
+        extents = self._fd_extents(fd, stats)
+        if extents is None:
+            return None
+        return extents, stats.st_size
+
+
+    def _copy_with_reflink(self, infd, outfd):
+        if fcntl is None or not sys.platform.startswith('linux'):
+            return False
+        fcntl.ioctl(outfd, FICLONE, infd)
+        return True
+
+
+    def _copy_with_copy_file_range(self, infd, outfd):
+        copy_file_range = getattr(os, 'copy_file_range', None)
+        if copy_file_range is None:
+            return False
+        offset = 0
+        while True:
+            copied = copy_file_range(infd, outfd, KERNEL_COPY_CHUNK,
+                                     offset, offset)
+            if not copied:
+                # some file systems (and overlays) copy nothing at all
+                # instead of failing; _copy_data only calls this for
+                # files that are not empty
+                return offset > 0
+            offset += copied
+
+
+    def _copy_with_sendfile(self, infd, outfd):
+        sendfile = getattr(os, 'sendfile', None)
+        if sendfile is None or not sys.platform.startswith('linux'):
+            # elsewhere, sendfile only sends to sockets
+            return False
+        offset = 0
+        while True:
+            copied = sendfile(outfd, infd, offset, KERNEL_COPY_CHUNK)
+            if not copied:
+                # like copy_file_range
+                return offset > 0
+            offset += copied
+
+
     def supports_symlinks(self):
         return sys.platform != 'win32'
 
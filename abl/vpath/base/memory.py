@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+import bisect
 import mimetypes
 import hashlib
 import time
@@ -12,6 +13,7 @@ from collections import defaultdict
 from io import BytesIO
 
 from .fs import FileSystem, BaseUri
+from .direntry import DirEntry, FILE, DIR, LINK
 
 from abl.util import Bunch, LockFileObtainException
 
@@ -21,6 +23,161 @@ class NodeKind(object):
     LINK = 2
 
 
+ENTRY_KINDS = {
+    NodeKind.FILE: FILE,
+    NodeKind.DIR: DIR,
+    NodeKind.LINK: LINK,
+    }
+
+
+class SparseBuffer(object):
+    """
+    SparseBuffer: the content of a MemoryFile with holes, which are not
+    stored. The data is kept in extents, and everything between them
+    reads as zeros. It implements the part of BytesIO that MemoryFile
+    uses.
+
+    MemoryFile switches to a SparseBuffer when a write or a truncate
+    leaves a hole, e.g. when FileSystem._copy_file copies only the data
+    extents of a sparse file.
+    """
+
+    def __init__(self, data=b''):
+        # sorted, neither overlapping nor touching; bisect on _offsets
+        self._offsets = []
+        self._extents = []
+        if data:
+            self._offsets.append(0)
+            self._extents.append(bytearray(data))
+        self._size = len(data)
+        self._pos = 0
+
+
+    def extents(self):
+        "extents: (offset, length) of the stored data"
+        return [(offset, len(extent))
+                for offset, extent in zip(self._offsets, self._extents)]
+
+
+    def write(self, d):
+        if not d:
+            return 0
+        start = self._pos
+        end = start + len(d)
+        # the extents overlapping or touching start..end are merged into
+        # one; together with the new data, they cover a contiguous range
+        first = bisect.bisect_right(self._offsets, start) - 1
+        if first < 0 or (self._offsets[first] +
+                         len(self._extents[first]) < start):
+            first += 1
+        last = bisect.bisect_right(self._offsets, end)
+        if last - first == 1 and self._offsets[first] <= start:
+            # within or at the end of one extent, e.g. sequential writes
+            offset = self._offsets[first]
+            self._extents[first][start - offset:end - offset] = d
+            self._pos = end
+            self._size = max(self._size, end)
+            return len(d)
+        low = start
+        high = end
+        if first < last:
+            low = min(low, self._offsets[first])
+            high = max(high, self._offsets[last - 1] +
+                       len(self._extents[last - 1]))
+        merged = bytearray(high - low)
+        for i in range(first, last):
+            offset = self._offsets[i] - low
+            extent = self._extents[i]
+            merged[offset:offset + len(extent)] = extent
+        merged[start - low:end - low] = d
+        self._offsets[first:last] = [low]
+        self._extents[first:last] = [merged]
+        self._pos = end
+        self._size = max(self._size, end)
+        return len(d)
+
+
+    def read(self, size=-1):
+        start = self._pos
+        end = self._size
+        if size is not None and size >= 0:
+            end = min(end, start + size)
+        if end <= start:
+            return b''
+        result = bytearray(end - start)
+        i = max(bisect.bisect_right(self._offsets, start) - 1, 0)
+        while i < len(self._offsets) and self._offsets[i] < end:
+            offset = self._offsets[i]
+            extent = self._extents[i]
+            low = max(offset, start)
+            high = min(offset + len(extent), end)
+            if low < high:
+                result[low - start:high - start] = extent[low - offset:
+                                                          high - offset]
+            i += 1
+        self._pos = end
+        return bytes(result)
+
+
+    def readline(self):
+        start = self._pos
+        line = b''
+        while True:
+            chunk = self.read(8192)
+            if not chunk:
+                return line
+            newline = chunk.find(b'\n')
+            if newline >= 0:
+                line += chunk[:newline + 1]
+                self._pos = start + len(line)
+                return line
+            line += chunk
+
+
+    def seek(self, to, whence=0):
+        if whence == 1:
+            to += self._pos
+        elif whence == 2:
+            to += self._size
+        if to < 0:
+            raise ValueError("negative seek value %d" % to)
+        self._pos = to
+        return to
+
+
+    def tell(self):
+        return self._pos
+
+
+    def truncate(self, pos=None):
+        if pos is None:
+            pos = self._pos
+        i = bisect.bisect_left(self._offsets, pos)
+        del self._offsets[i:]
+        del self._extents[i:]
+        if self._extents and self._offsets[-1] + len(self._extents[-1]) > pos:
+            del self._extents[-1][pos - self._offsets[-1]:]
+        self._size = pos
+        return pos
+
+
+    def getvalue(self):
+        pos = self._pos
+        self._pos = 0
+        try:
+            return self.read()
+        finally:
+            self._pos = pos
+
+
+    def flush(self):
+        pass
+
+
+    def seekable(self):
+        return True
+
+
 class MemoryFile(object):
 
     kind = NodeKind.FILE
@@ -53,10 +210,27 @@ class MemoryFile(object):
 
 
     def size(self):
-        return len(self._data.getvalue())
+        pos = self._data.tell()
+        size = self._data.seek(0, 2)
+        self._data.seek(pos)
+        return size
+
+
+    def _make_room(self, end):
+        """
+        _make_room: switch to a SparseBuffer if writing at or truncating
+        to end leaves a hole
+        """
+        data = self._data
+        if data.__class__ is BytesIO:
+            pos = data.tell()
+            if end > data.seek(0, 2):
+                data = self._data = SparseBuffer(data.getvalue())
+            data.seek(pos)
 
 
     def write(self, d):
+        self._make_room(self._data.tell())
         self._data.write(d)
         self.mtime = time.time()
 
@@ -82,6 +256,8 @@ class MemoryFile(object):
 
 
     def truncate(self, pos=None):
+        if pos is not None:
+            self._make_room(pos)
         return self._data.truncate(pos)
 
 
@@ -247,10 +423,7 @@ class MemorySymlink(object):
 
 
 class MemoryFileSystemUri(BaseUri):
-
-    def __init__(self, *args, **kwargs):
-        super(MemoryFileSystemUri, self).__init__(*args, **kwargs)
-        self._next_op_callback = None
+    __slots__ = ()
 
 
 
@@ -308,6 +481,8 @@ class MemoryFileSystem(FileSystem):
         self.lookup_exc_class = OSError
         self._fs = MemoryDir()
         self.next_op_callbacks = {}
+        # the hook is only installed while there are callbacks
+        self._pre_call_hook = None
         MemoryFile.FILE_LOCKS.clear()
 
 
@@ -541,9 +716,74 @@ class MemoryFileSystem(FileSystem):
 
 
     def listdir(self, path):
-        nd = self._get_node(self._fs,
-                            [x for x in self._path(path).split("/") if x])
-        return sorted(nd.keys())
+        return sorted(self._dir_node(path).keys())
+
+
+    def _data_extents(self, path, fileobj):
+        mem_file = fileobj.mem_file
+        if mem_file._data.__class__ is not SparseBuffer:
+            return None
+        return mem_file._data.extents(), mem_file.size()
+
+
+    def _dir_node(self, path):
+        return self._get_node(self._fs,
+                              [x for x in self._path(path).split("/") if x])
+
+
+    def _scan(self, path, nd, unsorted):
+        """
+        _scan: the DirEntry objects for the children of node nd (at path),
+        each with the node it refers to (the target, for links).
+        """
+        scanned = []
+        items = nd.items()
+        if not unsorted:
+            items.sort()
+        for name, node in items:
+            kind = ENTRY_KINDS[node.kind]
+            target_kind = None
+            if node.kind == NodeKind.LINK:
+                try:
+                    target = self._child(nd, name, throw=False)
+                except OSError:
+                    target = None
+                if target is not None:
+                    node = target
+                    target_kind = ENTRY_KINDS[node.kind]
+            scanned.append((DirEntry(path, name, kind, target_kind,
+                                     size=node.size(), mtime=node.mtime,
+                                     mode=node.mode), node))
+        return scanned
+
+
+    def scandir(self, path, unsorted=False):
+        return [entry for entry, _ in
+                self._scan(path, self._dir_node(path), unsorted)]
+
+
+    def _walk_reader(self, unsorted, names=True):
+        """
+        _walk_reader: the read function for FileSystem._walk. Every
+        directory is looked up when it is read, so that the walk sees
+        the tree as it is then, like a walk of a real file system.
+        """
+        def read(top):
+            dirs = []
+            files = []
+            links = {}
+            for entry, _ in self._scan(top, self._dir_node(top), unsorted):
+                if entry.is_dir():
+                    dirs.append(entry.name if names else entry)
+                    links[entry.name] = entry.is_symlink()
+                else:
+                    files.append(entry.name if names else entry)
+            return dirs, files, links
+        return read
+
+
+    def _dir_identity(self, path):
+        return id(self._dir_node(path))
 
 
     def mtime(self, path):
@@ -595,6 +835,10 @@ class MemoryFileSystem(FileSystem):
         if next_op_callback is not self.SENTINEL:
             p = self._path(path)
             self.next_op_callbacks[p] = next_op_callback
+            if any(cb is not None for cb in self.next_op_callbacks.values()):
+                self._pre_call_hook = self.pre_call_hook
+            else:
+                self._pre_call_hook = None
 
 
     def supports_symlinks(self):
@@ -0,0 +1,308 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+pool.py contains the ConnectionPool class, which keeps several backend
+connections for one connection key.
+"""
+
+import threading
+import time
+
+from .exceptions import ConnectionPoolTimeout
+
+
+class ConnectionPool(object):
+    """
+    ConnectionPool: several connections of one backend for the same
+    scheme, host, user and extras.
+
+    The ConnectionRegistry keeps a pool instead of a single connection
+    for keys configured with ConnectionRegistry.configure_pool. Every
+    backend call checks a connection out of the pool and checks it in
+    again afterwards.
+
+    Backends declare with their 'shareable' class attribute how the
+    pool hands out their connections:
+
+      - shareable connections are given to several callers at once. An
+        idle connection is preferred; when there is none, the pool grows
+        up to max_size and then hands out the least busy connection.
+
+      - other connections are checked out exclusively. When all
+        max_size connections are busy, callers wait for one to be
+        checked in, and get a ConnectionPoolTimeout after 'timeout'
+        seconds (None waits forever).
+
+    Leases taken through BaseUri.lease are re-entrant: a thread that has
+    a connection checked out gets the same connection again, so that
+    backend calls made while another one of the same thread runs (md5
+    opening the file, move copying) do not wait for a second exclusive
+    connection.
+
+    Idle connections are closed by prune() after max_idle seconds, but
+    at least min_size connections are kept.
+
+    @type connections: list
+    @ivar connections: all open connections of the pool
+
+    @type closed: bool
+    @ivar closed: set by close(); a closed pool hands out no connections
+                  and closes its connections when they are checked in
+    """
+
+    def __init__(self, factory, shareable=True, min_size=0, max_size=4,
+                 max_idle=None, timeout=None, clock=time.time):
+        """
+        @type factory: callable
+        @param factory: creates a new connection
+
+        @type shareable: bool
+        @param shareable: whether connections can be used by several
+                          callers at once
+
+        @type min_size: int
+        @param min_size: number of connections created up front and kept
+                         by prune()
+
+        @type max_size: int
+        @param max_size: maximal number of connections
+
+        @type max_idle: float|None
+        @param max_idle: seconds after which prune() closes an idle
+                         connection; None keeps them until close()
+
+        @type timeout: float|None
+        @param timeout: seconds to wait for an exclusive connection
+        """
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("invalid pool size %d..%d" % (min_size, max_size))
+        self.factory = factory
+        self.shareable = shareable
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.clock = clock
+        self.connections = []
+        self.closed = False
+        self._creating = 0
+        self._waiting = 0
+        self._condition = threading.Condition(threading.Lock())
+        for _ in range(min_size):
+            self.connections.append(self._create())
+
+
+    def __repr__(self):
+        return '<ConnectionPool %d/%d connections>' % (len(self.connections),
+                                                     self.max_size)
+
+
+    def _create(self):
+        connection = self.factory()
+        connection._pool = self
+        connection._idle_since = self.clock()
+        return connection
+
+
+    def _pick(self, reentrant):
+        """
+        _pick: the connection to hand out, or None if a new one should be
+        created (or, when the pool is full, the caller has to wait).
+        Must be called with the condition held.
+        """
+        if reentrant:
+            thread = threading.get_ident()
+            for connection in self.connections:
+                if thread in connection._leases:
+                    return connection
+        idle = None
+        least_busy = None
+        for connection in self.connections:
+            if not connection._leases:
+                # the most recently used one, so that the others expire
+                if idle is None or connection._idle_since > idle._idle_since:
+                    idle = connection
+            elif (least_busy is None or
+                  len(connection._leases) < len(least_busy._leases)):
+                least_busy = connection
+        if idle is not None:
+            return idle
+        if (self.shareable and least_busy is not None and
+            len(self.connections) + self._creating >= self.max_size):
+            return least_busy
+        return None
+
+
+    def checkout(self, reentrant=False):
+        """
+        checkout: take a connection out of the pool; it must be given
+        back with its checkin method.
+
+        @type reentrant: bool
+        @param reentrant: if the calling thread has a connection checked
+                          out already, hand out that one again
+
+        @rtype: FileSystem|None
+        @return: the connection, or None if the pool has been closed
+
+        @raise ConnectionPoolTimeout: if no connection became available
+                                      within the timeout of the pool
+        """
+        deadline = None
+        with self._condition:
+            while True:
+                if self.closed:
+                    return None
+                connection = self._pick(reentrant)
+                if connection is not None:
+                    connection._leases.append(threading.get_ident())
+                    return connection
+                if len(self.connections) + self._creating < self.max_size:
+                    self._creating += 1
+                    break
+                if self.timeout is not None:
+                    now = time.time()
+                    if deadline is None:
+                        deadline = now + self.timeout
+                    elif now >= deadline:
+                        raise ConnectionPoolTimeout(
+                            "no connection available after %s seconds"
+                            % self.timeout)
+                    remaining = deadline - now
+                else:
+                    remaining = None
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+        # create the connection without holding the condition: connecting
+        # may take a while, and the other connections stay usable meanwhile
+        try:
+            connection = self._create()
+        except:
+            with self._condition:
+                self._creating -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._creating -= 1
+            connection._leases.append(threading.get_ident())
+            self.connections.append(connection)
+        return connection
+
+
+    def checkin(self, connection):
+        "checkin: give a checked out connection back to the pool"
+        with self._condition:
+            leases = connection._leases
+            try:
+                leases.remove(threading.get_ident())
+            except ValueError:
+                # checked in by another thread than the one that
+                # checked it out
+                leases.pop()
+            if leases:
+                return
+            connection._idle_since = self.clock()
+            if not self.closed:
+                self._condition.notify()
+                return
+            self.connections.remove(connection)
+        connection.close()
+
+
+    def any_connection(self):
+        """
+        any_connection: a connection of the pool without checking it out,
+        for callers that need a backend instance but do not run a backend
+        call with it (the least busy one; one is created if the pool is
+        empty).
+        """
+        with self._condition:
+            if self.connections:
+                return min(self.connections, key=lambda c: len(c._leases))
+        connection = self.checkout()
+        if connection is not None:
+            self.checkin(connection)
+        return connection
+
+
+    def prune(self):
+        """
+        prune: remove connections that have been idle for max_idle seconds,
+        keeping min_size connections.
+
+        @rtype: list
+        @return: the removed connections; the caller has to close them
+        """
+        if self.max_idle is None:
+            return []
+        now = self.clock()
+        pruned = []
+        with self._condition:
+            keep = len(self.connections) - self.min_size
+            for connection in list(self.connections):
+                if len(pruned) >= keep:
+                    break
+                if (not connection._leases and
+                    now - connection._idle_since >= self.max_idle):
+                    self.connections.remove(connection)
+                    pruned.append(connection)
+        return pruned
+
+
+    def next_due(self, now):
+        """
+        next_due: the time at which prune() should run next, which is when
+        the first idle connection reaches max_idle. Connections busy now
+        are checked in after now, so they are not due before
+        now + max_idle.
+        """
+        due = now + self.max_idle
+        with self._condition:
+            for connection in self.connections:
+                if not connection._leases:
+                    idle_due = connection._idle_since + self.max_idle
+                    # connections overdue now are kept for min_size
+                    if now < idle_due < due:
+                        due = idle_due
+        return due
+
+
+    def close(self):
+        """
+        close: close the idle connections now and the busy ones when they
+        are checked in. Waiting callers get None from checkout.
+        """
+        with self._condition:
+            self.closed = True
+            idle = [c for c in self.connections if not c._leases]
+            for connection in idle:
+                self.connections.remove(connection)
+            self._condition.notify_all()
+        for connection in idle:
+            connection.close()
+
+
+    def stats(self):
+        """
+        stats: the state of the pool
+
+        @rtype: dict
+        @return: 'size' (open connections), 'busy' (connections
+                 checked out by at least one caller), 'idle', 'waiting'
+                 (callers waiting for a connection), 'min_size' and
+                 'max_size'
+        """
+        with self._condition:
+            busy = len([c for c in self.connections if c._leases])
+            return dict(
+                size=len(self.connections),
+                busy=busy,
+                idle=len(self.connections) - busy,
+                waiting=self._waiting,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                )
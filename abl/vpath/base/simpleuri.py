@@ -11,6 +11,10 @@ try:
 except ImportError: # Python 2
     from urllib import urlencode, unquote_plus
 
+from functools import lru_cache
+from sys import intern
+from types import MappingProxyType
+
 from .uriparse import urisplit, split_authority
 
 
@@ -28,11 +32,121 @@ def parse_query_string(query):
         result[key] = unquote_plus(value)
     return result
 
+PARSE_CACHE_SIZE = 16384
+
+EMPTY_QUERY = MappingProxyType({})
+
+
+def _intern(value):
+    if value:
+        return intern(value)
+    return value
+
+
+def _parse_uri(uri):
+    """
+    _parse_uri: split uri into the components UriParse needs.
+
+    The result is an immutable tuple, so it can be shared between all
+    UriParse instances created from the same uri string. The query dict
+    is handed out as a read-only mapping; UriParse copies it on first
+    access.
+    """
+    if not '://' in uri:
+        full_uri = 'file://'+uri
+    else:
+        full_uri = uri
+    hostname = username = password = ''
+    netloc = ''
+    port = 0
+    vpath_connector = ''
+    scheme, authority, path, query, fragment = urisplit(uri)
+    if authority and '((' in authority:
+        vpath_connector = authority[2:-2]
+        authority = ''
+    if authority:
+        username, password, hostname, port = split_authority(authority)
+        port = int(port or 0)
+    if query:
+        query = MappingProxyType(parse_query_string(query))
+    else:
+        query = EMPTY_QUERY
+
+    if hostname:
+        if port:
+            netloc = ':'.join([hostname,str(port)])
+        else:
+            netloc = hostname
+    # the components besides the path repeat across large numbers of
+    # uris, so all uris share one copy of them
+    return (
+        full_uri,
+        _intern(scheme),
+        _intern(authority),
+        path,
+        query,
+        fragment,
+        _intern(username),
+        _intern(password),
+        _intern(hostname),
+        port,
+        _intern(netloc),
+        _intern(vpath_connector),
+        )
+
+
+_cached_parse_uri = lru_cache(maxsize=PARSE_CACHE_SIZE)(_parse_uri)
+
+
+def parse_cache_info():
+    """
+    parse_cache_info: hits, misses, maxsize and currsize of the
+    uri parse cache (see functools.lru_cache).
+    """
+    return _cached_parse_uri.cache_info()
+
+
+def clear_parse_cache():
+    "clear_parse_cache: drop all cached parse results and reset counters"
+    _cached_parse_uri.cache_clear()
+
+
+def set_parse_cache_size(maxsize):
+    """
+    set_parse_cache_size: resize the uri parse cache. The cache is
+    emptied in the process. A maxsize of 0 disables caching.
+    """
+    global _cached_parse_uri, PARSE_CACHE_SIZE
+    PARSE_CACHE_SIZE = maxsize
+    _cached_parse_uri = lru_cache(maxsize=maxsize)(_parse_uri)
+
+
 class UriParse(object):
     """
     UriParse is a simplistic replacement for urlparse, in case the uri
     in question is not a http url.
+
+    Parse results are cached by uri string (see parse_cache_info). The
+    query dict of a cached result is shared between instances until it
+    is accessed through the 'query' attribute, which hands out a
+    private copy.
     """
+
+    __slots__ = (
+        '_uri',
+        'scheme',
+        'authority',
+        'path',
+        '_query',
+        'fragment',
+        'username',
+        'password',
+        'hostname',
+        'port',
+        'netloc',
+        'vpath_connector',
+        )
+
     def __init__(self, uri=''):
         """
         starts to get complicated: ouchh...
@@ -59,46 +173,75 @@ class UriParse(object):
             >>> str(url) == 'relative/path'
             True
         """
-        self.uri = uri
-        self.hostname = self.username = self.password = ''
-        self.netloc = ''
-        self.port = 0
-        self.query = {}
-        self.scheme = ''
-        self.path = ''
-        self.authority = ''
-        self.vpath_connector = ''
-        self.fragment = ''
-        if not '://' in uri:
-            self.uri = 'file://'+uri
         (
+            self._uri,
             self.scheme,
             self.authority,
             self.path,
-            self.query,
-            self.fragment
-            ) = urisplit(uri)
-        if self.authority and '((' in self.authority:
-            self.vpath_connector = self.authority[2:-2]
-            self.authority = ''
-        if self.authority:
-            (
-                self.username,
-                self.password,
-                self.hostname,
-                self.port,
-                ) = split_authority(self.authority)
-            self.port = int(self.port or 0)
-        if self.query:
-            self.query = parse_query_string(self.query)
-        else:
-            self.query = {}
+            self._query,
+            self.fragment,
+            self.username,
+            self.password,
+            self.hostname,
+            self.port,
+            self.netloc,
+            self.vpath_connector,
+            ) = _cached_parse_uri(uri)
+
+
+    def derive(self, path, query):
+        """
+        derive: a parse result for the same scheme and authority as
+        self, but with 'path' and 'query' instead of the own ones. No
+        uri string is built or parsed for this.
+        """
+        result = self.__class__.__new__(self.__class__)
+        result._uri = None
+        result.scheme = self.scheme
+        result.authority = self.authority
+        result.path = path
+        result._query = query
+        result.fragment = ''
+        result.username = self.username
+        result.password = self.password
+        result.hostname = self.hostname
+        result.port = self.port
+        result.netloc = self.netloc
+        result.vpath_connector = self.vpath_connector
+        return result
 
-        if self.hostname:
-            if self.port:
-                self.netloc = ':'.join([self.hostname,str(self.port)])
-            else:
-                self.netloc = self.hostname
+
+    @property
+    def uri(self):
+        if self._uri is None:
+            self._uri = uri_from_parts(self.as_list())
+        return self._uri
+
+
+    def _get_query(self):
+        query = self._query
+        if type(query) is not dict:
+            # copy on write: the shared parse result must not change
+            query = self._query = dict(query)
+        return query
+
+
+    def _set_query(self, query):
+        self._query = query
+
+
+    query = property(_get_query, _set_query)
+
+
+    def shared_query(self):
+        """
+        shared_query: the query in a form that can be handed to another
+        UriParse instance without both of them seeing each others changes.
+        """
+        query = self._query
+        if type(query) is dict:
+            return query.copy()
+        return query
 
     def __repr__(self):
         return '<SimpleUri (%s,%s,%s,%s,%s,%s) %s>' % (
@@ -107,13 +250,13 @@ class UriParse(object):
             self.port,
             self.username,
             self.password,
-            self.query,
+            dict(self._query),
             self.path
             )
 
     def __str__(self):
-        if self.query:
-            qup = ['%s=%s' % (key, value) for key, value in list(self.query.items())]
+        if self._query:
+            qup = ['%s=%s' % (key, value) for key, value in list(self._query.items())]
             rest = '?'+('&'.join(qup))
         else:
             rest = ''
@@ -150,9 +293,12 @@ class UriParse(object):
             self.scheme == other.scheme and
             self.netloc == other.netloc and
             self.path == other.path and
-            self.query == other.query
+            self._query == other._query
             )
 
+    def __hash__(self):
+        return hash((self.scheme, self.netloc, self.path))
+
     def as_list(self):
         "return some attributes as a list"
         netloc = ''
@@ -166,7 +312,7 @@ class UriParse(object):
             self.scheme,
             netloc,
             self.path,
-            self.query,
+            self._query,
             '',
             ]
 
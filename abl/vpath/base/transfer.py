@@ -0,0 +1,471 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+transfer.py contains the parallel copies behind
+FileSystem.copy(..., workers=N), of directory trees and of single large
+files, and the CopyReport they return.
+"""
+
+import threading
+import time
+import zlib
+
+from .exceptions import CopyError, ChecksumError
+
+
+# small files are handed to the workers in batches of up to BATCH_FILES
+# files or BATCH_BYTES bytes
+BATCH_FILES = 64
+BATCH_BYTES = 1 << 20
+
+# single files are copied in chunks of CHUNK_SIZE bytes by default, each
+# read and written RANGE_BUFFER_SIZE bytes at a time
+CHUNK_SIZE = 64 << 20
+RANGE_BUFFER_SIZE = 1 << 20
+
+
+class CopyReport(object):
+    """
+    CopyReport: what a parallel copy did.
+
+    @type directories: int
+    @ivar directories: number of directories created below the target
+
+    @type files: int
+    @ivar files: number of files copied
+
+    @type links: int
+    @ivar links: number of symbolic links copied as links
+
+    @type bytes: int
+    @ivar bytes: size of the copied files
+
+    @type skipped: int
+    @ivar skipped: bytes of the copied files that are in holes of sparse
+                   files, and were not copied
+
+    @type errors: list
+    @ivar errors: (source, dest, exception) for every copy that failed
+
+    @type seconds: float
+    @ivar seconds: how long the copy took
+    """
+
+    def __init__(self):
+        self.directories = 0
+        self.files = 0
+        self.links = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.errors = []
+        self.seconds = 0.0
+
+
+    @property
+    def throughput(self):
+        "throughput: bytes copied per second"
+        if not self.seconds:
+            return 0.0
+        return self.bytes / self.seconds
+
+
+    def __repr__(self):
+        return ('<CopyReport %d files (%d bytes, %d skipped), %d directories, '
+                '%d links, %d errors in %.3f s>' % (
+                    self.files, self.bytes, self.skipped, self.directories,
+                    self.links, len(self.errors), self.seconds))
+
+
+class ParallelCopy(object):
+    """
+    ParallelCopy: copy a directory tree with a pool of worker threads.
+
+    plan() walks the source and notes the directories, links and files
+    to copy. run() then creates the directories (parents first) and
+    copies the links in the calling thread, and hands the files to the
+    workers, the largest first, so that a few big files do not end up
+    last on an otherwise idle pool (see batches). Each worker leases its own
+    connections (see BaseUri.lease), so pooled backends copy over as
+    many connections as the pool allows besides those the calling thread
+    holds (see _workers).
+
+    A failed copy does not stop the others; run() raises a CopyError
+    with the report, listing every error, once all copies are done.
+    """
+
+    def __init__(self, connection, dest_connection, workers, ignore=(),
+                 followlinks=True, cycles=None, use_same_backend=True):
+        """
+        @type connection: FileSystem
+        @param connection: the backend of the source, leased by the
+                           caller (see with_connection)
+
+        @type dest_connection: FileSystem
+        @param dest_connection: the backend of the target, leased by the
+                                caller for as long as the copy runs;
+                                the source connection if both share a
+                                pool
+
+        @type workers: int
+        @param workers: number of threads copying files
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1, not %r" % workers)
+        self.connection = connection
+        self.dest_connection = dest_connection
+        self.workers = workers
+        self.ignore = ignore
+        self.followlinks = followlinks
+        self.cycles = cycles
+        self.use_same_backend = use_same_backend
+        self.directories = []
+        self.links = []
+        self.files = []
+
+
+    def plan(self, source, droot):
+        """
+        plan: walk source and note what has to be copied to droot, with
+        the same ignore and followlinks semantics as FileSystem.copy.
+        """
+        spth_len = len(source.path.rstrip('/')) + 1
+        for root, dirs, files in self.connection.walk_entries(
+                source, followlinks=self.followlinks, cycles=self.cycles):
+            tojoin = root.path[spth_len:].strip()
+            if tojoin:
+                dbase = droot / tojoin
+            else:
+                dbase = droot
+
+            for entry in dirs[:]:
+                if entry.name in self.ignore:
+                    dirs.remove(entry)
+                    continue
+                pair = (root / entry.name, dbase / entry.name)
+                if entry.is_symlink() and not self.followlinks:
+                    self.links.append(pair)
+                else:
+                    self.directories.append(pair)
+
+            for entry in files:
+                pair = (root / entry.name, dbase / entry.name)
+                if entry.is_symlink() and not self.followlinks:
+                    self.links.append(pair)
+                    continue
+                try:
+                    size = entry.size
+                except EnvironmentError:
+                    # e.g. a broken link; copying it reports the error
+                    size = 0
+                self.files.append((size,) + pair)
+        self.files.sort(key=lambda item: item[0], reverse=True)
+
+
+    def _connections(self, source, dest):
+        connection = source.lease()
+        if self.dest_connection is self.connection:
+            return connection, connection
+        try:
+            return connection, dest.lease()
+        except:
+            connection.checkin()
+            raise
+
+
+    def batches(self):
+        """
+        batches: the files in batches for the workers, the largest first.
+        Small files are copied BATCH_FILES or BATCH_BYTES at a time, so
+        that handing them to a worker does not cost more than copying
+        them.
+        """
+        batch = []
+        batch_bytes = 0
+        for item in self.files:
+            batch.append(item)
+            batch_bytes += item[0]
+            if batch_bytes >= BATCH_BYTES or len(batch) >= BATCH_FILES:
+                yield batch
+                batch = []
+                batch_bytes = 0
+        if batch:
+            yield batch
+
+
+    def copy_files(self, batch):
+        """
+        copy_files: copy a batch of files, in a worker thread
+
+        @return: the bytes skipped in holes, and (source, dest, exception)
+                 for the files that failed
+        """
+        skipped = 0
+        errors = []
+        connection, dest_connection = self._connections(batch[0][1],
+                                                        batch[0][2])
+        try:
+            for size, source, dest in batch:
+                try:
+                    skipped += connection._copy_file(
+                        source, dest, dest_connection,
+                        self.use_same_backend) or 0
+                except Exception as exc:
+                    errors.append((source, dest, exc))
+        finally:
+            if dest_connection is not connection:
+                dest_connection.checkin()
+            connection.checkin()
+        return skipped, errors
+
+
+    def _workers(self):
+        """
+        _workers: how many threads can copy files at once, while the
+        calling thread holds its leases of source and target (see
+        FileSystem._parallel_workers); at most 1 if the calling thread
+        has to copy them one after the other, with its own connections.
+        """
+        workers = self.connection._parallel_workers(self.workers)
+        if self.dest_connection is not self.connection:
+            workers = self.dest_connection._parallel_workers(workers)
+        return workers
+
+
+    def run(self):
+        """
+        run: copy what plan() found.
+
+        @rtype: CopyReport
+
+        @raise CopyError: if some of the copies failed, after all others
+                          are done
+        """
+        report = CopyReport()
+        start = time.time()
+        for source, dest in self.directories:
+            try:
+                self.dest_connection.makedirs(dest)
+            except Exception as exc:
+                report.errors.append((source, dest, exc))
+            else:
+                report.directories += 1
+        for source, dest in self.links:
+            try:
+                self.connection._copy_link(source, dest)
+            except Exception as exc:
+                report.errors.append((source, dest, exc))
+            else:
+                report.links += 1
+
+        def done(batch, copy):
+            try:
+                skipped, errors = copy(batch)
+            except Exception as exc:
+                # leasing the connections failed
+                skipped = 0
+                errors = [(source, dest, exc) for _, source, dest in batch]
+            report.skipped += skipped
+            report.errors.extend(errors)
+            failed = set(id(source) for source, _, _ in errors)
+            for size, source, dest in batch:
+                if id(source) not in failed:
+                    report.files += 1
+                    report.bytes += size
+
+        workers = self._workers()
+        if workers <= 1:
+            for batch in self.batches():
+                done(batch, self.copy_files)
+        else:
+            # not imported up front, to keep importing abl.vpath cheap
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+            with ThreadPoolExecutor(workers,
+                                    thread_name_prefix='vpath-copy') as pool:
+                futures = dict((pool.submit(self.copy_files, batch), batch)
+                               for batch in self.batches())
+                for future in as_completed(futures):
+                    done(futures[future], lambda batch: future.result())
+        report.seconds = time.time() - start
+        if report.errors:
+            raise CopyError(report)
+        return report
+
+
+def locked_reader(fileobj):
+    """
+    locked_reader: a read(offset, length) for RangeCopy on a seekable
+    file object, which the workers take turns to use
+    """
+    lock = threading.Lock()
+
+    def read(offset, length):
+        with lock:
+            fileobj.seek(offset)
+            return fileobj.read(length)
+    return read
+
+
+def locked_writer(fileobj):
+    """
+    locked_writer: a write(offset, data) for RangeCopy on a seekable file
+    object, which the workers take turns to use
+    """
+    lock = threading.Lock()
+
+    def write(offset, data):
+        with lock:
+            fileobj.seek(offset)
+            fileobj.write(data)
+    return write
+
+
+class RangeCopy(object):
+    """
+    RangeCopy: copy a single file in chunks, with a pool of worker
+    threads.
+
+    The backend opens source and target (see
+    FileSystem._copy_file_ranges), makes the target as large as the
+    source, and hands copy() two functions: read(offset, length)
+    returning up to length bytes of the source at offset, and
+    write(offset, data) writing all of data to the target at offset.
+    Both are called by several threads at once. Local files use
+    os.pread and os.pwrite on their own; other backends take turns on
+    one file object each (see locked_reader, locked_writer), which only
+    pays off if their reads and writes give up the GIL while waiting.
+
+    With verify, copy() notes the CRC-32 of every chunk, and check()
+    reads the chunks back from the target and compares.
+    """
+
+    def __init__(self, workers, chunk_size=None, verify=False):
+        """
+        @type workers: int
+        @param workers: number of threads copying chunks
+
+        @type chunk_size: int
+        @param chunk_size: bytes per chunk, CHUNK_SIZE by default
+
+        @type verify: bool
+        @param verify: whether to read back and compare every chunk
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1, not %r" % workers)
+        if chunk_size is None:
+            chunk_size = CHUNK_SIZE
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1, not %r"
+                             % chunk_size)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.verify = verify
+        self.checksums = {}
+        self.copied = 0
+
+
+    def chunks(self, extents):
+        """
+        chunks: the (offset, length) extents of a file, split into chunks
+        of at most chunk_size bytes
+        """
+        for offset, length in extents:
+            end = offset + length
+            while offset < end:
+                yield offset, min(self.chunk_size, end - offset)
+                offset += self.chunk_size
+
+
+    def _map(self, func, extents):
+        """
+        _map: call func(offset, length) for all chunks of extents, in
+        the worker threads; raise the first error once no chunk is
+        being worked on anymore.
+
+        @return: the sum of the results
+        """
+        if self.workers == 1:
+            return sum(func(offset, length)
+                       for offset, length in self.chunks(extents))
+        # not imported up front, to keep importing abl.vpath cheap
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(self.workers,
+                                  thread_name_prefix='vpath-copy')
+        try:
+            futures = [pool.submit(func, offset, length)
+                       for offset, length in self.chunks(extents)]
+            return sum(future.result() for future in futures)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+    def _chunk(self, read, write, offset, length):
+        end = offset + length
+        checksum = 0
+        while offset < end:
+            data = read(offset, min(RANGE_BUFFER_SIZE, end - offset))
+            if not data:
+                raise IOError("the file ends at %d, before %d" % (offset, end))
+            if write is not None:
+                write(offset, data)
+            if self.verify:
+                checksum = zlib.crc32(data, checksum)
+            offset += len(data)
+        return checksum
+
+
+    def copy(self, read, write, extents):
+        """
+        copy: copy the (offset, length) extents of the source
+
+        @rtype: int
+        @return: the number of bytes copied
+        """
+        def copy_chunk(offset, length):
+            checksum = self._chunk(read, write, offset, length)
+            if self.verify:
+                self.checksums[offset] = checksum
+            return length
+        self.copied += self._map(copy_chunk, extents)
+        return self.copied
+
+
+    def check(self, read, extents):
+        """
+        check: compare the chunks of extents read back from the target
+        with what copy() wrote
+
+        @raise ChecksumError: for the first chunk that differs
+        """
+        def check_chunk(offset, length):
+            checksum = self._chunk(read, None, offset, length)
+            if checksum != self.checksums[offset]:
+                raise ChecksumError("the %d bytes at %d differ from the "
+                                    "original" % (length, offset))
+            return length
+        self._map(check_chunk, extents)
+
+
+    def run(self, connection, source, dest, dest_connection,
+            use_same_backend):
+        """
+        run: copy the file source to dest
+
+        @rtype: CopyReport
+
+        @raise CopyError: if the copy failed
+        """
+        report = CopyReport()
+        start = time.time()
+        try:
+            report.skipped = connection._copy_file_ranges(
+                source, dest, dest_connection, use_same_backend, self)
+        except Exception as exc:
+            report.errors.append((source, dest, exc))
+        else:
+            report.files = 1
+            report.bytes = self.copied + report.skipped
+        report.seconds = time.time() - start
+        if report.errors:
+            raise CopyError(report)
+        return report
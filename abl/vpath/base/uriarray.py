@@ -0,0 +1,232 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+uriarray.py contains the URIArray class, a column of paths that all
+live below one root URI.
+"""
+
+import os
+from collections import OrderedDict
+
+
+class URIArray(object):
+    """
+    URIArray: many paths below one root URI, stored as plain strings.
+
+    Scheme, authority, credentials, query and extras are kept once in
+    the root URI; the entries themselves are only their paths relative to
+    the root ('a/b.txt' for root / 'a' / 'b.txt'). The path operations of
+    BaseUri are available as batch operations working on these strings,
+    and URI objects are only created when an entry is accessed (by
+    index or iteration).
+
+    The batch checks (exists, isdir, isfile) are handed to the backend
+    of the root URI as one call (see FileSystem.exists_many).
+
+    @type root: BaseUri
+    @ivar root: the URI all paths are relative to
+
+    @type relpaths: tuple
+    @ivar relpaths: the paths relative to root, '/' separated
+    """
+
+    __slots__ = ('root', 'relpaths')
+
+    def __init__(self, root, relpaths=()):
+        self.root = root
+        sep = root.sep
+        if sep != '/':
+            relpaths = (p.replace(sep, '/') for p in relpaths)
+        self.relpaths = tuple(relpaths)
+
+
+    @classmethod
+    def from_uris(cls, root, uris):
+        """
+        from_uris: build an URIArray from URIs below root.
+
+        @raise ValueError: if one of the URIs is not located below root
+        """
+        prefix = root.parse_result.path.rstrip('/') + '/'
+        authority = root.parse_result.as_list()[:2]
+        relpaths = []
+        for uri in uris:
+            path = uri.parse_result.path
+            if (uri.parse_result.as_list()[:2] != authority or
+                not path.startswith(prefix)):
+                raise ValueError("%s is not below %s" % (uri, root))
+            relpaths.append(path[len(prefix):])
+        return cls(root, relpaths)
+
+
+    def _new(self, relpaths):
+        result = self.__class__.__new__(self.__class__)
+        result.root = self.root
+        result.relpaths = tuple(relpaths)
+        return result
+
+
+    def _uri(self, relpath):
+        root = self.root
+        if not relpath:
+            return root
+        path = root.parse_result.path.rstrip('/') + '/' + relpath
+        return root._derive(path, root.parse_result.shared_query())
+
+
+    def __len__(self):
+        return len(self.relpaths)
+
+
+    def __iter__(self):
+        for relpath in self.relpaths:
+            yield self._uri(relpath)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._new(self.relpaths[index])
+        return self._uri(self.relpaths[index])
+
+
+    def __eq__(self, other):
+        if not isinstance(other, URIArray):
+            return False
+        return self.root == other.root and self.relpaths == other.relpaths
+
+
+    def __ne__(self, other):
+        return not self == other
+
+
+    def __repr__(self):
+        return '<URIArray %s [%d paths]>' % (self.root, len(self.relpaths))
+
+
+    def uris(self):
+        "uris: all entries as a list of URI objects"
+        return list(self)
+
+
+    def join(self, *args):
+        """
+        join: join path parts to every entry, like BaseUri.join.
+
+        @rtype: URIArray
+        """
+        sep = self.root.sep
+        if sep != '/':
+            args = [x.replace(sep, '/') for x in args]
+        suffix = '/'.join([x.strip('/') for x in args[:-1]] + [args[-1]])
+        return self._new([(p.rstrip('/') + '/' + suffix) if p else suffix
+                          for p in self.relpaths])
+
+
+    def split(self):
+        """
+        split: like BaseUri.split for every entry.
+
+        @rtype: tuple(URIArray, list)
+        @return: the directories of all entries and a list of basenames.
+                 Entries directly below the root get the root (relative
+                 path '') as their directory.
+        """
+        heads = []
+        tails = []
+        for p in self.relpaths:
+            head, _, tail = p.rpartition('/')
+            heads.append(head)
+            tails.append(tail)
+        return self._new(heads), tails
+
+
+    def directory(self):
+        """
+        @return: the first part of the split method
+        """
+        return self._new([p.rpartition('/')[0] for p in self.relpaths])
+
+
+    # os.path-compliance
+    dirname = directory
+
+    def basename(self):
+        """
+        @return: the second part of the split method
+        """
+        return [p.rpartition('/')[2] for p in self.relpaths]
+
+
+    def splitext(self):
+        splitext = os.path.splitext
+        return [splitext(p.rpartition('/')[2]) for p in self.relpaths]
+
+
+    def last(self):
+        """
+        last: like BaseUri.last for every entry.
+        """
+        result = []
+        for p in self.relpaths:
+            if not p:
+                result.append(self.root.last())
+                continue
+            if p.endswith('/'):
+                p = p[:-1]
+            result.append(p.rpartition('/')[2])
+        return result
+
+
+    def group_by_directory(self):
+        """
+        group_by_directory: group the entries by their directory.
+
+        @rtype: OrderedDict
+        @return: maps the directory of entries (relative to root, '' for
+                 the root itself) to the basenames of the entries in
+                 it, in the order of first appearance.
+        """
+        groups = OrderedDict()
+        for p in self.relpaths:
+            head, _, tail = p.rpartition('/')
+            try:
+                groups[head].append(tail)
+            except KeyError:
+                groups[head] = [tail]
+        return groups
+
+
+    def _batch(self, name):
+        connection = self.root.lease()
+        try:
+            return getattr(connection, name)(self)
+        finally:
+            connection.checkin()
+
+
+    def exists(self):
+        """
+        exists: exists() of all entries
+
+        @rtype: list(bool)
+        """
+        return self._batch('exists_many')
+
+
+    def isdir(self):
+        """
+        isdir: isdir() of all entries
+
+        @rtype: list(bool)
+        """
+        return self._batch('isdir_many')
+
+
+    def isfile(self):
+        """
+        isfile: isfile() of all entries
+
+        @rtype: list(bool)
+        """
+        return self._batch('isfile_many')
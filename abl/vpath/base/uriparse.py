@@ -57,6 +57,11 @@ from __future__ import print_function
 
 import re
 
+# matches the '((...))' vpath connector of nested uris
+INNER_PART_RE = re.compile(r'\(\(.*?\)\)')
+# regex straight from STD 66 section B
+STD66_RE = re.compile(r'^(([^:/?#]+):)?(//([^/?#]*))?([^?#]*)(\?([^#]*))?(#(.*))?')
+
 def urisplit(uri):
     """
        Basic URI Parser according to STD66 aka RFC3986
@@ -65,15 +70,13 @@ def urisplit(uri):
        ('scheme', 'authority', 'path', 'query', 'fragment')
 
     """
-    inner_part = re.compile(r'\(\(.*?\)\)')
-    m = inner_part.search(uri)
     inner_value = ''
-    if m is not None:
-        inner_value = uri[m.start():m.end()]
-        uri = uri[:m.start()]+'__inner_part__'+uri[m.end():]
-    # regex straight from STD 66 section B
-    regex = '^(([^:/?#]+):)?(//([^/?#]*))?([^?#]*)(\?([^#]*))?(#(.*))?'
-    p = re.match(regex, uri).groups()
+    if '((' in uri:
+        m = INNER_PART_RE.search(uri)
+        if m is not None:
+            inner_value = uri[m.start():m.end()]
+            uri = uri[:m.start()]+'__inner_part__'+uri[m.end():]
+    p = STD66_RE.match(uri).groups()
     scheme, authority, path, query, fragment = p[1], p[3], p[4], p[6], p[8]
     #if not path: path = None
     authority = authority.replace('__inner_part__', inner_value)
@@ -3,18 +3,61 @@
 # Author: Stephan Diehl <stephan.diehl@ableton.com>
 #******************************************************************************
 
-from io import BytesIO
-from zipfile import ZipFile
+import os
+import shutil
+import stat
+import struct
+import threading
+import time
+from collections import OrderedDict
+from zipfile import ZipFile, ZipInfo, ZipExtFile, BadZipFile
 
 from .fs import FileSystem, BaseUri, URI
-from .exceptions import FileDoesNotExistError
+from .direntry import DirEntry, FILE, DIR
+from .exceptions import FileDoesNotExistError, CopyError
+from .localfs import LocalFileSystem
+from .transfer import CopyReport
+
+
+# the fixed part of the local header before each member: signature,
+# versions, flags, compression, time, date, crc, sizes, and the lengths
+# of the name and the extra field
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# bytes decompressed and written at a time when extracting
+EXTRACT_BUFFER_SIZE = 1 << 20
 
 
 class WriteStatement(object):
-    def __init__(self, path_string, zip_backend):
+    """
+    WriteStatement: a member being written to the archive. The data is
+    compressed and written to the archive as it comes (see
+    ZipFile.open), so that only the compressor holds on to some of it.
+    """
+
+    def __init__(self, path_string, zip_backend, compression=None,
+                 compresslevel=None, size=None, force_zip64=False):
         self.path_string = path_string
         self.zip_backend = zip_backend
-        self.byte_buffer = BytesIO()
+        ziphandle = zip_backend._ziphandle
+        info = ZipInfo(path_string, date_time=time.localtime()[:6])
+        # like ZipFile.writestr
+        info.external_attr = 0o600 << 16
+        if compression is None:
+            compression = ziphandle.compression
+        info.compress_type = compression
+        if compresslevel is None:
+            compresslevel = ziphandle.compresslevel
+        if hasattr(ZipInfo, 'compress_level'):
+            info.compress_level = compresslevel
+        else:
+            # before Python 3.13
+            info._compresslevel = compresslevel
+        if size is not None:
+            # tells ZipFile whether the member needs ZIP64 extensions
+            info.file_size = size
+        self.stream = ziphandle.open(info, 'w', force_zip64=force_zip64)
 
 
     def __enter__(self):
@@ -22,15 +65,157 @@ class WriteStatement(object):
 
 
     def __exit__(self, etype, evalue, etraceback):
-        self.zip_backend._ziphandle.writestr(self.path_string,
-                                             self.byte_buffer.getvalue())
-        self.byte_buffer.close()
-        self.zip_backend.close_zip()
-        self.zip_backend.open_zip()
+        self.close()
+
+
+    def close(self):
+        if self.stream is None:
+            return
+        try:
+            self.stream.close()
+        finally:
+            self.stream = None
+            if self.zip_backend._session is None:
+                self.zip_backend.close_zip()
 
 
     def __getattr__(self, attr):
-        return getattr(self.byte_buffer, attr)
+        return getattr(self.stream, attr)
+
+
+class WriteSession(object):
+    """
+    WriteSession: write many members to an archive through one ZipFile,
+    which writes the central directory once, when the session ends.
+    Without a session, every member written rewrites it.
+
+    Leaving the session with an exception (or calling abort) restores
+    the archive as it was: appended members are written over the old
+    central directory, which is saved when the session starts and
+    written back, and an archive created by the session is removed.
+    A process dying in a session leaves the archive without a central
+    directory, though.
+
+    Within the session, the members of the archive are looked up and
+    read through the ZipFile being written.
+    """
+
+    def __init__(self, zip_backend):
+        self.zip_backend = zip_backend
+        self.created = False
+        self.start_dir = None
+        self.tail = None
+
+
+    def __enter__(self):
+        backend = self.zip_backend
+        if backend._session is not None:
+            raise ValueError("%s is already being written"
+                             % backend.vpath_connector)
+        backend.open_zip('w')
+        ziphandle = backend._ziphandle
+        self.created = ziphandle.mode == 'w'
+        if not self.created:
+            # the old central directory, which the new members overwrite
+            file_handle = backend._file_handle
+            self.start_dir = ziphandle.start_dir
+            file_handle.seek(self.start_dir)
+            self.tail = file_handle.read()
+            file_handle.seek(self.start_dir)
+        backend._session = self
+        return self
+
+
+    def __exit__(self, etype, evalue, etraceback):
+        if etype is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+    def commit(self):
+        "commit: write the central directory and end the session"
+        backend = self.zip_backend
+        try:
+            backend.close_zip()
+        except:
+            self.abort()
+            raise
+        backend._session = None
+
+
+    def abort(self):
+        "abort: restore the archive as it was and end the session"
+        backend = self.zip_backend
+        file_handle = backend._file_handle
+        backend._session = None
+        # the index has the members written
+        backend._index = None
+        try:
+            # the central directory it writes is cut off below
+            backend._ziphandle.close()
+        except Exception:
+            pass
+        backend._ziphandle = None
+        backend._file_handle = None
+        if file_handle is None:
+            return
+        if self.created:
+            file_handle.close()
+            backend._zip_file_path().remove()
+        else:
+            try:
+                file_handle.seek(self.start_dir)
+                file_handle.write(self.tail)
+                file_handle.truncate()
+            finally:
+                file_handle.close()
+
+
+class MemberReader(object):
+    """
+    MemberReader: opens the members of an archive for the threads of an
+    extraction (see ZipFileSystem.extract).
+
+    For archives in local files, every thread reads through a file
+    handle of its own, and opens the members by their ZipInfo, without
+    parsing the central directory again. The handles of other backends
+    may share their position (those of memory:// files do), so there
+    the threads share the ZipFile of the archive, which lets them take
+    turns reading the compressed data, but decompress at the same time.
+    """
+
+    def __init__(self, archive, local_path=None):
+        self.archive = archive
+        self.local_path = local_path
+        self._local = threading.local()
+        self._handles = []
+
+
+    def open(self, info):
+        "open: the member with the ZipInfo info, for reading"
+        if self.local_path is None:
+            return self.archive.ziphandle.open(info)
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            handle = self._local.handle = open(self.local_path, 'rb')
+            # list.append is atomic
+            self._handles.append(handle)
+        if info.flag_bits & 0x1:
+            raise RuntimeError("%s is encrypted" % info.filename)
+        handle.seek(info.header_offset)
+        header = handle.read(LOCAL_HEADER.size)
+        if (len(header) != LOCAL_HEADER.size or
+            header[:4] != LOCAL_HEADER_SIGNATURE):
+            raise BadZipFile("no local header for %s" % info.filename)
+        name_length, extra_length = LOCAL_HEADER.unpack(header)[-2:]
+        handle.seek(name_length + extra_length, 1)
+        return ZipExtFile(handle, 'r', info)
+
+
+    def close(self):
+        for handle in self._handles:
+            handle.close()
 
 
 ISDIR = 1
@@ -89,29 +274,371 @@ def compare_parts(list1, list2):
         return ISFILE
 
 
+class ZipIndex(object):
+    """
+    ZipIndex: the directory tree of the members of an archive, so that
+    looking up a path does not go through all member names.
+
+    Member names count as absolute paths, with or without a leading '/'.
+    A directory exists if a member is below it, or if the archive has an
+    entry for it (a name ending in '/'). A name that is a file and a
+    directory at the same time counts as a directory.
+    """
+
+    def __init__(self):
+        # directory path -> names in it
+        self.dirs = {'/': set()}
+        # file path -> ZipInfo, the last one for duplicate names
+        self.files = {}
+        # number of ZipInfos indexed, see update
+        self.count = 0
+
+
+    @staticmethod
+    def normalize(path):
+        "normalize: path as a key of dirs and files"
+        path = path.strip('/')
+        if '//' in path:
+            path = '/'.join(part for part in path.split('/') if part)
+        return '/' + path
+
+
+    def update(self, infolist):
+        """
+        update: index the ZipInfos of infolist that are not yet. Archives
+        only ever grow at the end of their central directory, so these
+        are the ones after the first count.
+        """
+        for info in infolist[self.count:]:
+            self.add(info)
+        self.count = len(infolist)
+
+
+    def add(self, info):
+        path = self.normalize(info.filename)
+        if path == '/':
+            return
+        if info.filename.endswith('/'):
+            self._add_dir(path)
+        else:
+            self.files[path] = info
+            parent, _, name = path.rpartition('/')
+            self._add_dir(parent or '/').add(name)
+
+
+    def _add_dir(self, path):
+        "_add_dir: the names in the directory path, added with its parents"
+        names = self.dirs.get(path)
+        if names is None:
+            names = self.dirs[path] = set()
+            parent, _, name = path.rpartition('/')
+            self._add_dir(parent or '/').add(name)
+        return names
+
+
+    def isdir(self, path):
+        return self.normalize(path) in self.dirs
+
+
+    def isfile(self, path):
+        path = self.normalize(path)
+        return path in self.files and path not in self.dirs
+
+
+    def exists(self, path):
+        path = self.normalize(path)
+        return path in self.dirs or path in self.files
+
+
+    def listdir(self, path):
+        """
+        listdir: the names in the directory path
+
+        @raise KeyError: if path is no directory
+        """
+        return sorted(self.dirs[self.normalize(path)])
+
+
+# the number of archives kept open for reading by all ZipFileSystems
+# together, see ArchiveCache
+MAX_OPEN_ARCHIVES = 32
+
+
+class OpenArchive(object):
+    """
+    OpenArchive: an archive open for reading, with its ZipIndex, and the
+    stamp of its container when it was opened (see
+    ZipFileSystem._stamp).
+
+    The ZipFile can be read by several threads at once, see
+    zipfile.ZipFile.open. Readers of members acquire the archive and
+    release it when they are done; closing the archive while some are
+    still reading only marks it, and the last one to release it closes
+    it.
+    """
+
+    def __init__(self, file_handle, ziphandle, stamp, index=None):
+        self.file_handle = file_handle
+        self.ziphandle = ziphandle
+        self.stamp = stamp
+        self._index = index
+        self._lock = threading.Lock()
+        self._readers = 0
+        self._closing = False
+
+
+    def acquire(self):
+        """
+        acquire: keep the archive open until release is called
+
+        @rtype: bool
+        @return: False if the archive is being closed; the caller has to
+                 open it anew
+        """
+        with self._lock:
+            if self._closing:
+                return False
+            self._readers += 1
+            return True
+
+
+    def release(self):
+        "release: give back what acquire took"
+        with self._lock:
+            self._readers -= 1
+            close = self._closing and not self._readers
+        if close:
+            self._close()
+
+
+    def get_index(self):
+        """
+        get_index: the ZipIndex of the archive, built when first needed.
+        An index handed over from a write to the archive is extended by
+        the members written (see ZipIndex.update).
+        """
+        with self._lock:
+            infolist = self.ziphandle.infolist()
+            if self._index is None or len(infolist) < self._index.count:
+                self._index = ZipIndex()
+            self._index.update(infolist)
+            return self._index
+
+
+    def close(self):
+        "close: close the archive, once its readers have released it"
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            close = not self._readers
+        if close:
+            self._close()
+
+
+    def _close(self):
+        self.ziphandle.close()
+        self.file_handle.close()
+
+
+class ReadStatement(object):
+    """
+    ReadStatement: a member being read from an archive open for
+    reading, which keeps the archive open until the member is closed.
+    """
+
+    def __init__(self, stream, archive):
+        self.stream = stream
+        self.archive = archive
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, etype, evalue, etraceback):
+        self.close()
+
+
+    def __iter__(self):
+        return iter(self.stream)
+
+
+    def close(self):
+        archive, self.archive = self.archive, None
+        if archive is None:
+            return
+        try:
+            self.stream.close()
+        finally:
+            archive.release()
+
+
+    def __del__(self):
+        if getattr(self, 'archive', None) is not None:
+            self.close()
+
+
+    def __getattr__(self, attr):
+        return getattr(self.stream, attr)
+
+
+class ArchiveCache(object):
+    """
+    ArchiveCache: the archives that ZipFileSystems keep open for
+    reading, by the URI of their container, so that reading many members
+    parses the central directory only once.
+
+    At most max_open archives stay in the cache, opening another one
+    closes the least recently used. Members still being read from it
+    keep it open until they are closed (see OpenArchive).
+    """
+
+    def __init__(self, max_open=MAX_OPEN_ARCHIVES):
+        self.max_open = max_open
+        self._archives = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._archives)
+
+
+    def get(self, key):
+        "get: the OpenArchive for key, or None"
+        with self._lock:
+            archive = self._archives.get(key)
+            if archive is not None:
+                self._archives.move_to_end(key)
+            return archive
+
+
+    def put(self, key, archive):
+        "put: keep archive open for key, instead of the one there was"
+        with self._lock:
+            closing = [self._archives.pop(key, None)]
+            self._archives[key] = archive
+            closing.extend(self._evict())
+        self._close(closing)
+
+
+    def discard(self, key):
+        "discard: close the archive open for key, if any"
+        with self._lock:
+            archive = self._archives.pop(key, None)
+        self._close([archive])
+
+
+    def configure(self, max_open):
+        """
+        configure: set the number of archives kept open, and close the
+        least recently used ones beyond it
+        """
+        with self._lock:
+            self.max_open = max_open
+            closing = self._evict()
+        self._close(closing)
+
+
+    def clear(self):
+        "clear: close all archives"
+        with self._lock:
+            closing = list(self._archives.values())
+            self._archives.clear()
+        self._close(closing)
+
+
+    def _evict(self):
+        evicted = []
+        while len(self._archives) > max(self.max_open, 0):
+            evicted.append(self._archives.popitem(last=False)[1])
+        return evicted
+
+
+    def _close(self, archives):
+        for archive in archives:
+            if archive is not None:
+                archive.close()
+
+
+ARCHIVES = ArchiveCache()
+
+
 class ZipFileSystemUri(BaseUri):
-    pass
+    __slots__ = ()
+
+    def write_session(self):
+        """
+        write_session: a WriteSession for the archive, to write many
+        members to it, e.g.::
+
+          with root.write_session():
+              for name, data in members:
+                  with (root / name).open('wb') as outf:
+                      outf.write(data)
+
+        @rtype: WriteSession
+        """
+        return self.get_connection().write_session()
+
+
+    def extract(self, dest, members=None, workers=None):
+        """
+        extract: extract the members below self to the directory dest,
+        see ZipFileSystem.extract
+
+        @rtype: CopyReport
+        """
+        return self.get_connection().extract(self, dest, members, workers)
 
 
 class ZipFileSystem(FileSystem):
     scheme = 'zip'
     uri = ZipFileSystemUri
+    # the ZipFile open for writing must not be used by several threads
+    # at once
+    shareable = False
+
+
+    # the archives open for reading, shared by all ZipFileSystems
+    archives = ARCHIVES
 
 
     def _zip_file_path(self):
-        return URI(self.vpath_connector)
+        if self._container is None:
+            self._container = URI(self.vpath_connector)
+        return self._container
 
 
     def _initialize(self):
+        self._container = None
+        # the archive open for writing
         self._file_handle = None
         self._ziphandle = None
+        # the index of the archive open for writing, see close_zip
+        self._index = None
+        self._session = None
+
+
+    def close(self):
+        self.close_zip()
+        self.archives.discard(self.vpath_connector)
 
 
     def close_zip(self):
+        """
+        close_zip: close the archive opened with open_zip. The index of
+        the archive goes with the members written to the archive that is
+        opened for reading next (see _archive).
+        """
         if self._ziphandle is not None:
+            if self._index is not None:
+                self._index.update(self._ziphandle.infolist())
             self._ziphandle.close()
+            self._ziphandle = None
         if self._file_handle is not None:
             self._file_handle.close()
+            self._file_handle = None
 
 
     def open_zip(self, options=None):
@@ -120,10 +647,15 @@ class ZipFileSystem(FileSystem):
             zip_options = 'r'
             options = 'rb'
         if 'w' in options:
-            if self._zip_file_path().isfile():
+            archive = self._archive()
+            if archive is not None:
+                self._index = archive.get_index()
+                # written to, it has to be opened anew anyway
+                self.archives.discard(self.vpath_connector)
                 zip_options = 'a'
                 options = 'r+b'
             else:
+                self._index = ZipIndex()
                 zip_options = 'w'
                 options = 'wb'
 
@@ -131,40 +663,400 @@ class ZipFileSystem(FileSystem):
         self._ziphandle = ZipFile(self._file_handle, zip_options)
 
 
-    def open(self, unc, options=None, mimetype='application/octet-stream'):
-        self.open_zip(options)
+    def write_session(self):
+        """
+        write_session: a WriteSession, see ZipFileSystemUri.write_session
+        """
+        return WriteSession(self)
+
+
+    def extract(self, path, dest, members=None, workers=None):
+        """
+        extract: extract the members below path to the directory dest,
+        which is created if needed. The files are decompressed by a pool
+        of worker threads (zlib and bz2 let go of the GIL), the largest
+        first, after creating all directories. Local targets are
+        preallocated to the size of the member (see
+        LocalFileSystem._preallocate).
+
+        Member paths are sanitized like zipfile.ZipFile.extract does:
+        drive letters and empty, '.' and '..' parts are dropped. Members
+        whose target would still not be below dest, e.g. through a
+        symbolic link in dest, are not extracted but reported as errors.
+
+        @type path: ZipFileSystemUri
+        @param path: the directory of the archive to extract
+
+        @type dest: URI
+        @param dest: the directory to extract to
+
+        @type members: list
+        @param members: paths relative to path of the files and
+                        directories to extract; all by default
+
+        @type workers: int
+        @param workers: number of threads extracting files; by default,
+                        they are extracted one after the other
+
+        @rtype: CopyReport
+        @return: what was extracted, and how fast (see
+                 CopyReport.throughput)
+
+        @raise CopyError: if some of the files could not be extracted,
+                          once all others are
+        """
+        if workers is None:
+            workers = 1
+        if workers < 1:
+            raise ValueError("workers must be at least 1, not %r" % workers)
+        if self._session is not None:
+            raise ValueError("%s is being written" % self.vpath_connector)
+        archive = self._acquire_archive()
+        try:
+            return self._extract(archive, path, dest, members, workers)
+        finally:
+            archive.release()
+
+
+    def _extract(self, archive, path, dest, members, workers):
+        directories, files = self._extract_plan(archive.get_index(), path,
+                                                members)
+        # see FileSystem.copy
+        dest_connection = dest.lease()
+        try:
+            return self._extract_to(archive, path, dest, dest_connection,
+                                    directories, files, workers)
+        finally:
+            dest_connection.checkin()
+
+
+    def _extract_to(self, archive, path, dest, dest_connection, directories,
+                    files, workers):
+        if not dest_connection.shareable:
+            workers = 1
+
+        report = CopyReport()
+        start = time.time()
+        dest_connection.makedirs(dest)
+        dest_root = None
+        if isinstance(dest_connection, LocalFileSystem):
+            dest_root = os.path.realpath(dest_connection._path(dest))
+
+        def target(relative, is_file):
+            # None if rejected, after reporting it
+            try:
+                result = self._extract_target(dest, relative, dest_root)
+                if result is None and is_file:
+                    raise ValueError("no file name is left of %r" % relative)
+            except ValueError as exc:
+                report.errors.append((path / relative, dest, exc))
+                return None
+            return result
+
+        for relative in directories:
+            dest_dir = target(relative, False)
+            if dest_dir is None:
+                continue
+            try:
+                dest_connection.makedirs(dest_dir)
+            except Exception as exc:
+                report.errors.append((path / relative, dest_dir, exc))
+            else:
+                report.directories += 1
+        files = [(relative, info, target(relative, True))
+                 for relative, info in files]
+        files = [item for item in files if item[2] is not None]
+
+        reader = MemberReader(archive, self._local_path())
+
+        def extract_file(item):
+            relative, info, dest_file = item
+            self._extract_file(reader, info, dest_file, dest_connection)
+
+        def done(item, extract):
+            relative, info, dest_file = item
+            try:
+                extract(item)
+            except Exception as exc:
+                report.errors.append((path / relative, dest_file, exc))
+            else:
+                report.files += 1
+                report.bytes += info.file_size
+
+        try:
+            if workers == 1:
+                for item in files:
+                    done(item, extract_file)
+            else:
+                # not imported up front, to keep importing abl.vpath cheap
+                from concurrent.futures import ThreadPoolExecutor, as_completed
+                with ThreadPoolExecutor(
+                        workers, thread_name_prefix='vpath-extract') as pool:
+                    futures = dict((pool.submit(extract_file, item), item)
+                                   for item in files)
+                    for future in as_completed(futures):
+                        done(futures[future], lambda item: future.result())
+        finally:
+            reader.close()
+        report.seconds = time.time() - start
+        if report.errors:
+            raise CopyError(report)
+        return report
+
+
+    def _extract_plan(self, index, path, members):
+        """
+        _extract_plan: what extract has to do
+
+        @return: the directories to create, parents first, and
+                 (path, ZipInfo) of the files to extract, the largest
+                 first, with paths relative to path
+        """
+        root = index.normalize(self._path(path))
+        if root not in index.dirs:
+            raise FileDoesNotExistError(str(path))
+        if members is None:
+            tops = [root]
+        else:
+            tops = [index.normalize(root + '/' + member)
+                    for member in members]
+        skip = len(root.rstrip('/')) + 1
+        directories = set()
+        files = {}
+        for top in tops:
+            if top in index.dirs:
+                stack = [top]
+                while stack:
+                    directory = stack.pop()
+                    if directory != root:
+                        directories.add(directory[skip:])
+                    prefix = directory.rstrip('/') + '/'
+                    for name in index.dirs[directory]:
+                        child = prefix + name
+                        if child in index.dirs:
+                            stack.append(child)
+                        else:
+                            files[child[skip:]] = index.files[child]
+            elif top in index.files:
+                relative = top[skip:]
+                files[relative] = index.files[top]
+                parent = relative.rpartition('/')[0]
+                while parent:
+                    directories.add(parent)
+                    parent = parent.rpartition('/')[0]
+            else:
+                raise FileDoesNotExistError(top)
+        return (sorted(directories),
+                sorted(files.items(), key=lambda item: item[1].file_size,
+                       reverse=True))
+
+
+    def _extract_target(self, dest, relative, dest_root=None):
+        """
+        _extract_target: where extract puts the member at relative, after
+        dropping drive letters and empty, '.' and '..' parts from it;
+        None if nothing is left of it
+
+        @param dest_root: the real path of dest, if it is local
+
+        @raise ValueError: if the target is not below dest
+        """
+        if os.path.altsep:
+            relative = relative.replace(os.path.sep, '/')
+        relative = os.path.splitdrive(relative)[1]
+        parts = [part for part in relative.split('/')
+                 if part not in ('', os.path.curdir, os.path.pardir)]
+        if not parts:
+            return None
+        result = dest / '/'.join(parts)
+        if dest_root is not None:
+            real = os.path.realpath(result.get_connection()._path(result))
+            if not real.startswith(os.path.join(dest_root, '')):
+                raise ValueError("%r would be extracted to %s, outside of "
+                                 "%s" % (relative, real, dest_root))
+        return result
+
+
+    def _extract_file(self, reader, info, dest, dest_connection):
+        with reader.open(info) as member, \
+             dest_connection.open(dest, 'wb',
+                                  'application/octet-stream') as outfs:
+            local = isinstance(dest_connection, LocalFileSystem)
+            if local:
+                dest_connection._preallocate(outfs.fileno(), info.file_size)
+            shutil.copyfileobj(member, outfs, EXTRACT_BUFFER_SIZE)
+            if local:
+                # in case the member is shorter than it claimed
+                outfs.truncate()
+
+
+    def _stamp(self):
+        """
+        _stamp: what tells whether the container of the archive changed,
+        None if it does not exist. For a local container it is the
+        size, mtime in nanoseconds, inode and device from a single
+        os.stat, for others the size and mtime from info.
+        """
+        local_path = self._local_path()
+        if local_path is not None:
+            try:
+                st = os.stat(local_path)
+            except EnvironmentError:
+                return None
+            if not stat.S_ISREG(st.st_mode):
+                return None
+            return st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev
+        try:
+            info = self._zip_file_path().info()
+        except (EnvironmentError, FileDoesNotExistError):
+            return None
+        return info.size, info.mtime
+
+
+    def _local_path(self):
+        """
+        _local_path: the path of the container of the archive in the
+        local file system, None if it is not local
+        """
+        container = self._zip_file_path()
+        connection = container.get_connection()
+        if isinstance(connection, LocalFileSystem):
+            return connection._path(container)
+        return None
+
+
+    def _archive(self, acquire=False):
+        """
+        _archive: the archive open for reading, from the archive cache as
+        long as its container has not changed since it was opened
+
+        @param acquire: acquire the archive (see OpenArchive.acquire)
+        @type acquire: bool
+
+        @rtype: OpenArchive|None
+        @return: None if the container does not exist, or if the cached
+                 archive to acquire was closed in the meantime
+        """
+        key = self.vpath_connector
+        stamp = self._stamp()
+        if stamp is None:
+            self.archives.discard(key)
+            return None
+        archive = self.archives.get(key)
+        if archive is not None and archive.stamp == stamp:
+            if acquire and not archive.acquire():
+                return None
+            return archive
+        file_handle = self._zip_file_path().open('rb')
+        try:
+            ziphandle = ZipFile(file_handle, 'r')
+        except:
+            file_handle.close()
+            raise
+        archive = OpenArchive(file_handle, ziphandle, stamp, self._index)
+        self._index = None
+        if acquire:
+            # before the cache can close it again
+            archive.acquire()
+        self.archives.put(key, archive)
+        return archive
+
+
+    def _acquire_archive(self):
+        """
+        _acquire_archive: the archive open for reading, acquired (see
+        OpenArchive.acquire); the caller has to release it
+
+        @raise FileDoesNotExistError: if the container does not exist
+        """
+        while True:
+            archive = self._archive(acquire=True)
+            if archive is not None:
+                return archive
+            if not self._zip_file_path().exists():
+                raise FileDoesNotExistError(str(self._zip_file_path()))
+            # closed by the archive cache in the meantime
+
+
+    def _get_index(self):
+        if self._session is not None:
+            self._index.update(self._ziphandle.infolist())
+            return self._index
+        archive = self._archive()
+        if archive is None:
+            return ZipIndex()
+        return archive.get_index()
+
+
+    def open(self, unc, options=None, mimetype='application/octet-stream',
+             compression=None, compresslevel=None, size=None,
+             force_zip64=False):
+        """
+        open: a member of the archive, for reading or writing. The
+        other arguments apply to writing:
+
+        @type compression: int
+        @param compression: zipfile.ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2
+                            or ZIP_LZMA; stored by default
+
+        @type compresslevel: int
+        @param compresslevel: see zipfile.ZipFile
+
+        @type size: int
+        @param size: the size the member is expected to have; members
+                     larger than 4 GiB need ZIP64 extensions, which have
+                     to be known of before writing
+
+        @type force_zip64: bool
+        @param force_zip64: use ZIP64 extensions whatever the size
+        """
         if options is None:
             options = 'r'
         if 'r' in options:
             return self._open_for_reading(unc, options)
         elif 'w' in options:
-            return self._open_for_writing(unc, options)
+            if self._session is None:
+                self.open_zip(options)
+            try:
+                return WriteStatement(self._path(unc), self, compression,
+                                      compresslevel, size, force_zip64)
+            except:
+                if self._session is None:
+                    self.close_zip()
+                raise
 
 
     def _open_for_reading(self, unc, options):
-        path_string = self._path(unc)
+        path_string = ZipIndex.normalize(self._path(unc))
+        if self._session is not None:
+            try:
+                info = self._get_index().files[path_string]
+            except KeyError:
+                raise FileDoesNotExistError()
+            return self._ziphandle.open(info.filename)
+        archive = self._acquire_archive()
         try:
-            self._ziphandle.getinfo(path_string)
-            return self._ziphandle.open(path_string)
-        except KeyError:
-            raise FileDoesNotExistError()
-
-
-    def _open_for_writing(self, unc, options):
-        path_string = self._path(unc)
-        return WriteStatement(path_string, self)
+            try:
+                info = archive.get_index().files[path_string]
+            except KeyError:
+                raise FileDoesNotExistError()
+            return ReadStatement(archive.ziphandle.open(info.filename),
+                                 archive)
+        except:
+            archive.release()
+            raise
 
 
     def exists(self, unc):
-        return self._ispart(unc, (ISDIR, ISFILE))
+        return self._get_index().exists(self._path(unc))
 
 
     def isdir(self, unc):
-        return self._ispart(unc, (ISDIR,))
+        return self._get_index().isdir(self._path(unc))
 
 
     def isfile(self, unc):
-        return self._ispart(unc, (ISFILE,))
+        return self._get_index().isfile(self._path(unc))
 
 
     def isexec(self, unc, mode):
@@ -182,33 +1074,47 @@ class ZipFileSystem(FileSystem):
 
 
     def listdir(self, unc):
-        if not self._zip_file_path().exists():
-            return []
-        if self._ziphandle is None:
-            self.open_zip()
-        path_string = self._path(unc)
-        if path_string == '/' and self._ziphandle is None:
+        index = self._get_index()
+        try:
+            return index.listdir(self._path(unc))
+        except KeyError:
+            self._not_a_directory(index)
             return []
-        if not self.isdir(unc):
-            raise FileDoesNotExistError()
-        content_set = set()
-        for item in self._ziphandle.namelist():
-            citem = content_item(path_string, item)
-            if citem:
-                content_set.add(citem)
 
-        return list(sorted(content_set))
 
+    def _not_a_directory(self, index):
+        "_not_a_directory: raise, unless there is no archive at all"
+        if index.count or self._zip_file_path().exists():
+            raise FileDoesNotExistError()
 
-    def _ispart(self, unc, expected):
-        path_string = self._path(unc)
-        if path_string == '/':
-            return True
-        for item in self._ziphandle.namelist():
-            result = compare_path_strings(path_string, item)
-            if result in expected:
-                return True
-        return False
+
+    def scandir(self, unc, unsorted=False):
+        """
+        scandir: the entries below unc, with size and mtime from the
+        ZipInfo of the archive members. Directories exist only as part
+        of member names, so their size and mtime are 0.
+        """
+        index = self._get_index()
+        path_string = index.normalize(self._path(unc))
+        try:
+            names = index.dirs[path_string]
+        except KeyError:
+            self._not_a_directory(index)
+            return []
+        prefix = path_string.rstrip('/') + '/'
+        entries = []
+        for name in (names if unsorted else sorted(names)):
+            path = prefix + name
+            if path in index.dirs:
+                entries.append(DirEntry(unc, name, DIR, size=0, mtime=0,
+                                        mode=stat.S_IFDIR | 0o755))
+                continue
+            info = index.files[path]
+            mode = info.external_attr >> 16 or stat.S_IFREG | 0o644
+            entries.append(DirEntry(unc, name, FILE, size=info.file_size,
+                                    mtime=time.mktime(info.date_time + (0, 0, -1)),
+                                    mode=mode))
+        return entries
 
 
     def copystat(self, path, other):
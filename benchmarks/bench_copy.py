@@ -0,0 +1,58 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Compare the serial recursive copy with the parallel one on a local tree
+of many small files.
+
+usage: python benchmarks/bench_copy.py [files] [file size] [workers...]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from abl.vpath.base import URI
+
+
+def make_tree(root, files, size):
+    data = b'x' * size
+    for i in range(files):
+        directory = os.path.join(root, 'd%d' % (i % 50), 'd%d' % (i % 500))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, 'f%d' % i), 'wb') as outf:
+            outf.write(data)
+
+
+def timed(copy, dest):
+    start = time.time()
+    copy()
+    seconds = time.time() - start
+    shutil.rmtree(dest)
+    return seconds
+
+
+def main(files=20000, size=4096, *workers):
+    root = tempfile.mkdtemp()
+    try:
+        source = os.path.join(root, 'source')
+        dest = os.path.join(root, 'dest')
+        make_tree(source, files, size)
+        print("%d files of %d bytes" % (files, size))
+        source_path = URI(source)
+        dest_path = URI(dest)
+        print("  %-12s %8.3f s" % ('serial', timed(
+            lambda: source_path.copy(dest_path, recursive=True), dest)))
+        for count in workers or (1, 4, 8, 16):
+            print("  %-12s %8.3f s" % ('workers=%d' % count, timed(
+                lambda: source_path.copy(dest_path, recursive=True,
+                                         workers=count), dest)))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,61 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Copy a large local file with the generic FileSystem._copy_file (8 KiB
+reads and writes in Python) and with every way LocalFileSystem._copy_data
+knows.
+
+usage: python benchmarks/bench_copy_file.py [megabytes] [target directory]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from abl.vpath.base import URI
+from abl.vpath.base.fs import FileSystem
+from abl.vpath.base.localfs import LocalFileSystem
+
+
+class GenericLocalFileSystem(LocalFileSystem):
+    "the copy LocalFileSystem had before it got its own"
+    _copy_file = FileSystem._copy_file
+
+
+def main(megabytes=256, target=None):
+    root = tempfile.mkdtemp()
+    target = tempfile.mkdtemp(dir=target)
+    try:
+        source = URI(root) / 'source.bin'
+        with source.open('wb') as outf:
+            chunk = os.urandom(1 << 20)
+            for _ in range(int(megabytes)):
+                outf.write(chunk)
+        dest = URI(target) / 'dest.bin'
+        print("%s MiB from %s to %s" % (megabytes, root, target))
+        generic = GenericLocalFileSystem()
+        copies = [('generic', generic)]
+        for methods in (('reflink',), ('copy_file_range',), ('sendfile',),
+                        ()):
+            connection = LocalFileSystem()
+            connection.copy_methods = methods
+            copies.append((methods[0] if methods else 'buffer', connection))
+        for name, connection in copies:
+            start = time.time()
+            connection._copy_file(source, dest, connection, False)
+            seconds = time.time() - start
+            used = ''
+            if connection._unsupported:
+                used = '  (not supported, fell back)'
+            print("  %-16s %8.3f s%s" % (name, seconds, used))
+            dest.remove()
+    finally:
+        shutil.rmtree(root)
+        shutil.rmtree(target)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
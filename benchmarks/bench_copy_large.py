@@ -0,0 +1,51 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Compare the copy of one large local file as a whole with the copy in
+chunks by several workers, with and without verifying the chunks.
+
+usage: python benchmarks/bench_copy_large.py [MiB] [chunk MiB] [workers...]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from abl.vpath.base import URI
+
+
+def timed(copy):
+    start = time.time()
+    copy()
+    return time.time() - start
+
+
+def main(size=1024, chunk=64, *workers):
+    root = tempfile.mkdtemp()
+    try:
+        source = os.path.join(root, 'source')
+        with open(source, 'wb') as outf:
+            block = os.urandom(1 << 20)
+            for _ in range(size):
+                outf.write(block)
+        print("%d MiB in chunks of %d MiB" % (size, chunk))
+        source_path = URI(source)
+        dest_path = URI(os.path.join(root, 'dest'))
+        print("  %-22s %8.3f s" % ('whole', timed(
+            lambda: source_path.copy(dest_path))))
+        for count in workers or (1, 4, 8):
+            for verify in (False, True):
+                name = 'workers=%d%s' % (count, ' verify' if verify else '')
+                print("  %-22s %8.3f s" % (name, timed(
+                    lambda: source_path.copy(dest_path, workers=count,
+                                             chunk_size=chunk << 20,
+                                             verify=verify))))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
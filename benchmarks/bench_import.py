@@ -0,0 +1,61 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Measure the time it takes to import abl.vpath.base.
+
+Imports the package in fresh interpreters with 'python -X importtime'
+and reports the median cumulative import time of abl.vpath.base and
+the modules that took longest by themselves. Exits with 1 if the median
+exceeds IMPORT_BUDGET. tests/test_import.py enforces the machine
+independent budgets: the number of modules imported, and no work done
+at import time.
+
+usage: python benchmarks/bench_import.py [rounds]
+"""
+
+import statistics
+import subprocess
+import sys
+
+
+# milliseconds for 'import abl.vpath.base' (cumulative, median); it takes
+# about a third of that on a developer machine
+IMPORT_BUDGET = 150
+
+
+def import_times(module='abl.vpath.base'):
+    """
+    import_times: import module in a new interpreter
+
+    @rtype: dict
+    @return: key is a module name;
+             value is (self, cumulative) import time in microseconds
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True,
+        ).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main(rounds=10):
+    runs = [import_times() for _ in range(rounds)]
+    total = statistics.median(run['abl.vpath.base'][1] for run in runs)
+    print("abl.vpath.base: %.1f ms (median of %d, budget %d ms)"
+          % (total / 1000, rounds, IMPORT_BUDGET))
+    last = runs[-1]
+    print("\nslowest modules (self time of the last run):")
+    for name, (own, _) in sorted(last.items(), key=lambda i: -i[1][0])[:10]:
+        print("%8.1f ms  %s" % (own / 1000, name))
+    return total / 1000 <= IMPORT_BUDGET
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main(*[int(arg) for arg in sys.argv[1:]]) else 1)
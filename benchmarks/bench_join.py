@@ -0,0 +1,44 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Measure the cost of deriving URIs on deep trees.
+
+For several tree depths, this times joining a name onto a directory
+URI, splitting a file URI, and taking the parent directory, the way
+FileSystem.copy and walk do once per entry.
+
+usage: python benchmarks/bench_join.py [rounds]
+"""
+
+import sys
+import timeit
+
+from abl.vpath.base import URI
+
+
+DEPTHS = (1, 10, 50, 200)
+
+
+def main(rounds=20000):
+    print("%-7s %-12s %12s" % ('depth', 'operation', 'usec/op'))
+    for depth in DEPTHS:
+        path = '/'.join('dir%03d' % i for i in range(depth))
+        for base in ('memory:///%s' % path, 'file:///%s' % path):
+            directory = URI(base)
+            child = directory / 'file.txt'
+            operations = [
+                ('join', lambda: directory / 'file.txt'),
+                ('split', child.split),
+                ('directory', child.directory),
+                ('last', child.last),
+                ]
+            for name, operation in operations:
+                seconds = min(timeit.repeat(operation, number=rounds, repeat=3))
+                print("%-7d %-12s %12.3f   %s" % (depth, name,
+                                                   seconds / rounds * 1e6,
+                                                   directory.scheme))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,68 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Compare walk and parallel_walk on a backend where reading a directory
+takes a round trip: a memory:// tree whose directory listings are
+delayed by <latency> milliseconds.
+
+usage: python benchmarks/bench_parallel_walk.py [latency] [fanout] [depth]
+"""
+
+import sys
+import time
+
+from abl.vpath.base import URI
+from abl.vpath.base.fs import CONNECTION_REGISTRY
+from abl.vpath.base.memory import MemoryFileSystem
+
+
+class LatencyFileSystem(MemoryFileSystem):
+    "a memory file system that waits for every directory listing"
+
+    scheme = 'latency'
+    latency = 0.005
+
+    def _scan(self, path, nd, unsorted):
+        time.sleep(self.latency)
+        return super(LatencyFileSystem, self)._scan(path, nd, unsorted)
+
+
+def make_tree(path, fanout, depth):
+    count = 1
+    (path / 'file.txt').open('w').close()
+    if depth:
+        for i in range(fanout):
+            child = path / ('d%d' % i)
+            child.mkdir()
+            count += make_tree(child, fanout, depth - 1)
+    return count
+
+
+def timed(walk):
+    start = time.time()
+    count = 0
+    for _ in walk():
+        count += 1
+    return time.time() - start, count
+
+
+def main(latency=5, fanout=8, depth=3):
+    LatencyFileSystem.latency = latency / 1000.0
+    CONNECTION_REGISTRY.register('latency', LatencyFileSystem)
+    root = URI('latency:///tree')
+    root.mkdir()
+    print("%d directories, %d ms per listing"
+          % (make_tree(root, fanout, depth), latency))
+    walks = [('walk', root.walk)]
+    for workers in (1, 4, 16, 64):
+        walks.append(('parallel_walk(%d)' % workers,
+                      lambda workers=workers:
+                      root.parallel_walk(max_workers=workers)))
+    for name, walk in walks:
+        seconds, count = timed(walk)
+        print("  %-20s %8.3f s  (%d directories)" % (name, seconds, count))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,41 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Measure the memory held per URI object.
+
+Builds a path inventory of distinct memory:// URIs and reports the
+number of bytes allocated per URI as seen by tracemalloc. The parse
+cache is disabled for the measurement, so the figure is the cost of
+the URI objects themselves.
+
+usage: python benchmarks/bench_uri_memory.py [count]
+"""
+
+import sys
+import tracemalloc
+
+from abl.vpath.base import URI
+from abl.vpath.base.simpleuri import set_parse_cache_size, PARSE_CACHE_SIZE
+
+
+def main(count=100000):
+    uri_strings = ['memory:///inventory/dir%04d/file%06d.dat' % (i % 1000, i)
+                   for i in range(count)]
+    set_parse_cache_size(0)
+    try:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        inventory = [URI(s) for s in uri_strings]
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    finally:
+        set_parse_cache_size(PARSE_CACHE_SIZE)
+    # the uri strings themselves are not part of the measurement, but
+    # every URI keeps its own normalized copy
+    print("%d URIs, %.1f bytes per URI" % (len(inventory),
+                                           float(after - before) / count))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
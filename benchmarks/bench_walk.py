@@ -0,0 +1,63 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Compare walking a local directory tree with os.walk, the generic
+FileSystem.walk and the scandir based LocalFileSystem.walk.
+
+usage: python benchmarks/bench_walk.py [directories] [files per directory]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from abl.vpath.base import URI
+from abl.vpath.base.fs import FileSystem
+from abl.vpath.base.localfs import LocalFileSystem
+
+
+class GenericLocalFileSystem(LocalFileSystem):
+    "the walk LocalFileSystem had before it got its own"
+    _walk_reader = FileSystem._walk_reader
+
+
+def make_tree(root, directories, files):
+    for i in range(directories):
+        # a few levels, so that the walk has to descend
+        path = os.path.join(root, 'd%d' % (i % 10), 'd%d' % (i % 100), 'd%d' % i)
+        os.makedirs(path)
+        for j in range(files):
+            open(os.path.join(path, 'f%d.txt' % j), 'w').close()
+
+
+def timed(walk):
+    start = time.time()
+    count = 0
+    for _, dirs, files in walk():
+        count += len(files)
+    return time.time() - start, count
+
+
+def main(directories=2000, files=25):
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root, directories, files)
+        top = URI(root)
+        generic = GenericLocalFileSystem()
+        walks = [
+            ('os.walk', lambda: os.walk(root)),
+            ('FileSystem.walk', lambda: generic.walk(top)),
+            ('LocalFileSystem.walk', top.walk),
+            ]
+        for name, walk in walks:
+            seconds, count = timed(walk)
+            print("%-22s %8.3f s  (%d files)" % (name, seconds, count))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
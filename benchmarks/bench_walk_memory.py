@@ -0,0 +1,109 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Walk a synthetic memory:// tree: a chain of <depth> nested directories
+with files in every one of them, <entries> entries in total.
+
+Times the walk in its different modes and the recursive walk FileSystem
+had before, and reports the peak memory the walk itself allocates
+(the tree is built before measuring).
+
+usage: python benchmarks/bench_walk_memory.py [entries] [depth]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from abl.vpath.base import URI
+from abl.vpath.base.fs import CONNECTION_REGISTRY
+from abl.vpath.base.memory import MemoryDir, MemoryFile
+
+
+def make_tree(root, entries, depth):
+    """
+    make_tree: build the tree from memory nodes directly; all files
+    share one node, the walk does not look at them
+    """
+    connection = root.get_connection()
+    node = connection._fs
+    shared_file = MemoryFile('shared')
+    files_per_level = max(0, (entries - depth) // depth)
+    for level in range(depth):
+        for i in range(files_per_level):
+            node.create('f%d' % i, shared_file)
+        child = MemoryDir()
+        node.create('d%d' % level, child)
+        node = child
+
+
+def recursive_walk(fs, top, topdown=True, followlinks=True):
+    "the walk of FileSystem up to now"
+    names = sorted(fs.listdir(top))
+    dirs = []
+    nondirs = []
+    for name in names:
+        if fs.isdir(top / name):
+            dirs.append(name)
+        else:
+            nondirs.append(name)
+    if topdown:
+        yield top, dirs, nondirs
+    for name in dirs:
+        path = top / name
+        if followlinks or not fs.islink(path):
+            for x in recursive_walk(fs, path, topdown, followlinks):
+                yield x
+    if not topdown:
+        yield top, dirs, nondirs
+
+
+def count(walk):
+    start = time.time()
+    entries = 0
+    for _, dirs, files in walk():
+        entries += len(dirs) + len(files)
+    return time.time() - start, entries
+
+
+def peak(walk):
+    tracemalloc.start()
+    for _ in walk():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run(entries, depth, with_recursive):
+    CONNECTION_REGISTRY.cleanup(force=True)
+    root = URI('memory:///')
+    make_tree(root, entries, depth)
+    connection = root.get_connection()
+    walks = [
+        ('walk', root.walk),
+        ('walk unsorted', lambda: root.walk(unsorted=True)),
+        ('walk breadth_first', lambda: root.walk(breadth_first=True)),
+        ('walk bottom-up', lambda: root.walk(topdown=False)),
+        ('walk_entries', root.walk_entries),
+        ]
+    if with_recursive:
+        walks.append(('recursive walk (old)',
+                      lambda: recursive_walk(connection, root)))
+    print("%d entries, depth %d" % (entries, depth))
+    for name, walk in walks:
+        seconds, walked = count(walk)
+        print("  %-22s %8.3f s %10d entries %10.1f KiB peak"
+              % (name, seconds, walked, peak(walk) / 1024.0))
+
+
+def main(entries=1000000, depth=500):
+    run(entries, depth, with_recursive=False)
+    # the old walk looks up every entry from the root, so it gets a
+    # smaller tree of the same depth
+    run(entries // 10, depth, with_recursive=True)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,54 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Time lookups in a zip:// archive with many members: walking the whole
+archive, exists/isfile on every member, and reading a few thousand.
+
+usage: python benchmarks/bench_zip.py [members] [members per directory]
+"""
+
+import sys
+import time
+from zipfile import ZipFile
+
+from abl.vpath.base import URI
+
+
+def make_archive(path, members, fanout):
+    with path.open('wb') as outf:
+        with ZipFile(outf, 'w') as archive:
+            for i in range(members):
+                archive.writestr('/d%d/d%d/f%d.txt' % (i // fanout ** 2,
+                                                      i // fanout, i), 'x')
+
+
+def read(path):
+    with path.open('rb') as inf:
+        return inf.read()
+
+
+def timed(label, func):
+    start = time.time()
+    count = func()
+    print("  %-20s %8.3f s  (%d)" % (label, time.time() - start, count))
+
+
+def main(members=200000, fanout=100):
+    archive = URI('memory:///archive.zip')
+    make_archive(archive, members, fanout)
+    root = URI('zip://((%s))/' % archive.uri)
+    print("%d members" % members)
+    timed('first lookup', lambda: int(root.isdir()))
+    timed('walk', lambda: sum(len(files) for _, _, files in root.walk()))
+    paths = [base / name
+             for base, dirs, files in root.walk()
+             for name in dirs + files]
+    timed('exists', lambda: sum(1 for path in paths if path.exists()))
+    timed('isfile', lambda: sum(1 for path in paths if path.isfile()))
+    files = [path for path in paths if path.isfile()][:10000]
+    timed('read', lambda: sum(len(read(path)) for path in files))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,57 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Compare extracting a local zip archive with the generic recursive copy
+and with ZipFileSystem.extract, serially and with several workers.
+
+usage: python benchmarks/bench_zip_extract.py [members] [KiB] [workers...]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from abl.vpath.base import URI
+
+
+def make_archive(path, members, size):
+    # compressible, but not trivially
+    block = os.urandom(size * 256) * 4
+    with ZipFile(path, 'w', ZIP_DEFLATED) as archive:
+        for i in range(members):
+            archive.writestr('d%d/f%d' % (i % 20, i), block)
+
+
+def timed(label, func, dest):
+    start = time.time()
+    report = func()
+    seconds = time.time() - start
+    rate = ''
+    if report is not None:
+        rate = '%8.1f MiB/s' % (report.throughput / 2.0 ** 20)
+    print("  %-20s %8.3f s  %s" % (label, seconds, rate))
+    shutil.rmtree(dest.path)
+
+
+def main(members=200, size=1024, *workers):
+    root_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root_dir, 'archive.zip')
+        make_archive(path, members, size)
+        print("%d members of %d KiB" % (members, size))
+        root = URI('zip://((%s))/' % path)
+        dest = URI(root_dir) / 'dest'
+        timed('copy', lambda: root.copy(dest, recursive=True), dest)
+        for count in workers or (1, 4, 8):
+            timed('extract(%d)' % count,
+                  lambda: root.extract(dest, workers=count), dest)
+    finally:
+        shutil.rmtree(root_dir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,70 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+"""
+Compare writing members to a zip:// archive one by one, each of which
+rewrites the central directory, with writing them in a write session,
+and measure the memory needed to write one large member to a local
+archive.
+
+usage: python benchmarks/bench_zip_write.py [members] [member size] [MiB]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from abl.vpath.base import URI
+
+
+def write_members(root, members, data):
+    for i in range(members):
+        with (root / ('d%d' % (i // 100)) / ('f%d' % i)).open('wb') as outf:
+            outf.write(data)
+
+
+def timed(label, archive, func):
+    start = time.time()
+    func()
+    print("  %-20s %8.3f s" % (label, time.time() - start))
+    archive.remove()
+
+
+def write_large(mib):
+    root_dir = tempfile.mkdtemp()
+    try:
+        root = URI('zip://((%s))/' % os.path.join(root_dir, 'large.zip'))
+        chunk = os.urandom(1 << 20)
+        tracemalloc.start()
+        start = time.time()
+        with (root / 'large.bin').open('wb') as outf:
+            for _ in range(mib):
+                outf.write(chunk)
+        seconds = time.time() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("  %-20s %8.3f s  %8.1f MiB peak" % ('%d MiB member' % mib,
+                                                   seconds, peak / 2.0 ** 20))
+    finally:
+        shutil.rmtree(root_dir)
+
+
+def main(members=1000, size=1024, mib=256):
+    archive = URI('memory:///archive.zip')
+    root = URI('zip://((%s))/' % archive.uri)
+    data = b'x' * size
+    print("%d members of %d bytes" % (members, size))
+    timed('one by one', archive, lambda: write_members(root, members, data))
+
+    def session():
+        with root.write_session():
+            write_members(root, members, data)
+    timed('write session', archive, session)
+    write_large(mib)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -10,7 +10,8 @@ from posixpath import join as ujoin
 from unittest import TestCase
 import shutil
 
-from abl.vpath.base import URI
+from abl.vpath.base import URI, CopyReport, CopyError, ChecksumError
+from abl.vpath.base.transfer import RangeCopy
 
 from .common import (
     create_file,
@@ -361,6 +362,98 @@ class CommonFSCopyTest(TestCase):
         self.assertTrue((moo_path).isdir())
 
 
+    def _tree(self, root):
+        """
+        a tree with files of different sizes, an ignored directory and a
+        link (on backends with symlinks)
+        """
+        foo_path = root / 'foo'
+        (foo_path / 'bar' / 'deep').makedirs()
+        (foo_path / 'empty').makedirs()
+        (foo_path / '.git').makedirs()
+        create_file(foo_path / 'small.txt', content='x')
+        create_file(foo_path / 'bar' / 'big.txt', content='x' * 10000)
+        create_file(foo_path / 'bar' / 'deep' / 'medium.txt', content='x' * 100)
+        create_file(foo_path / '.git' / 'HEAD', content='ref')
+        xfile = create_file(foo_path / 'xfile.exe')
+        xfile.set_exec(stat.S_IXUSR)
+        return foo_path
+
+
+    def _listing(self, path):
+        return sorted((root.path[len(path.path):], sorted(dirs), sorted(files))
+                      for root, dirs, files in path.walk())
+
+
+    def test_copy_recursive_in_parallel(self):
+        root = URI(self.baseurl)
+        foo_path = self._tree(root)
+        serial_path = root / 'serial'
+        parallel_path = root / 'parallel'
+
+        foo_path.copy(serial_path, recursive=True, ignore=['.git'])
+        report = foo_path.copy(parallel_path, recursive=True, ignore=['.git'],
+                               workers=4)
+
+        self.assertTrue(isinstance(report, CopyReport))
+        self.assertEqual(self._listing(parallel_path),
+                         self._listing(serial_path))
+        self.assertEqual(load_file(parallel_path / 'bar' / 'big.txt'),
+                         'x' * 10000)
+        self.assertTrue((parallel_path / 'xfile.exe').isexec())
+        self.assertEqual((report.files, report.directories, report.bytes,
+                          report.errors),
+                         (4, 3, 10108, []))
+
+
+    def test_copy_in_parallel_collects_errors(self):
+        root = URI(self.baseurl)
+        foo_path = self._tree(root)
+        # dest exists, so foo is copied into it
+        dest_path = root / 'dest' / 'foo'
+        # a directory where a file has to go
+        (dest_path / 'bar' / 'big.txt').makedirs()
+
+        with self.assertRaises(CopyError) as cm:
+            foo_path.copy(root / 'dest', recursive=True, workers=4)
+
+        report = cm.exception.report
+        self.assertEqual([(str(source), str(dest))
+                          for source, dest, error in report.errors],
+                         [(str(foo_path / 'bar' / 'big.txt'),
+                           str(dest_path / 'bar' / 'big.txt'))])
+        self.assertEqual(report.files, 4)
+        self.assertEqual(load_file(dest_path / 'bar' / 'deep' / 'medium.txt'),
+                         'x' * 100)
+
+
+    def test_copy_in_parallel_needs_a_worker(self):
+        foo_path = self._tree(URI(self.baseurl))
+        self.assertRaises(ValueError, foo_path.copy, URI(self.baseurl) / 'x',
+                          recursive=True, workers=0)
+
+
+    def test_copy_file_in_chunks(self):
+        root = URI(self.baseurl)
+        content = ''.join(chr(ord('a') + i % 26) for i in range(10007))
+        source = create_file(root / 'big.txt', content=content)
+        report = source.copy(root / 'copy.txt', workers=3, chunk_size=1000,
+                             verify=True)
+        self.assertEqual(load_file(root / 'copy.txt'), content)
+        self.assertEqual((report.files, report.bytes, report.errors),
+                         (1, 10007, []))
+        # into an existing directory, and without chunk_size
+        (root / 'dir').mkdir()
+        source.copy(root / 'dir', workers=2)
+        self.assertEqual(load_file(root / 'dir' / 'big.txt'), content)
+
+
+    def test_copy_file_in_chunks_needs_a_chunk(self):
+        source = create_file(URI(self.baseurl) / 'big.txt', content='x')
+        self.assertRaises(ValueError, source.copy, URI(self.baseurl) / 'x',
+                          workers=2, chunk_size=0)
+
+
 class TestLocalFSCopy2(CommonFSCopyTest):
     __test__ = True
 
@@ -384,6 +477,33 @@ class TestMemoryFSCopy2(CleanupMemoryBeforeTestMixin, CommonFSCopyTest):
         pass
 
 
+class TestRangeCopy(TestCase):
+
+    def test_chunks(self):
+        engine = RangeCopy(2, chunk_size=4)
+        self.assertEqual(list(engine.chunks([(0, 10), (20, 4)])),
+                         [(0, 4), (4, 4), (8, 2), (20, 4)])
+
+
+    def test_check_finds_changed_chunks(self):
+        source = b'0123456789'
+        target = bytearray(len(source))
+
+        def write(offset, data):
+            target[offset:offset + len(data)] = data
+
+        def read_back(offset, length):
+            return bytes(target[offset:offset + length])
+
+        engine = RangeCopy(2, chunk_size=4, verify=True)
+        self.assertEqual(engine.copy(lambda offset, length:
+                                     source[offset:offset + length],
+                                     write, [(0, 10)]), 10)
+        engine.check(read_back, [(0, 10)])
+        target[5:6] = b'x'
+        self.assertRaises(ChecksumError, engine.check, read_back, [(0, 10)])
+
+
 #-------------------------------------------------------------------------------
 
 class CommonFSExecTest(TestCase):
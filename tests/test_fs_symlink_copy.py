@@ -495,6 +495,35 @@ class CommonLocalFSSymlinkCopyTest(TestCase):
         self.assertEqual(helloworld_path.readlink(), tee_path.readlink())
 
 
+    def test_copy_tree_with_symlinks_in_parallel(self):
+        root = URI(self.baseurl)
+        bar_path = root / 'foo' / 'bar'
+        bar_path.makedirs()
+        create_file(bar_path / 'gaz.txt', content='foobar')
+        (root / 'other').makedirs()
+        create_file(root / 'other' / 'moo.txt', content='moo')
+        (root / 'other').symlink(bar_path / 'dirlink')
+        (root / 'other' / 'moo.txt').symlink(bar_path / 'filelink')
+
+        foo_path = root / 'foo'
+        foo_path.copy(root / 'preserved', recursive=True, followlinks=False,
+                      workers=2)
+        foo_path.copy(root / 'followed', recursive=True, followlinks=True,
+                      workers=2)
+
+        preserved_path = root / 'preserved' / 'bar'
+        self.assertTrue((preserved_path / 'dirlink').islink())
+        self.assertEqual((preserved_path / 'filelink').readlink(),
+                         root / 'other' / 'moo.txt')
+        self.assertEqual(load_file(preserved_path / 'gaz.txt'), 'foobar')
+        followed_path = root / 'followed' / 'bar'
+        self.assertTrue(not (followed_path / 'dirlink').islink())
+        self.assertEqual(load_file(followed_path / 'dirlink' / 'moo.txt'),
+                         'moo')
+        self.assertTrue(not (followed_path / 'filelink').islink())
+        self.assertEqual(load_file(followed_path / 'filelink'), 'moo')
+
+
 
 class TestLocalFSSymlinkCopy(CommonLocalFSSymlinkCopyTest):
     __test__ = is_on_mac()
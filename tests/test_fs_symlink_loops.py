@@ -182,7 +182,23 @@ class CommonLocalFSSymlinkLoopTest(TestCase):
         self.assertRaises(OSError, tee_path.copystat, bar_path)
 
 
-
+    def test_copy_walks_symlink_loop_once(self):
+        root = URI(self.baseurl)
+        foo_path = root / 'foo'
+        bar_path = foo_path / 'bar'
+        bar_path.makedirs()
+        create_file(bar_path / 'moo.txt')
+        foo_path.symlink(bar_path / 'tee')
+        dest_path = root / 'dest'
+
+        foo_path.copy(dest_path, recursive=True, cycles='skip')
+        self.assertEqual(dest_path.listdir(), ['bar'])
+        self.assertEqual((dest_path / 'bar').listdir(), ['moo.txt'])
+
+        (dest_path).remove(recursive=True)
+        foo_path.copy(dest_path, recursive=True, cycles='yield-once')
+        self.assertEqual((dest_path / 'bar').listdir(), ['moo.txt', 'tee'])
+        self.assertEqual((dest_path / 'bar' / 'tee').listdir(), [])
 
 
     def test_filechecks_dont_fail_on_mutual_symlinks(self):
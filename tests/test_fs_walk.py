@@ -4,10 +4,14 @@
 
 
 import os
+import sys
 import tempfile
+import time
 from unittest import TestCase
 import shutil
-from abl.vpath.base import URI
+from abl.vpath.base import URI, SymlinkLoopError
+from abl.vpath.base.fs import FileSystem
+from abl.vpath.base.localfs import LocalFileSystem
 
 from .common import (
     create_file,
@@ -16,6 +20,11 @@ from .common import (
 )
 
 
+class GenericLocalFileSystem(LocalFileSystem):
+    _walk_reader = FileSystem._walk_reader
+    scandir = FileSystem.scandir
+
+
 class CommonFileSystemWalkTest(TestCase):
     __test__ = False
 
@@ -103,6 +112,231 @@ class CommonFileSystemWalkTest(TestCase):
         self.assertEqual(expected, actual)
 
 
+    def test_walk_topdown_prunes_dirs_in_place(self):
+        foo_path = self._setup_hierarchy()
+        (foo_path / 'bar' / 'deeper').makedirs()
+
+        actual = []
+        for dirname, dirs, files in foo_path.walk():
+            actual.append(dirname.last())
+            if 'bar' in dirs:
+                dirs.remove('bar')
+
+        self.assertEqual(actual, ['foo', 'gaz'])
+
+
+    def test_walk_sees_directories_replaced_during_the_walk(self):
+        foo_path = self._setup_hierarchy()
+
+        actual = []
+        for dirname, dirs, files in foo_path.walk():
+            actual.append((dirname.last(), files))
+            if dirname == foo_path:
+                (foo_path / 'bar').remove(recursive=True)
+                (foo_path / 'bar').mkdir()
+                create_file(foo_path / 'bar' / 'new.txt')
+
+        self.assertEqual(actual, [('foo', ['file2a.jpg', 'file2b.html',
+                                           'test.py']),
+                                  ('bar', ['new.txt']),
+                                  ('gaz', [])])
+
+
+    def test_walk_breadth_first(self):
+        foo_path = self._setup_hierarchy()
+        (foo_path / 'bar' / 'deeper').makedirs()
+        (foo_path / 'gaz' / 'deep').makedirs()
+
+        roots = [root.path[len(foo_path.path):].replace('\\', '/')
+                 for root, dirs, files in foo_path.walk(breadth_first=True)]
+
+        self.assertEqual(roots, ['', '/bar', '/gaz', '/bar/deeper', '/gaz/deep'])
+        self.assertRaises(ValueError, list,
+                          foo_path.walk(topdown=False, breadth_first=True))
+
+
+    def test_walk_unsorted(self):
+        foo_path = self._setup_hierarchy()
+        for topdown in (True, False):
+            walked = sorted((root.path, sorted(dirs), sorted(files))
+                            for root, dirs, files in
+                            foo_path.walk(topdown=topdown, unsorted=True))
+            self.assertEqual(walked,
+                             sorted((root.path, dirs, files) for root, dirs, files
+                                    in foo_path.walk(topdown=topdown)))
+
+
+    def test_walk_is_not_limited_by_the_recursion_limit(self):
+        foo_path = URI(self.baseurl) / 'foo'
+        foo_path.join(*['d'] * 300).makedirs()
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(250)
+        try:
+            walked = [len(list(walk())) for walk in (foo_path.walk,
+                                                     foo_path.walk_entries)]
+        finally:
+            sys.setrecursionlimit(limit)
+        self.assertEqual(walked, [301, 301])
+        # shutil.rmtree would need as many stack frames
+        for root, dirs, files in foo_path.walk(topdown=False):
+            root.remove()
+
+
+    def test_walk_cycles(self):
+        foo_path = self._setup_hierarchy_with_symlink(withloop='Dir')
+        # another way into raz, not a loop
+        (URI(self.baseurl) / 'raz').symlink(foo_path / 'gaz' / 'dumpty')
+        expected = [
+            ('', ['bar', 'gaz']),
+            ('/bar', ['humpty']),
+            ('/bar/humpty', ['moo']),
+            ('/bar/humpty/moo', []),
+            ('/gaz', []),
+            ]
+        for walk in ('walk', 'walk_entries'):
+            for options in (dict(), dict(topdown=False),
+                            dict(breadth_first=True)):
+                walked = sorted(
+                    (root.path[len(foo_path.path):].replace('\\', '/'),
+                     [d if isinstance(d, str) else d.name for d in dirs])
+                    for root, dirs, files in
+                    getattr(foo_path, walk)(cycles='skip', **options))
+                self.assertEqual(walked, expected)
+
+        walked = sorted((root.path[len(foo_path.path):].replace('\\', '/'),
+                         dirs)
+                        for root, dirs, files in
+                        foo_path.walk(cycles='yield-once'))
+        self.assertEqual(walked, [
+            ('', ['bar', 'gaz']),
+            ('/bar', ['humpty']),
+            ('/bar/humpty', ['moo']),
+            ('/bar/humpty/moo', ['back_to_foo']),
+            ('/gaz', ['dumpty']),
+            ])
+
+        self.assertRaises(SymlinkLoopError, list,
+                          foo_path.walk(cycles='error'))
+        self.assertRaises(ValueError, list, foo_path.walk(cycles='ignore'))
+        # without following links, there are no cycles
+        self.assertEqual(len(list(foo_path.walk(followlinks=False,
+                                                cycles='error'))), 3)
+
+
+    def test_pruned_directory_is_walked_through_another_link(self):
+        base_path = URI(self.baseurl) / 'pruned'
+        (base_path / 'a').makedirs()
+        (base_path / 'b').makedirs()
+        (base_path / 'a').symlink(base_path / 'b' / 'link')
+        for cycles in ('skip', 'yield-once', 'error'):
+            walked = []
+            for root, dirs, files in base_path.walk(cycles=cycles):
+                walked.append(root.path[len(base_path.path):]
+                              .replace('\\', '/'))
+                if 'a' in dirs:
+                    dirs.remove('a')
+            self.assertEqual(walked, ['', '/b', '/b/link'])
+            walked = self._parallel_walk(
+                base_path, cycles=cycles,
+                prune=lambda path: path.last() == 'a')
+            self.assertEqual([root for root, dirs, files in walked],
+                             ['', '/b', '/b/link'])
+
+
+    def _parallel_walk(self, base_path, **kwargs):
+        base_path_len = len(base_path.path)
+        return sorted(
+            (root.path[base_path_len:].replace('\\', '/'), dirs, files)
+            for root, dirs, files in base_path.parallel_walk(**kwargs))
+
+
+    def test_parallel_walk(self):
+        foo_path = self._setup_hierarchy_with_symlink()
+        for followlinks in (True, False):
+            expected = sorted(
+                (root.path[len(foo_path.path):].replace('\\', '/'),
+                 dirs, files)
+                for root, dirs, files in foo_path.walk(followlinks=followlinks))
+            for max_workers in (1, 4):
+                self.assertEqual(self._parallel_walk(foo_path,
+                                                     max_workers=max_workers,
+                                                     followlinks=followlinks),
+                                 expected)
+
+
+    def test_parallel_walk_prunes(self):
+        foo_path = self._setup_hierarchy_with_symlink()
+        walked = self._parallel_walk(foo_path,
+                                     prune=lambda path: path.last() == 'bar')
+        self.assertEqual(walked, [
+            ('', ['bar', 'gaz'], ['file2a.jpg', 'file2b.html', 'test.py']),
+            ('/gaz', [], []),
+            ])
+
+
+    def test_parallel_walk_walks_symlink_loops_once(self):
+        foo_path = self._setup_hierarchy_with_symlink(withloop='Dir')
+        roots = [root for root, dirs, files in self._parallel_walk(foo_path)]
+        self.assertEqual(roots, ['', '/bar', '/bar/humpty',
+                                 '/bar/humpty/moo', '/gaz'])
+        roots = [root for root, dirs, files in
+                 self._parallel_walk(foo_path, followlinks=False)]
+        self.assertEqual(roots, ['', '/bar', '/gaz'])
+        walked = self._parallel_walk(foo_path, cycles='skip')
+        self.assertEqual(walked[3], ('/bar/humpty/moo', [], ['test1.sh']))
+        self.assertRaises(SymlinkLoopError, list,
+                          foo_path.parallel_walk(cycles='error'))
+
+
+    def test_parallel_walk_can_be_abandoned(self):
+        foo_path = self._setup_hierarchy()
+        walk = foo_path.parallel_walk(max_workers=2)
+        root, dirs, files = next(walk)
+        self.assertEqual(root, foo_path)
+        walk.close()
+
+
+    def test_walk_entries(self):
+        foo_path = self._setup_hierarchy()
+        create_file(foo_path / 'bar' / 'file1a.txt', content='longer content')
+
+        for topdown in (True, False):
+            entries = list(foo_path.walk_entries(topdown=topdown))
+            self.assertEqual(
+                [(root, [d.name for d in dirs], [f.name for f in files])
+                 for root, dirs, files in entries],
+                list(foo_path.walk(topdown=topdown)))
+
+        sizes = dict((f.path.path, (f.kind, f.size))
+                     for root, dirs, files in foo_path.walk_entries()
+                     for f in files)
+        self.assertEqual(sizes[(foo_path / 'bar' / 'file1a.txt').path],
+                         ('file', 14))
+        self.assertEqual(sizes[(foo_path / 'test.py').path], ('file', 7))
+
+
+    def test_scandir(self):
+        foo_path = self._setup_hierarchy_with_symlink(withbrokenlink=True)
+        bar_path = foo_path / 'bar'
+        entries = dict((e.name, e) for e in bar_path.scandir())
+        self.assertEqual(sorted(entries), bar_path.listdir())
+
+        humpty = entries['humpty']
+        self.assertEqual((humpty.kind, humpty.target_kind), ('link', 'dir'))
+        self.assertTrue(humpty.is_dir())
+        self.assertFalse(humpty.is_dir(follow_symlinks=False))
+        self.assertTrue(humpty.is_symlink())
+        self.assertEqual(humpty.path, bar_path / 'humpty')
+
+        dumpty = entries['dumpty']
+        self.assertEqual((dumpty.kind, dumpty.target_kind), ('link', None))
+        self.assertFalse(dumpty.is_dir() or dumpty.is_file())
+
+        text = entries['file1a.txt']
+        self.assertEqual((text.kind, text.size), ('file', 7))
+        self.assertTrue(abs(text.mtime - time.time()) < 60)
+
+
     #--------------------------------------------------------------------------
 
     def _setup_hierarchy_with_symlink(self, withloop=None, withbrokenlink=False):
@@ -505,6 +739,35 @@ class TestLocalFSSymlinkWalk(CommonFileSystemWalkTest):
         shutil.rmtree(self.tmpdir)
 
 
+    def test_native_scandir_matches_generic_scandir(self):
+        foo_path = self._setup_hierarchy_with_symlink(withbrokenlink=True)
+        generic_connection = GenericLocalFileSystem()
+        for path in (foo_path, foo_path / 'bar'):
+            self.assertEqual(
+                [(e.name, e.kind, e.target_kind, e.size, e.mode, int(e.mtime))
+                 for e in path.scandir()
+                 if e.target_kind is not None],
+                [(e.name, e.kind, e.target_kind, e.size, e.mode, int(e.mtime))
+                 for e in generic_connection.scandir(path)
+                 if e.target_kind is not None])
+
+
+    def test_native_walk_matches_generic_walk(self):
+        for options in (dict(withloop='file'), dict(withbrokenlink=True)):
+            foo_path = self._setup_hierarchy_with_symlink(**options)
+            connection = foo_path.get_connection()
+            generic_connection = GenericLocalFileSystem()
+            for topdown in (True, False):
+                for followlinks in (True, False):
+                    native = list(connection.walk(foo_path, topdown=topdown,
+                                                  followlinks=followlinks))
+                    generic = list(generic_connection.walk(
+                        foo_path, topdown=topdown, followlinks=followlinks))
+                    self.assertEqual(native, generic)
+            shutil.rmtree(self.tmpdir)
+            os.mkdir(self.tmpdir)
+
+
 class TestMemoryFSSymlinkWalk(CleanupMemoryBeforeTestMixin, CommonFileSystemWalkTest):
     __test__ = True
 
@@ -0,0 +1,71 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+
+import subprocess
+import sys
+from unittest import TestCase
+
+
+# modules 'import abl.vpath.base' adds to those of a bare interpreter;
+# unlike the import time (see benchmarks/bench_import.py), this does not
+# depend on the machine
+MODULE_BUDGET = 65
+
+
+class TestImport(TestCase):
+
+    def run_python(self, *args):
+        return subprocess.run([sys.executable] + list(args),
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, check=True)
+
+
+    def test_imported_modules_budget(self):
+        code = '\n'.join([
+            'import sys',
+            'before = set(sys.modules)',
+            'import abl.vpath.base',
+            'print("\\n".join(sorted(set(sys.modules) - before)))',
+            ])
+        modules = self.run_python('-c', code).stdout.split()
+        self.assertTrue(len(modules) <= MODULE_BUDGET,
+                        "%d modules imported:\n%s" % (len(modules),
+                                                       '\n'.join(modules)))
+
+
+    def test_import_does_no_work_up_front(self):
+        code = '\n'.join([
+            'import sys, threading',
+            'import abl.vpath.base',
+            'print(threading.active_count())',
+            'for name in ("importlib.metadata", "subprocess",',
+            '             "abl.vpath.base.localfs", "abl.vpath.base.zip",',
+            '             "abl.vpath.base.transfer", "abl.vpath.base.uriarray"):',
+            '    print(name in sys.modules)',
+            ])
+        self.assertEqual(self.run_python('-c', code).stdout.split(),
+                         ['1'] + ['False'] * 6)
+
+
+    def test_public_classes_are_imported_on_first_access(self):
+        code = '\n'.join([
+            'import sys',
+            'from abl.vpath.base import URIArray, CopyReport',
+            'print(URIArray.__module__, CopyReport.__module__)',
+            'print("abl.vpath.base.transfer" in sys.modules)',
+            ])
+        self.assertEqual(self.run_python('-c', code).stdout.split(),
+                         ['abl.vpath.base.uriarray', 'abl.vpath.base.transfer',
+                          'True'])
+
+
+    def test_plugins_are_loaded_on_first_use(self):
+        code = '\n'.join([
+            'import sys',
+            'from abl.vpath.base import URI',
+            'print(URI("memory:///").__class__.__name__)',
+            'print("abl.vpath.base.zip" in sys.modules)',
+            ])
+        self.assertEqual(self.run_python('-c', code).stdout.split(),
+                         ['MemoryFileSystemUri', 'False'])
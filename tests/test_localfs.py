@@ -3,10 +3,16 @@
 #******************************************************************************
 
 import datetime
+import errno
+import os
+import shutil
 import stat
 import sys
+import tempfile
 from unittest import TestCase
-from abl.vpath.base import URI
+from abl.vpath.base import URI, CopyError
+from abl.vpath.base.localfs import LocalFileSystem
+from abl.vpath.base.memory import SparseBuffer
 from .common import mac_only
 
 
@@ -110,3 +116,262 @@ class TestLocalFSInfo(TestCase):
                 p.info().mode,
                 new_mode,
                 )
+
+
+#-------------------------------------------------------------------------------
+
+class FailingReflinkFileSystem(LocalFileSystem):
+
+    def _initialize(self):
+        super(FailingReflinkFileSystem, self)._initialize()
+        self.reflinks = 0
+        self.error = errno.EOPNOTSUPP
+
+
+    def _copy_with_reflink(self, infd, outfd):
+        self.reflinks += 1
+        # fail halfway
+        os.write(outfd, b'garbage')
+        raise OSError(self.error, os.strerror(self.error))
+
+
+class TestLocalCopy(TestCase):
+
+    def setUp(self):
+        thisdir = os.path.split(os.path.abspath(__file__))[0]
+        self.tmpdir = tempfile.mkdtemp('.temp', 'test-local-fs', thisdir)
+        self.source = os.path.join(self.tmpdir, 'source.bin')
+        self.content = os.urandom(3 * 1024 * 1024 + 17)
+        with open(self.source, 'wb') as outf:
+            outf.write(self.content)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def copy_data(self, connection, source=None):
+        dest = os.path.join(self.tmpdir, 'dest.bin')
+        with open(source or self.source, 'rb') as infs, \
+             open(dest, 'wb') as outfs:
+            method, skipped = connection._copy_data(infs.fileno(),
+                                                    outfs.fileno())
+        with open(dest, 'rb') as inf:
+            return method, inf.read()
+
+
+    def test_every_method_copies_the_data(self):
+        for methods in ((), ('reflink',), ('copy_file_range',),
+                        ('sendfile',)):
+            connection = LocalFileSystem()
+            connection.copy_methods = methods
+            method, content = self.copy_data(connection)
+            self.assertTrue(method in methods + ('buffer',))
+            self.assertEqual(content, self.content)
+
+
+    def test_failing_method_falls_back(self):
+        connection = FailingReflinkFileSystem()
+        for _ in range(2):
+            method, content = self.copy_data(connection)
+            self.assertNotEqual(method, 'reflink')
+            self.assertEqual(content, self.content)
+        # not tried again for the same file systems
+        self.assertEqual(connection.reflinks, 1)
+
+
+    def copy_data_copying_nothing(self, source=None):
+        # some file systems and overlays report success without copying
+        saved = dict((name, getattr(os, name, None))
+                     for name in ('copy_file_range', 'sendfile'))
+        os.copy_file_range = os.sendfile = lambda *args: 0
+        try:
+            connection = LocalFileSystem()
+            connection.copy_methods = ('copy_file_range', 'sendfile')
+            return self.copy_data(connection, source)
+        finally:
+            for name, function in saved.items():
+                if function is None:
+                    delattr(os, name)
+                else:
+                    setattr(os, name, function)
+
+
+    def test_methods_copying_nothing_fall_back(self):
+        self.assertEqual(self.copy_data_copying_nothing(),
+                         ('buffer', self.content))
+
+
+    def test_other_errors_are_raised(self):
+        connection = FailingReflinkFileSystem()
+        connection.error = errno.EIO
+        self.assertRaises(OSError, self.copy_data, connection)
+
+
+    def test_empty_file(self):
+        empty = os.path.join(self.tmpdir, 'empty')
+        open(empty, 'w').close()
+        self.assertEqual(self.copy_data(LocalFileSystem(), empty),
+                         ('buffer', b''))
+
+
+    def test_copy_of_local_files(self):
+        source = URI(self.source)
+        source.set_exec(stat.S_IXUSR)
+        dest = URI(self.tmpdir) / 'dest.bin'
+        source.copy(dest)
+        with dest.open('rb') as inf:
+            self.assertEqual(inf.read(), self.content)
+        self.assertTrue(dest.isexec())
+
+
+    def test_copy_in_chunks(self):
+        source = URI(self.source)
+        source.set_exec(stat.S_IXUSR)
+        dest = URI(self.tmpdir) / 'dest.bin'
+        report = source.copy(dest, workers=4, chunk_size=1 << 20, verify=True)
+        with dest.open('rb') as inf:
+            self.assertEqual(inf.read(), self.content)
+        self.assertTrue(dest.isexec())
+        self.assertEqual((report.files, report.bytes, report.skipped),
+                         (1, len(self.content), 0))
+
+
+    def test_copy_in_chunks_fails_as_a_whole(self):
+        source = URI(self.source)
+        dest = URI(self.tmpdir) / 'missing' / 'dest.bin'
+        with self.assertRaises(CopyError) as cm:
+            source.copy(dest, workers=2)
+        report = cm.exception.report
+        self.assertEqual(report.files, 0)
+        self.assertEqual([(source, dest)],
+                         [(s, d) for s, d, _ in report.errors])
+
+
+    def test_preallocate(self):
+        dest = os.path.join(self.tmpdir, 'dest.bin')
+        with open(dest, 'wb') as outf:
+            LocalFileSystem()._preallocate(outf.fileno(), 12345)
+        self.assertEqual(os.path.getsize(dest), 12345)
+
+
+    def make_sparse(self, path):
+        "a sparse file of 8 MiB with data at 1 MiB and 5 MiB"
+        with open(path, 'wb') as outf:
+            outf.truncate(8 << 20)
+            for offset in (1 << 20, 5 << 20):
+                outf.seek(offset)
+                outf.write(b'data' * 1024)
+        with open(path, 'rb') as inf:
+            return inf.read()
+
+
+    def allocated(self, path):
+        return os.stat(path).st_blocks * 512
+
+
+    def test_copy_sparse_file(self):
+        content = self.make_sparse(self.source)
+        if self.allocated(self.source) >= len(content):
+            self.skipTest("no sparse files on this file system")
+        dest = os.path.join(self.tmpdir, 'dest.bin')
+        with open(self.source, 'rb') as infs, open(dest, 'wb') as outfs:
+            method, skipped = LocalFileSystem()._copy_data(infs.fileno(),
+                                                           outfs.fileno())
+        self.assertTrue(method in ('sparse', 'reflink'))
+        with open(dest, 'rb') as inf:
+            self.assertEqual(inf.read(), content)
+        self.assertTrue(self.allocated(dest) < 1 << 20)
+        self.assertTrue(skipped >= (8 << 20) - (1 << 20))
+
+
+    def test_copy_sparse_file_copying_nothing_falls_back(self):
+        content = self.make_sparse(self.source)
+        if self.allocated(self.source) >= len(content):
+            self.skipTest("no sparse files on this file system")
+        self.assertEqual(self.copy_data_copying_nothing(),
+                         ('sparse', content))
+
+
+    def test_copy_sparse_file_into_memory_and_back(self):
+        content = self.make_sparse(self.source)
+        if self.allocated(self.source) >= len(content):
+            self.skipTest("no sparse files on this file system")
+        memory_path = URI('memory:///sparse.bin')
+        try:
+            skipped = URI(self.source).copy(memory_path)
+            self.assertTrue(skipped >= (8 << 20) - (1 << 20))
+            connection = memory_path.get_connection()
+            data = connection._get_node_for_path(connection._fs,
+                                                 memory_path)._data
+            self.assertTrue(isinstance(data, SparseBuffer))
+            self.assertTrue(sum(length for _, length in data.extents())
+                            < 1 << 20)
+            with memory_path.open('rb') as inf:
+                self.assertEqual(inf.read(), content)
+
+            dest = os.path.join(self.tmpdir, 'dest.bin')
+            self.assertEqual(memory_path.copy(URI(dest)), skipped)
+            with open(dest, 'rb') as inf:
+                self.assertEqual(inf.read(), content)
+            self.assertTrue(self.allocated(dest) < 1 << 20)
+        finally:
+            memory_path.remove()
+
+
+    def test_copy_sparse_file_into_zip(self):
+        content = self.make_sparse(self.source)
+        memory_path = URI('memory:///sparse.bin')
+        try:
+            URI(self.source).copy(memory_path)
+            for source in (URI(self.source), memory_path):
+                zip_path = os.path.join(self.tmpdir, 'sparse.zip')
+                member = URI('zip://((%s))/sparse.bin' % zip_path)
+                # zip members are written as a stream, holes are filled
+                self.assertEqual(source.copy(member), 0)
+                with member.open('rb') as inf:
+                    self.assertEqual(inf.read(), content)
+                member.get_connection().close()
+                os.remove(zip_path)
+        finally:
+            memory_path.remove()
+
+
+    def test_copy_reports_skipped_bytes(self):
+        content = self.make_sparse(self.source)
+        if self.allocated(self.source) >= len(content):
+            self.skipTest("no sparse files on this file system")
+        source = URI(self.tmpdir)
+        skipped = source.copy(URI(self.tmpdir + '.copy'), recursive=True)
+        try:
+            self.assertTrue(skipped >= (8 << 20) - (1 << 20))
+        finally:
+            shutil.rmtree(self.tmpdir + '.copy')
+
+
+    def test_parallel_copy_reports_skipped_bytes(self):
+        content = self.make_sparse(self.source)
+        if self.allocated(self.source) >= len(content):
+            self.skipTest("no sparse files on this file system")
+        source = URI(self.tmpdir)
+        report = source.copy(URI(self.tmpdir + '.copy'), recursive=True,
+                             workers=2)
+        try:
+            self.assertTrue(report.skipped >= (8 << 20) - (1 << 20))
+            self.assertEqual(report.bytes, 8 << 20)
+        finally:
+            shutil.rmtree(self.tmpdir + '.copy')
+
+
+    def test_copy_sparse_file_in_chunks(self):
+        content = self.make_sparse(self.source)
+        if self.allocated(self.source) >= len(content):
+            self.skipTest("no sparse files on this file system")
+        dest = URI(self.tmpdir) / 'dest.bin'
+        report = URI(self.source).copy(dest, workers=4, chunk_size=1000,
+                                       verify=True)
+        with dest.open('rb') as inf:
+            self.assertEqual(inf.read(), content)
+        self.assertTrue(self.allocated(dest.path) < 1 << 20)
+        self.assertEqual(report.bytes, 8 << 20)
+        self.assertTrue(report.skipped >= (8 << 20) - (1 << 20))
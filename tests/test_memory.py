@@ -15,6 +15,7 @@ from abl.util import LockFileObtainException
 from abl.vpath.base import URI
 from abl.vpath.base.exceptions import FileDoesNotExistError
 from abl.vpath.base.fs import CONNECTION_REGISTRY
+from abl.vpath.base.memory import SparseBuffer
 
 from .common import create_file, CleanupMemoryBeforeTestMixin
 
@@ -189,6 +190,45 @@ class MemoryFSTests(CleanupMemoryBeforeTestMixin, TestCase):
         self.assertEqual(set(content), set(["foo", "bar"]))
 
 
+    def test_writing_after_the_end_leaves_a_hole(self):
+        path = self.root / 'sparse.bin'
+        with path.open('wb') as outf:
+            outf.write(b'head')
+            outf.seek(1 << 20)
+            outf.write(b'tail')
+            outf.truncate(2 << 20)
+        mem_file = path.get_connection()._get_node_for_path(
+            path.get_connection()._fs, path)
+        self.assertTrue(isinstance(mem_file._data, SparseBuffer))
+        self.assertEqual(mem_file._data.extents(), [(0, 4), (1 << 20, 4)])
+        self.assertEqual(path.info().size, 2 << 20)
+        with path.open('rb') as inf:
+            content = inf.read()
+        self.assertEqual(content, b'head' + b'\0' * ((1 << 20) - 4) + b'tail' +
+                         b'\0' * ((1 << 20) - 4))
+
+
+    def test_sparse_buffer(self):
+        data = SparseBuffer(b'abc')
+        data.seek(10)
+        data.write(b'xyz\nline')
+        data.seek(2)
+        data.write(b'CDE')
+        self.assertEqual(data.extents(), [(0, 5), (10, 8)])
+        data.seek(4)
+        data.write(b'012345')
+        self.assertEqual(data.extents(), [(0, 18)])
+        self.assertEqual(data.getvalue(), b'abCD012345xyz\nline')
+        data.seek(0)
+        self.assertEqual(data.readline(), b'abCD012345xyz\n')
+        self.assertEqual(data.readline(), b'line')
+        data.truncate(3)
+        data.seek(6)
+        data.write(b'!')
+        self.assertEqual(data.getvalue(), b'abC\0\0\0!')
+        self.assertEqual(data.extents(), [(0, 3), (6, 1)])
+
+
     def test_cleanup_removes_lingering_locks(self):
         lockfile = self.root / "lockfile"
         with lockfile.open("w") as outf:
@@ -324,6 +364,22 @@ class TestRemovalOfFilesAndDirs(CleanupMemoryBeforeTestMixin, TestCase):
                 assert False, "Shouldn't be here"
 
 
+    def test_pre_call_hook_only_runs_with_callbacks(self):
+        p = self.root_path / "test.txt"
+        create_file(p)
+        connection = p.get_connection()
+        self.assertTrue(connection._pre_call_hook is None)
+
+        calls = []
+        p._manipulate(next_op_callback=lambda path, func: calls.append(func.__name__))
+        self.assertTrue(connection._pre_call_hook is not None)
+        p.exists()
+        self.assertEqual(calls, ['exists'])
+
+        p._manipulate(next_op_callback=None)
+        self.assertTrue(connection._pre_call_hook is None)
+
+
     def test_reading_from_write_only_files_not_working(self):
         p = self.root_path / "test.txt"
         with p.open("w") as outf:
@@ -4,6 +4,7 @@
 # (C) 2008-2017 Ableton AG
 #******************************************************************************
 
+import inspect
 import os
 import shutil
 import tempfile
@@ -11,7 +12,10 @@ from unittest import TestCase
 
 
 from abl.vpath.base import URI
-from abl.vpath.base.fs import scheme_re
+from abl.vpath.base.fs import scheme_re, UriInternTable, CONNECTION_REGISTRY
+from abl.vpath.base.localfs import LocalFileSystem
+from abl.vpath.base import intern_uri, BaseUri
+from abl.vpath.base.simpleuri import parse_cache_info
 
 
 class KeepCurrentDir:
@@ -288,6 +292,39 @@ class TestURI(TestCase):
         self.assertEqual(pth.dirname(level=5), URI("/"))
 
 
+    def test_derived_uris_are_not_parsed(self):
+        pth = URI("scheme://host/this/is/a/path?extra=arg")
+        misses = parse_cache_info().misses
+        joined = pth / "more" / "parts"
+        parent, name = pth.split()
+        grandparent = pth.directory(level=2)
+        self.assertEqual(parse_cache_info().misses, misses)
+        self.assertEqual(joined, URI("scheme://host/this/is/a/path/more/parts?extra=arg"))
+        self.assertEqual(joined.uri, "scheme://host/this/is/a/path/more/parts?extra=arg")
+        self.assertEqual(parent, URI("scheme://host/this/is/a"))
+        self.assertEqual(name, "path")
+        self.assertEqual(grandparent, URI("scheme://host/this/is"))
+        for derived in [joined, parent, grandparent]:
+            self.assertEqual(derived._key(), pth._key())
+            self.assertEqual(derived._extras(), pth._extras())
+            self.assertEqual(derived.extras, pth._extras())
+
+
+    def test_last_and_suffix_ignore_query(self):
+        pth = URI("scheme://host/some/path?extra=arg")
+        self.assertEqual(pth.last(), "path")
+        self.assertEqual(pth.basename(), "path")
+        self.assertEqual(pth + ".foo", URI("scheme://host/some/path.foo?extra=arg"))
+
+
+    def test_split_on_vpath_root(self):
+        pth = URI('zip://((/path/to/file.zip))/content.txt')
+        root, name = pth.split()
+        self.assertEqual(root, URI('zip://((/path/to/file.zip))/'))
+        self.assertEqual(root.vpath_connector, '/path/to/file.zip')
+        self.assertEqual(name, 'content.txt')
+
+
 class TestFileSystem(TestCase):
     def setUp(self):
         thisdir = os.path.split(os.path.abspath(__file__))[0]
@@ -311,6 +348,25 @@ class TestFileSystem(TestCase):
         self.assertTrue(foo_path_connection is not foo_path.get_connection())
 
 
+    def test_copy_passes_only_the_options_in_use(self):
+        calls = []
+
+        class OldCopyFileSystem(LocalFileSystem):
+            def copy(self, source, dest, recursive=False, ignore=None,
+                     followlinks=True, **options):
+                calls.append(options)
+
+        CONNECTION_REGISTRY.register('oldcopy', OldCopyFileSystem)
+        try:
+            source = URI('oldcopy:///source')
+            source.copy(URI('oldcopy:///dest'))
+            source.copy(URI('oldcopy:///dest'), recursive=True, workers=2)
+            source.copy(URI('oldcopy:///dest'), verify=True)
+        finally:
+            del CONNECTION_REGISTRY.schemes['oldcopy']
+        self.assertEqual(calls, [{}, {'workers': 2}, {'verify': True}])
+
+
 class TestEq(TestCase):
     def test_eq(self):
         """
@@ -318,3 +374,124 @@ class TestEq(TestCase):
         """
         p = URI('/some/path')
         self.assertNotEqual(p, None)
+
+
+    def test_hash(self):
+        self.assertEqual(hash(URI('/some/path')), hash(URI('file:///some/path')))
+        self.assertEqual(len(set([URI('/a'), URI('/a'), URI('/b')])), 2)
+        self.assertEqual(hash(URI('/some') / 'path'), hash(URI('/some/path')))
+
+
+    def test_hash_is_kept_on_query_change(self):
+        p = URI('http://storm/this')
+        uris = {p: 'value'}
+        p.query['a'] = 'b'
+        self.assertEqual(uris[p], 'value')
+
+
+    def test_hash_after_rescheming(self):
+        p = URI('first:///scheme')
+        hash(p)
+        p.scheme = 'second'
+        self.assertEqual(hash(p), hash(URI('second:///scheme')))
+
+
+class TestInterning(TestCase):
+    def setUp(self):
+        self.table = UriInternTable()
+
+
+    def test_identical_uris_are_shared(self):
+        first = self.table.intern(URI('memory:///some/path'))
+        second = self.table.intern(URI('memory:///some') / 'path')
+        self.assertTrue(first is second)
+        self.assertEqual(len(self.table), 1)
+
+
+    def test_different_uris_are_not_shared(self):
+        plain = self.table.intern(URI('scheme://host/path'))
+        for other in [URI('scheme://host/path?a=b'),
+                      URI('scheme://user@host/path'),
+                      URI('scheme://host/path', key='value'),
+                      URI('scheme://((/file.zip))/path'),
+                      URI('scheme://host/other')]:
+            self.assertTrue(self.table.intern(other) is other)
+
+
+    def test_table_does_not_keep_uris_alive(self):
+        self.table.intern(URI('memory:///some/path'))
+        self.assertEqual(len(self.table), 0)
+
+
+    def test_default_table(self):
+        p = URI('/some/path')
+        self.assertTrue(intern_uri(p) is p)
+        self.assertTrue(intern_uri(URI('/some/path')) is p)
+
+
+class TestDispatch(TestCase):
+    def test_signature_is_preserved(self):
+        signature = inspect.signature(URI('/some/path').copy)
+        self.assertEqual(list(signature.parameters),
+                         ['other', 'recursive', 'ignore', 'followlinks',
+                          'cycles', 'workers', 'chunk_size', 'verify'])
+        self.assertEqual(BaseUri.copy.__name__, 'copy')
+        self.assertTrue(BaseUri.copy.__doc__.strip().startswith('copy:'))
+
+
+class TestCompactUri(TestCase):
+    def test_uris_have_no_instance_dict(self):
+        for uri in [URI('/some/path'), URI('memory:///some/path')]:
+            self.assertFalse(hasattr(uri, '__dict__'))
+            self.assertFalse(hasattr(uri.parse_result, '__dict__'))
+
+
+    def test_components_are_shared(self):
+        first = URI('scheme://user@host/first')
+        second = URI('scheme://user@host/second')
+        self.assertTrue(first.hostname is second.hostname)
+        self.assertTrue(first.username is second.username)
+
+
+    def test_extras_are_created_on_demand(self):
+        first = URI('/first')
+        self.assertEqual(first._extra_args, None)
+        first.extras['key'] = 'value'
+        self.assertEqual(first.extras, {'key': 'value'})
+        self.assertEqual(first._extras(), {'key': 'value'})
+        self.assertEqual(URI('/second').extras, {})
+        given = URI('/third', key='value')
+        given.extras['other'] = 'value'
+        self.assertEqual(given.extras, {'key': 'value', 'other': 'value'})
+        self.assertEqual((given / 'child').extras, given.extras)
+
+
+    def test_connection_key_can_be_set(self):
+        p = URI('/some/path')
+        self.assertEqual(p._key()[1], '')
+        connection = p.get_connection()
+        p.hostname = 'other'
+        p.vpath_connector = 'connector'
+        self.assertEqual(p.hostname, 'other')
+        self.assertEqual(p._key()[1], 'other')
+        self.assertEqual(p._key()[-1], 'connector')
+        self.assertFalse(p.get_connection() is connection)
+        self.assertEqual(p.get_connection().hostname, 'other')
+        self.assertEqual(p.get_connection().vpath_connector, 'connector')
+
+
+    def test_attributes_are_still_available(self):
+        p = URI('scheme://user:pw@host:22/some/path?a=b')
+        self.assertEqual(p.hostname, 'host')
+        self.assertEqual(p.port, 22)
+        self.assertEqual(p.username, 'user')
+        self.assertEqual(p.password, 'pw')
+        self.assertEqual(p.netloc, 'host:22')
+        self.assertEqual(p.authority, 'user:pw@host:22')
+        self.assertEqual(p.query, {'a': 'b'})
+
+
+    def test_username_from_extras(self):
+        p = URI('scheme://host/some/path', username='user', key='value')
+        self.assertEqual(p.username, 'user')
+        self.assertEqual(p.extras, {'key': 'value'})
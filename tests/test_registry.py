@@ -0,0 +1,570 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from abl.vpath.base import URI
+from abl.vpath.base.exceptions import ConnectionPoolTimeout
+from abl.vpath.base.fs import CONNECTION_REGISTRY, ConnectionRegistry, FileSystem
+from abl.vpath.base.localfs import LocalFileSystem
+from abl.vpath.base.memory import MemoryFileSystem
+from abl.vpath.base.pool import ConnectionPool
+
+from .common import create_file, CleanupMemoryBeforeTestMixin
+
+
+class TestConnectionCache(CleanupMemoryBeforeTestMixin, TestCase):
+
+    def test_connection_is_looked_up_once(self):
+        root = URI('memory:///')
+        root.isdir()
+        lookups = CONNECTION_REGISTRY.lookups
+        for _ in range(10):
+            root.isdir()
+            root.exists()
+        self.assertEqual(CONNECTION_REGISTRY.lookups, lookups)
+
+
+    def test_derived_uris_share_the_connection(self):
+        root = URI('memory:///')
+        connection = root.get_connection()
+        lookups = CONNECTION_REGISTRY.lookups
+        directory = root / 'dir'
+        directory.makedirs()
+        create_file(directory / 'file.txt')
+        self.assertEqual((directory / 'file.txt').split()[0].listdir(),
+                         ['file.txt'])
+        self.assertEqual(CONNECTION_REGISTRY.lookups, lookups)
+        self.assertTrue(directory.get_connection() is connection)
+
+
+    def test_cleanup_invalidates_cached_connections(self):
+        root = URI('memory:///')
+        create_file(root / 'file.txt')
+        CONNECTION_REGISTRY.cleanup(force=True)
+        self.assertFalse((root / 'file.txt').exists())
+        self.assertTrue(root.get_connection() is
+                        CONNECTION_REGISTRY.get_connection(*root._key()))
+
+
+    def test_changing_the_query_invalidates_the_connection(self):
+        p = URI('memory:///?some=thing')
+        connection = p.get_connection()
+        p.query['some'] = 'other'
+        self.assertFalse(p.get_connection() is connection)
+
+
+    def test_changing_the_extras_invalidates_the_connection(self):
+        p = URI('memory:///', foo=1)
+        p.exists()
+        p.extras['foo'] = 2
+        p.exists()
+        self.assertEqual(p.connection.extras, {'foo': 2})
+        p.extras = {'foo': 3}
+        self.assertEqual(p.get_connection().extras, {'foo': 3})
+
+
+
+class SlowMemoryFileSystem(MemoryFileSystem):
+
+    scheme = 'slowmemory'
+    created = 0
+
+    def _initialize(self):
+        SlowMemoryFileSystem.created += 1
+        # widen the window in which other threads could create it, too
+        time.sleep(.05)
+        super(SlowMemoryFileSystem, self)._initialize()
+
+
+
+class CleaningMemoryFileSystem(MemoryFileSystem):
+    """
+    runs the connection cleaner whenever a file is opened for reading,
+    with all connections idle for long enough
+    """
+
+    scheme = 'cleaningmemory'
+
+    def open(self, path, options, mimetype):
+        if options is None or 'r' in options:
+            for connection in list(CONNECTION_REGISTRY.connections.values()):
+                connection.last_used = 0
+            CONNECTION_REGISTRY.cleanup()
+        return super(CleaningMemoryFileSystem, self).open(path, options,
+                                                          mimetype)
+
+
+
+class TestThreadSafety(CleanupMemoryBeforeTestMixin, TestCase):
+
+    def setUp(self):
+        super(TestThreadSafety, self).setUp()
+        CONNECTION_REGISTRY.register('slowmemory', SlowMemoryFileSystem)
+        SlowMemoryFileSystem.created = 0
+
+
+    def tearDown(self):
+        CONNECTION_REGISTRY.cleanup(force=True)
+        del CONNECTION_REGISTRY.schemes['slowmemory']
+        super(TestThreadSafety, self).tearDown()
+
+
+    def test_connection_is_created_once(self):
+        connections = []
+        def connect():
+            connections.append(URI('slowmemory:///').get_connection())
+        threads = [threading.Thread(target=connect) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(SlowMemoryFileSystem.created, 1)
+        self.assertEqual(len(set(map(id, connections))), 1)
+
+
+    def test_cleanup_keeps_leased_connections(self):
+        root = URI('slowmemory:///')
+        connection = root.lease()
+        try:
+            connection.last_used = 0
+            CONNECTION_REGISTRY.cleanup()
+            self.assertTrue(CONNECTION_REGISTRY.get_connection(*root._key())
+                            is connection)
+            self.assertFalse(connection._evicted)
+        finally:
+            connection.checkin()
+        connection.last_used = 0
+        CONNECTION_REGISTRY.cleanup()
+        self.assertTrue(connection._evicted)
+        self.assertFalse(root.get_connection() is connection)
+
+
+    def test_lease_retries_evicted_connections(self):
+        root = URI('slowmemory:///')
+        connection = root.get_connection()
+        CONNECTION_REGISTRY.cleanup(force=True)
+        self.assertTrue(connection._evicted)
+        leased = root.lease()
+        leased.checkin()
+        self.assertFalse(leased is connection)
+        self.assertFalse(leased._evicted)
+        self.assertEqual(connection._leases, [])
+
+
+    def test_walks_keep_the_lease(self):
+        root = URI('slowmemory:///')
+        (root / 'dir').makedirs()
+        connection = root.get_connection()
+        walk = root.walk()
+        self.assertEqual(len(connection._leases), 1)
+        connection.last_used = 0
+        CONNECTION_REGISTRY.cleanup()
+        self.assertFalse(connection._evicted)
+        self.assertEqual(len(list(walk)), 2)
+        self.assertEqual(connection._leases, [])
+        walk = root.walk_entries()
+        del walk
+        self.assertEqual(connection._leases, [])
+
+
+    def test_open_files_keep_the_lease(self):
+        root = URI('slowmemory:///')
+        connection = root.get_connection()
+        outf = (root / 'foo.txt').open('w')
+        self.assertEqual(len(connection._leases), 1)
+        outf.write('foo')
+        outf.close()
+        self.assertEqual(connection._leases, [])
+        with (root / 'foo.txt').open() as inf:
+            self.assertEqual(len(connection._leases), 1)
+            self.assertEqual(inf.read(), 'foo')
+        self.assertEqual(connection._leases, [])
+        inf.close()
+        self.assertEqual(connection._leases, [])
+
+
+    def test_copies_keep_the_lease_of_the_target(self):
+        CONNECTION_REGISTRY.register('cleaningmemory',
+                                     CleaningMemoryFileSystem)
+        try:
+            source = URI('cleaningmemory:///source')
+            (source / 'dir').makedirs()
+            create_file(source / 'dir' / 'foo.txt')
+            dest = URI('slowmemory:///')
+            connection = dest.get_connection()
+            (source / 'dir' / 'foo.txt').copy(dest / 'foo.txt')
+            source.copy(dest / 'tree', recursive=True)
+            self.assertFalse(connection._evicted)
+            self.assertTrue((dest / 'foo.txt').isfile())
+            self.assertTrue((dest / 'tree' / 'dir' / 'foo.txt').isfile())
+            self.assertEqual(connection._leases, [])
+        finally:
+            del CONNECTION_REGISTRY.schemes['cleaningmemory']
+
+
+    def test_concurrent_calls(self):
+        root = URI('slowmemory:///')
+        errors = []
+        def work(n):
+            try:
+                directory = root / str(n)
+                for i in range(50):
+                    directory.makedirs()
+                    (directory / str(i)).makedirs()
+                    CONNECTION_REGISTRY.cleanup()
+                    self.assertTrue((directory / str(i)).isdir())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(root.listdir()), ['0', '1', '2', '3'])
+
+
+
+class DummyFileSystem(FileSystem):
+
+    def _initialize(self):
+        self.closed = False
+
+
+    def close(self):
+        self.closed = True
+
+
+
+class TestConnectionPool(TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.created = []
+
+
+    def pool(self, **config):
+        def factory():
+            connection = DummyFileSystem()
+            self.created.append(connection)
+            return connection
+        return ConnectionPool(factory, clock=lambda: self.now, **config)
+
+
+    def test_min_size_connections_are_created_up_front(self):
+        pool = self.pool(min_size=2)
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(pool.stats(), dict(size=2, busy=0, idle=2, waiting=0,
+                                            min_size=2, max_size=4))
+
+
+    def test_exclusive_checkout(self):
+        pool = self.pool(shareable=False, max_size=2, timeout=0.01)
+        a = pool.checkout()
+        b = pool.checkout()
+        self.assertFalse(a is b)
+        self.assertEqual(pool.stats()['busy'], 2)
+        self.assertRaises(ConnectionPoolTimeout, pool.checkout)
+        a.checkin()
+        self.assertTrue(pool.checkout() is a)
+        self.assertEqual(len(self.created), 2)
+
+
+    def test_waiting_callers_get_checked_in_connections(self):
+        pool = self.pool(shareable=False, max_size=1)
+        connection = pool.checkout()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.checkout()))
+        waiter.start()
+        while not pool.stats()['waiting']:
+            time.sleep(.001)
+        connection.checkin()
+        waiter.join()
+        self.assertEqual(got, [connection])
+
+
+    def test_shareable_connections_are_shared_when_the_pool_is_full(self):
+        pool = self.pool(max_size=2)
+        a = pool.checkout()
+        b = pool.checkout()
+        c = pool.checkout()
+        self.assertFalse(a is b)
+        self.assertTrue(c is a or c is b)
+        self.assertEqual(pool.stats()['size'], 2)
+
+
+    def test_prune_keeps_min_size(self):
+        pool = self.pool(min_size=1, max_idle=10)
+        a = pool.checkout()
+        b = pool.checkout()
+        a.checkin()
+        b.checkin()
+        self.now = 5
+        self.assertEqual(pool.prune(), [])
+        self.now = 20
+        pruned = pool.prune()
+        self.assertEqual(len(pruned), 1)
+        self.assertFalse(pruned[0].closed)
+        self.assertEqual(pool.stats()['size'], 1)
+
+
+    def test_close_closes_busy_connections_on_checkin(self):
+        pool = self.pool()
+        a = pool.checkout()
+        b = pool.checkout()
+        b.checkin()
+        pool.close()
+        self.assertTrue(b.closed)
+        self.assertFalse(a.closed)
+        self.assertTrue(pool.checkout() is None)
+        a.checkin()
+        self.assertTrue(a.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+
+
+class ExclusiveLocalFileSystem(LocalFileSystem):
+
+    scheme = 'exclusivefile'
+    shareable = False
+
+
+
+class TestPooledRegistry(TestCase):
+
+    def setUp(self):
+        CONNECTION_REGISTRY.cleanup(force=True)
+        CONNECTION_REGISTRY.register('exclusivefile', ExclusiveLocalFileSystem)
+        CONNECTION_REGISTRY.configure_pool('exclusivefile', max_size=2)
+        self.tmpdir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        CONNECTION_REGISTRY.cleanup(force=True)
+        del CONNECTION_REGISTRY.schemes['exclusivefile']
+        del CONNECTION_REGISTRY.pool_configs[('exclusivefile', None)]
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_calls_check_out_pooled_connections(self):
+        root = URI('exclusivefile://' + self.tmpdir)
+        (root / 'dir').makedirs()
+        self.assertTrue((root / 'dir').isdir())
+        stats = CONNECTION_REGISTRY.pool_stats()
+        self.assertEqual(list(stats.values()),
+                         [dict(size=1, busy=0, idle=1, waiting=0,
+                               min_size=0, max_size=2)])
+
+
+    def test_leased_connections_are_exclusive(self):
+        root = URI('exclusivefile://' + self.tmpdir)
+        leased = root.lease()
+        try:
+            self.assertTrue(leased.exists(root))
+            other = threading.Thread(target=root.exists)
+            other.start()
+            other.join()
+            self.assertEqual(list(CONNECTION_REGISTRY.pool_stats().values())[0]
+                             ['size'], 2)
+        finally:
+            leased.checkin()
+
+
+    def test_leases_are_reentrant(self):
+        CONNECTION_REGISTRY.configure_pool('exclusivefile', max_size=1,
+                                           timeout=1)
+        root = URI('exclusivefile://' + self.tmpdir)
+        with (root / 'foo.txt').open('w') as outf:
+            outf.write('foo')
+        leased = root.lease()
+        try:
+            self.assertTrue(root.lease() is leased)
+            leased.checkin()
+        finally:
+            leased.checkin()
+        # backend calls running other decorated methods
+        self.assertEqual((root / 'foo.txt').md5(),
+                         'acbd18db4cc2f85cedef654fccc4a4d8')
+        (root / 'foo.txt').move(root / 'bar.txt')
+        self.assertEqual(root.listdir(), ['bar.txt'])
+        [entry] = root.scandir()
+        self.assertEqual(entry.size, 3)
+        for _, _, files in root.walk():
+            self.assertTrue((root / files[0]).isfile())
+        for _, _, entries in root.walk_entries():
+            self.assertEqual(entries[0].size, 3)
+        self.assertEqual(list(CONNECTION_REGISTRY.pool_stats().values()),
+                         [dict(size=1, busy=0, idle=1, waiting=0,
+                               min_size=0, max_size=1)])
+
+
+    def test_parallel_walk_on_a_single_exclusive_connection(self):
+        CONNECTION_REGISTRY.configure_pool('exclusivefile', max_size=1,
+                                           timeout=3)
+        root = URI('exclusivefile://' + self.tmpdir)
+        for name in ('a', 'b', 'c'):
+            (root / name / 'sub').makedirs()
+        walked = sorted(path.path[len(root.path):]
+                        for path, dirs, files in
+                        root.parallel_walk(max_workers=4))
+        self.assertEqual(walked, ['', '/a', '/a/sub', '/b', '/b/sub', '/c',
+                                  '/c/sub'])
+        self.assertEqual(root.get_connection()._parallel_workers(4), 0)
+        CONNECTION_REGISTRY.cleanup(force=True)
+        CONNECTION_REGISTRY.configure_pool('exclusivefile', max_size=3)
+        root = URI('exclusivefile://' + self.tmpdir)
+        self.assertEqual(root.get_connection()._parallel_workers(4), 2)
+        self.assertEqual(len(list(root.parallel_walk(max_workers=4))), 7)
+
+
+    def test_parallel_copy_on_a_single_exclusive_connection(self):
+        CONNECTION_REGISTRY.configure_pool('exclusivefile', max_size=1,
+                                           timeout=3)
+        root = URI('exclusivefile://' + self.tmpdir)
+        (root / 'source').makedirs()
+        for name in ('a', 'b', 'c'):
+            with (root / 'source' / name).open('w') as outf:
+                outf.write(name)
+        report = (root / 'source').copy(root / 'dest', recursive=True,
+                                        workers=2)
+        self.assertEqual(report.files, 3)
+        self.assertEqual((root / 'dest').listdir(), ['a', 'b', 'c'])
+        stats = list(CONNECTION_REGISTRY.pool_stats().values())[0]
+        self.assertEqual((stats['size'], stats['busy']), (1, 0))
+
+
+    def test_concurrent_calls(self):
+        root = URI('exclusivefile://' + self.tmpdir)
+        errors = []
+        def work(n):
+            try:
+                for i in range(20):
+                    path = root / str(n) / str(i)
+                    path.makedirs()
+                    self.assertTrue(path.isdir())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        stats = list(CONNECTION_REGISTRY.pool_stats().values())[0]
+        self.assertTrue(stats['size'] <= 2)
+        self.assertEqual(stats['busy'], 0)
+
+
+
+class TestScheduler(TestCase):
+
+    def setUp(self):
+        self.now = 1000
+        self.registry = ConnectionRegistry(clean_interval=10, clean_timeout=100)
+        self.registry.clock = lambda: self.now
+        self.registry.register('memory', MemoryFileSystem)
+        self.registry.register('file', LocalFileSystem)
+
+
+    def tearDown(self):
+        self.registry.shutdown()
+
+
+    def test_no_thread_without_evictable_connections(self):
+        self.assertTrue(self.registry.cleaner_thread is None)
+        self.registry.get_connection('file')
+        self.assertTrue(self.registry.cleaner_thread is None)
+        self.registry.get_connection('memory')
+        self.assertTrue(self.registry.cleaner_thread.is_alive())
+
+
+    def test_connections_are_closed_when_due(self):
+        connection = self.registry.get_connection('memory')
+        self.now += 50
+        self.assertEqual(self.registry.run_due(), 0)
+        self.now += 51
+        self.assertEqual(self.registry.run_due(), 1)
+        self.assertFalse(self.registry.get_connection('memory') is connection)
+
+
+    def test_used_connections_are_rescheduled(self):
+        connection = self.registry.get_connection('memory')
+        self.now += 50
+        connection.checkout()
+        connection.checkin()
+        self.now += 51
+        self.assertEqual(self.registry.run_due(), 0)
+        self.now += 48
+        self.assertEqual(self.registry.run_due(), 0)
+        # clean_timeout after the last use, not after the check
+        self.now += 1
+        self.assertEqual(self.registry.run_due(), 1)
+
+
+    def test_idle_pooled_connections_are_closed_when_due(self):
+        self.registry.configure_pool('memory')
+        pool = self.registry.get_connection('memory')
+        connection = pool.checkout()
+        self.now += 60
+        connection.checkin()
+        self.now += 40
+        self.registry.run_due()
+        self.assertEqual(pool.stats()['size'], 1)
+        self.now += 59
+        self.registry.run_due()
+        self.assertEqual(pool.stats()['size'], 1)
+        self.now += 1
+        self.registry.run_due()
+        self.assertEqual(pool.stats()['size'], 0)
+
+
+    def test_leased_connections_are_checked_again(self):
+        connection = self.registry.get_connection('memory')
+        connection.checkout()
+        self.now += 101
+        self.assertEqual(self.registry.run_due(), 0)
+        connection.checkin()
+        self.now += 10
+        self.assertEqual(self.registry.run_due(), 0)
+        self.now += 90
+        self.assertEqual(self.registry.run_due(), 1)
+
+
+    def test_cleaner_thread_closes_due_connections(self):
+        connection = self.registry.get_connection('memory')
+        closed = threading.Event()
+        connection.close = closed.set
+        self.now += 101
+        with self.registry._schedule_condition:
+            self.registry._schedule_condition.notify()
+        self.assertTrue(closed.wait(5))
+
+
+    def test_shutdown_is_prompt(self):
+        self.registry.get_connection('memory')
+        thread = self.registry.cleaner_thread
+        start = time.time()
+        self.registry.shutdown()
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(time.time() - start < .5)
+
+
+    def test_after_fork_starts_over(self):
+        self.registry.get_connection('memory')
+        old_condition = self.registry._schedule_condition
+        self.registry._after_fork()
+        try:
+            self.assertTrue(self.registry.cleaner_thread is None)
+            self.registry.get_connection('memory', extras='other')
+            self.assertTrue(self.registry.cleaner_thread is not None)
+        finally:
+            # there is no fork, so the old cleaner thread is still there
+            self.registry.run_clean_thread = False
+            with old_condition:
+                old_condition.notify()
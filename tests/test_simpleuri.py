@@ -4,7 +4,13 @@
 
 import unittest
 
-from abl.vpath.base.simpleuri import UriParse
+from abl.vpath.base.simpleuri import (
+    UriParse,
+    clear_parse_cache,
+    parse_cache_info,
+    set_parse_cache_size,
+    PARSE_CACHE_SIZE,
+    )
 
 class TestSimpleUri(unittest.TestCase):
     def test_one(self):
@@ -82,5 +88,42 @@ class TestSimpleUri(unittest.TestCase):
         self.assertEqual(uri.vpath_connector, '/path/to/local/file.zip')
         self.assertEqual(uri.path, '/content.txt')
 
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        clear_parse_cache()
+
+    def tearDown(self):
+        set_parse_cache_size(PARSE_CACHE_SIZE)
+
+    def test_hits_and_misses(self):
+        UriParse('scheme:///some/path')
+        UriParse('scheme:///some/path')
+        UriParse('scheme:///other/path')
+        info = parse_cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 2)
+        self.assertEqual(info.currsize, 2)
+
+    def test_cache_is_bounded(self):
+        set_parse_cache_size(2)
+        for i in range(5):
+            UriParse('scheme:///some/path%d' % i)
+        self.assertEqual(parse_cache_info().currsize, 2)
+
+    def test_query_is_copied_on_write(self):
+        first = UriParse('scheme:///some/path?key=value')
+        second = UriParse('scheme:///some/path?key=value')
+        first.query['key'] = 'changed'
+        self.assertEqual(second.query, {'key': 'value'})
+        self.assertEqual(UriParse('scheme:///some/path?key=value').query,
+                         {'key': 'value'})
+
+    def test_empty_query_is_copied_on_write(self):
+        first = UriParse('http://heinz/')
+        first.query['a'] = '1'
+        self.assertEqual(UriParse('http://heinz/').query, {})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,81 @@
+#******************************************************************************
+# (C) 2026 Ableton AG
+#******************************************************************************
+
+from unittest import TestCase
+
+from abl.vpath.base import URI, URIArray
+from abl.vpath.base.simpleuri import parse_cache_info
+
+from .common import create_file, CleanupMemoryBeforeTestMixin
+
+
+class TestURIArray(TestCase):
+    def setUp(self):
+        self.root = URI('memory:///root')
+        self.array = URIArray(self.root, ['a/one.txt', 'a/two.dat', 'b/c/three',
+                                          'four.txt'])
+
+
+    def test_materializes_uris(self):
+        self.assertEqual(len(self.array), 4)
+        self.assertEqual(self.array[0], self.root / 'a' / 'one.txt')
+        self.assertEqual(list(self.array)[3], URI('memory:///root/four.txt'))
+        self.assertEqual(self.array[1:3].relpaths, ('a/two.dat', 'b/c/three'))
+
+
+    def test_uris_are_not_parsed(self):
+        misses = parse_cache_info().misses
+        self.array.uris()
+        self.assertEqual(parse_cache_info().misses, misses)
+
+
+    def test_path_operations(self):
+        self.assertEqual(self.array.basename(),
+                         ['one.txt', 'two.dat', 'three', 'four.txt'])
+        self.assertEqual(self.array.last(),
+                         ['one.txt', 'two.dat', 'three', 'four.txt'])
+        self.assertEqual(self.array.splitext(),
+                         [('one', '.txt'), ('two', '.dat'), ('three', ''),
+                          ('four', '.txt')])
+        dirs, names = self.array.split()
+        self.assertEqual(dirs.relpaths, ('a', 'a', 'b/c', ''))
+        self.assertEqual(names, self.array.basename())
+        self.assertEqual(dirs[3], self.root)
+        self.assertEqual(self.array.directory(), dirs)
+
+
+    def test_join(self):
+        joined = self.array.join('x', 'y.bak')
+        self.assertEqual(joined[0], self.root / 'a' / 'one.txt' / 'x' / 'y.bak')
+        self.assertEqual(URIArray(self.root, ['']).join('x')[0], self.root / 'x')
+
+
+    def test_group_by_directory(self):
+        self.assertEqual(list(self.array.group_by_directory().items()),
+                         [('a', ['one.txt', 'two.dat']),
+                          ('b/c', ['three']),
+                          ('', ['four.txt'])])
+
+
+    def test_from_uris(self):
+        uris = [self.root / 'a' / 'one.txt', self.root / 'four.txt']
+        array = URIArray.from_uris(self.root, uris)
+        self.assertEqual(array.relpaths, ('a/one.txt', 'four.txt'))
+        self.assertEqual(array.uris(), uris)
+        self.assertRaises(ValueError, URIArray.from_uris, self.root,
+                          [URI('memory:///other/file')])
+        self.assertRaises(ValueError, URIArray.from_uris, self.root,
+                          [URI('file:///root/file')])
+
+
+class TestURIArrayBackend(CleanupMemoryBeforeTestMixin, TestCase):
+
+    def test_batch_checks(self):
+        root = URI('memory:///root')
+        (root / 'dir').makedirs()
+        create_file(root / 'file.txt')
+        array = URIArray(root, ['dir', 'file.txt', 'missing'])
+        self.assertEqual(array.exists(), [True, True, False])
+        self.assertEqual(array.isdir(), [True, False, False])
+        self.assertEqual(array.isfile(), [False, True, False])
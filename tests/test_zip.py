@@ -1,9 +1,16 @@
+import os
+import shutil
+import struct
+import tempfile
 from unittest import TestCase
-from zipfile import ZipFile
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
 
-from abl.vpath.base import URI
+from abl.vpath.base import URI, CopyError
+from abl.vpath.base.exceptions import FileDoesNotExistError
 
-from abl.vpath.base.zip import compare_parts, ISDIR, ISFILE, content_item
+from abl.vpath.base.zip import (compare_parts, ISDIR, ISFILE, content_item,
+                                ZipIndex, ArchiveCache, ARCHIVES,
+                                MAX_OPEN_ARCHIVES)
 from abl.vpath.base.fs import CONNECTION_REGISTRY
 
 
@@ -84,6 +91,26 @@ class TestWritingZip(ZipTestCase):
             fd.write(b'foo')
 
 
+    def test_write_session(self):
+        root = URI('zip://((%s))/' % self.zip_uri)
+        with (root / 'old.txt').open('wb') as fd:
+            fd.write(b'old')
+        with self.zip_path.open('rb') as inf:
+            original = inf.read()
+        with self.assertRaises(RuntimeError):
+            with root.write_session():
+                with (root / 'new.txt').open('wb') as fd:
+                    fd.write(b'new' * 1000)
+                raise RuntimeError
+        with self.zip_path.open('rb') as inf:
+            self.assertEqual(inf.read(), original)
+        with root.write_session():
+            for name in ('a.txt', 'b.txt'):
+                with (root / name).open('wb') as fd:
+                    fd.write(name.encode())
+        self.assertEqual(root.listdir(), ['a.txt', 'b.txt', 'old.txt'])
+
+
 class TestReadingZip(ZipTestCase):
 
     def setUp(self):
@@ -161,6 +188,24 @@ class TestListDir(ZipTestCase):
         self.assertEqual(set(base_path.listdir()), set(['foo.txt', 'dir']))
 
 
+    def test_scandir(self):
+        base_path = URI('zip://((%s))/' % self.zip_path.uri)
+        self.assertEqual(base_path.scandir(), [])
+        with (base_path / 'foo.txt').open('wb') as fd:
+            fd.write(b'foo')
+        with (base_path / 'dir' / 'bar.txt').open('wb') as fd:
+            fd.write(b'barbar')
+        entries = base_path.scandir()
+        self.assertEqual([(e.name, e.kind, e.size) for e in entries],
+                         [('dir', 'dir', 0), ('foo.txt', 'file', 3)])
+        self.assertTrue(entries[1].mtime > 0)
+        self.assertEqual([(root.path, [d.name for d in dirs],
+                           [f.name for f in files])
+                          for root, dirs, files in base_path.walk_entries()],
+                         [('/', ['dir'], ['foo.txt']),
+                          ('/dir', [], ['bar.txt'])])
+
+
 class TestAdvancedZip(ZipTestCase):
 
     def setUp(self):
@@ -189,3 +234,501 @@ class TestAdvancedZip(ZipTestCase):
         self.assertEqual(rlist,
                          [(root, ['dir1'], ['bar.txt']),
                           ((root / 'dir1'), [], ['bar.txt', 'foo.txt'])])
+
+
+class TestZipIndex(ZipTestCase):
+
+    def setUp(self):
+        super(TestZipIndex, self).setUp()
+        self.zip_path = URI('memory:///file.zip')
+        with self.zip_path.open('wb') as zip_handle:
+            with ZipFile(zip_handle, 'w') as fp_zip:
+                # names as written by other tools: no leading slash, and
+                # entries for some directories only
+                fp_zip.writestr('a/b/c.txt', 'c')
+                fp_zip.writestr('d/', '')
+                fp_zip.writestr('e.txt', 'e')
+                fp_zip.writestr('/f.txt', 'f')
+        self.root = URI('zip://((%s))/' % self.zip_path.uri)
+
+
+    def tearDown(self):
+        self.zip_path.remove()
+
+
+    def test_lookups(self):
+        root = self.root
+        self.assertEqual(root.listdir(), ['a', 'd', 'e.txt', 'f.txt'])
+        self.assertTrue((root / 'a').isdir())
+        self.assertTrue((root / 'a' / 'b').isdir())
+        self.assertTrue((root / 'd').isdir())
+        self.assertTrue((root / 'a' / 'b' / 'c.txt').isfile())
+        self.assertFalse((root / 'a').isfile())
+        self.assertFalse((root / 'a' / 'b' / 'c.txt').isdir())
+        self.assertFalse((root / 'a' / 'c.txt').exists())
+        self.assertFalse((root / 'ab').exists())
+        self.assertEqual((root / 'd').listdir(), [])
+        with (root / 'e.txt').open() as fd:
+            self.assertEqual(fd.read(), b'e')
+        self.assertEqual([(base.path, dirs, files)
+                          for base, dirs, files in root.walk()],
+                         [('/', ['a', 'd'], ['e.txt', 'f.txt']),
+                          ('/a', ['b'], []),
+                          ('/a/b', [], ['c.txt']),
+                          ('/d', [], [])])
+
+
+    def test_writing_extends_the_index(self):
+        root = self.root
+        index = root.get_connection()._get_index()
+        with (root / 'a' / 'new' / 'g.txt').open('wb') as fd:
+            fd.write(b'g')
+        self.assertTrue((root / 'a' / 'new').isdir())
+        self.assertEqual((root / 'a').listdir(), ['b', 'new'])
+        self.assertTrue(root.get_connection()._get_index() is index)
+        self.assertEqual(index.count, 5)
+
+
+    def test_index(self):
+        index = ZipIndex()
+        self.assertEqual(index.listdir('/'), [])
+        with self.zip_path.open('rb') as zip_handle:
+            index.update(ZipFile(zip_handle).infolist())
+        self.assertEqual(sorted(index.dirs),
+                         ['/', '/a', '/a/b', '/d'])
+        self.assertEqual(sorted(index.files),
+                         ['/a/b/c.txt', '/e.txt', '/f.txt'])
+        self.assertTrue(index.isdir('/a/b/'))
+        self.assertRaises(KeyError, index.listdir, '/e.txt')
+
+
+class FakeArchive(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestArchiveCache(ZipTestCase):
+
+    def setUp(self):
+        super(TestArchiveCache, self).setUp()
+        self.zip_path = URI('memory:///file.zip')
+        self.write_archive(['a.txt', 'b.txt'])
+        self.root = URI('zip://((%s))/' % self.zip_path.uri)
+
+
+    def tearDown(self):
+        ARCHIVES.clear()
+        if self.zip_path.exists():
+            self.zip_path.remove()
+
+
+    def write_archive(self, names):
+        with self.zip_path.open('wb') as zip_handle:
+            with ZipFile(zip_handle, 'w') as fp_zip:
+                for name in names:
+                    fp_zip.writestr(name, name)
+
+
+    def read(self, name):
+        with (self.root / name).open() as fd:
+            return fd.read()
+
+
+    def test_archive_stays_open(self):
+        self.assertEqual(self.read('a.txt'), b'a.txt')
+        archive = ARCHIVES.get(self.zip_path.uri)
+        self.assertEqual(self.read('b.txt'), b'b.txt')
+        self.assertEqual(self.root.listdir(), ['a.txt', 'b.txt'])
+        self.assertTrue(ARCHIVES.get(self.zip_path.uri) is archive)
+
+        self.root.get_connection().close()
+        self.assertEqual(ARCHIVES.get(self.zip_path.uri), None)
+        self.assertEqual(self.read('a.txt'), b'a.txt')
+
+
+    def test_members_can_be_read_at_once(self):
+        with (self.root / 'a.txt').open() as fa, \
+             (self.root / 'b.txt').open() as fb:
+            self.assertEqual(fa.read(1), b'a')
+            self.assertEqual(fb.read(), b'b.txt')
+            self.assertEqual(fa.read(), b'.txt')
+
+
+    def test_changed_archive_is_opened_anew(self):
+        self.assertEqual(self.read('a.txt'), b'a.txt')
+        archive = ARCHIVES.get(self.zip_path.uri)
+        self.write_archive(['c.txt'])
+        self.assertEqual(self.root.listdir(), ['c.txt'])
+        self.assertEqual(self.read('c.txt'), b'c.txt')
+        self.assertFalse(ARCHIVES.get(self.zip_path.uri) is archive)
+
+        self.zip_path.remove()
+        self.assertFalse((self.root / 'c.txt').exists())
+        self.assertEqual(ARCHIVES.get(self.zip_path.uri), None)
+
+
+    def test_local_archive_rewritten_at_once_is_opened_anew(self):
+        thisdir = os.path.split(os.path.abspath(__file__))[0]
+        tmpdir = tempfile.mkdtemp('.temp', 'test-local-fs', thisdir)
+        try:
+            zip_path = URI(os.path.join(tmpdir, 'file.zip'))
+            root = URI('zip://((%s))/' % zip_path.uri)
+            # the same size, within the same second
+            for mtime_ns, name in [(10 ** 18, 'a.txt'),
+                                   (10 ** 18 + 1000, 'b.txt')]:
+                with zip_path.open('wb') as zip_handle:
+                    with ZipFile(zip_handle, 'w') as fp_zip:
+                        fp_zip.writestr(name, name)
+                os.utime(zip_path.path, ns=(mtime_ns, mtime_ns))
+                self.assertEqual(root.listdir(), [name])
+        finally:
+            ARCHIVES.clear()
+            shutil.rmtree(tmpdir)
+
+
+    def test_evicted_archive_stays_open_for_its_readers(self):
+        ARCHIVES.configure(1)
+        try:
+            other = URI('memory:///other.zip')
+            with other.open('wb') as zip_handle:
+                with ZipFile(zip_handle, 'w') as fp_zip:
+                    fp_zip.writestr('c.txt', b'c.txt')
+            with (self.root / 'a.txt').open() as fa:
+                archive = ARCHIVES.get(self.zip_path.uri)
+                self.assertEqual(fa.read(1), b'a')
+                with (URI('zip://((%s))/' % other.uri) / 'c.txt').open() as fc:
+                    self.assertEqual(fc.read(), b'c.txt')
+                self.assertEqual(ARCHIVES.get(self.zip_path.uri), None)
+                self.assertFalse(archive.ziphandle.fp is None)
+                self.assertEqual(fa.read(), b'.txt')
+                # evicted again right away, the reader keeps it open
+                self.assertEqual(self.read('b.txt'), b'b.txt')
+            self.assertTrue(archive.ziphandle.fp is None)
+        finally:
+            ARCHIVES.configure(MAX_OPEN_ARCHIVES)
+
+
+    def test_closing_the_connection_waits_for_readers(self):
+        with (self.root / 'a.txt').open() as fa:
+            archive = ARCHIVES.get(self.zip_path.uri)
+            self.root.get_connection().close()
+            self.assertEqual(fa.read(), b'a.txt')
+            self.assertFalse(archive.ziphandle.fp is None)
+        self.assertTrue(archive.ziphandle.fp is None)
+
+
+    def test_no_archive_kept_open(self):
+        ARCHIVES.configure(0)
+        try:
+            self.assertEqual(self.read('a.txt'), b'a.txt')
+            self.assertEqual(len(ARCHIVES), 0)
+        finally:
+            ARCHIVES.configure(MAX_OPEN_ARCHIVES)
+
+
+    def test_least_recently_used_are_closed(self):
+        cache = ArchiveCache(max_open=2)
+        archives = [FakeArchive() for _ in range(4)]
+        cache.put('a', archives[0])
+        cache.put('b', archives[1])
+        cache.get('a')
+        cache.put('c', archives[2])
+        self.assertEqual([archive.closed for archive in archives],
+                         [False, True, False, False])
+        self.assertEqual(cache.get('b'), None)
+        cache.put('a', archives[3])
+        self.assertTrue(archives[0].closed)
+        cache.configure(1)
+        self.assertTrue(archives[2].closed)
+        self.assertTrue(cache.get('a') is archives[3])
+        cache.clear()
+        self.assertTrue(archives[3].closed)
+        self.assertEqual(len(cache), 0)
+
+
+class TestWriteSession(ZipTestCase):
+
+    def setUp(self):
+        super(TestWriteSession, self).setUp()
+        self.zip_path = URI('memory:///file.zip')
+        self.root = URI('zip://((%s))/' % self.zip_path.uri)
+
+
+    def tearDown(self):
+        ARCHIVES.clear()
+        if self.zip_path.exists():
+            self.zip_path.remove()
+
+
+    def write(self, name, data):
+        with (self.root / name).open('wb') as fd:
+            fd.write(data)
+
+
+    def content(self):
+        with self.zip_path.open('rb') as inf:
+            return inf.read()
+
+
+    def test_write_many_members(self):
+        self.write('old.txt', b'old')
+        with self.root.write_session():
+            for i in range(100):
+                self.write('dir/%d.txt' % i, b'%d' % i)
+            # looked up and read through the session
+            self.assertEqual(len((self.root / 'dir').listdir()), 100)
+            with (self.root / 'old.txt').open() as fd:
+                self.assertEqual(fd.read(), b'old')
+        with self.zip_path.open('rb') as inf:
+            self.assertEqual(len(ZipFile(inf).namelist()), 101)
+        with (self.root / 'dir' / '42.txt').open() as fd:
+            self.assertEqual(fd.read(), b'42')
+
+
+    def test_abort_restores_the_archive(self):
+        self.write('old.txt', b'old')
+        original = self.content()
+        with self.assertRaises(RuntimeError):
+            with self.root.write_session():
+                for i in range(100):
+                    self.write('%d.txt' % i, b'x' * 1000)
+                raise RuntimeError
+        self.assertEqual(self.content(), original)
+        self.assertEqual(self.root.listdir(), ['old.txt'])
+        with (self.root / 'old.txt').open() as fd:
+            self.assertEqual(fd.read(), b'old')
+
+
+    def test_abort_removes_a_new_archive(self):
+        session = self.root.write_session()
+        with session:
+            self.write('new.txt', b'new')
+            session.abort()
+        self.assertFalse(self.zip_path.exists())
+        self.assertEqual(self.root.listdir(), [])
+
+
+    def test_sessions_do_not_nest(self):
+        with self.root.write_session():
+            self.assertRaises(ValueError,
+                              self.root.write_session().__enter__)
+            self.write('new.txt', b'new')
+        self.assertEqual(self.root.listdir(), ['new.txt'])
+
+
+class TestStreamingWrites(ZipTestCase):
+
+    def setUp(self):
+        super(TestStreamingWrites, self).setUp()
+        self.zip_path = URI('memory:///file.zip')
+        self.root = URI('zip://((%s))/' % self.zip_path.uri)
+
+
+    def tearDown(self):
+        ARCHIVES.clear()
+        if self.zip_path.exists():
+            self.zip_path.remove()
+
+
+    def infos(self):
+        with self.zip_path.open('rb') as inf:
+            return dict((info.filename, info)
+                        for info in ZipFile(inf).infolist())
+
+
+    def test_data_is_written_as_it_comes(self):
+        chunk = bytes(range(256)) * 4096
+        with (self.root / 'big.bin').open('wb') as fd:
+            for _ in range(4):
+                fd.write(chunk)
+            # stored in the archive already, not buffered
+            self.assertTrue(self.zip_path.info().size >= 4 * len(chunk))
+        with (self.root / 'big.bin').open('rb') as fd:
+            self.assertEqual(fd.read(), chunk * 4)
+
+
+    def test_compression_per_member(self):
+        data = b'compress me ' * 1000
+        with (self.root / 'deflated.txt').open(
+                'wb', compression=ZIP_DEFLATED, compresslevel=9) as fd:
+            fd.write(data)
+        with (self.root / 'stored.txt').open('wb') as fd:
+            fd.write(data)
+        infos = self.infos()
+        self.assertEqual(infos['/deflated.txt'].compress_type, ZIP_DEFLATED)
+        self.assertTrue(infos['/deflated.txt'].compress_size < len(data) / 10)
+        self.assertEqual(infos['/stored.txt'].compress_type, ZIP_STORED)
+        with (self.root / 'deflated.txt').open() as fd:
+            self.assertEqual(fd.read(), data)
+
+
+    def test_expected_size_selects_zip64(self):
+        with (self.root / 'small.bin').open('wb') as fd:
+            fd.write(b'small')
+        with (self.root / 'huge.bin').open('wb', size=1 << 33) as fd:
+            fd.write(b'not so huge')
+        with self.zip_path.open('rb') as inf:
+            data = inf.read()
+        extra_ids = {}
+        for name, info in self.infos().items():
+            offset = info.header_offset
+            name_length, extra_length = struct.unpack(
+                '<HH', data[offset + 26:offset + 30])
+            extra = data[offset + 30 + name_length:
+                         offset + 30 + name_length + extra_length]
+            extra_ids[name] = extra[:2]
+        # the ZIP64 extended information extra field has the id 1
+        self.assertEqual(extra_ids, {'/small.bin': b'',
+                                     '/huge.bin': b'\x01\x00'})
+        with (self.root / 'huge.bin').open() as fd:
+            self.assertEqual(fd.read(), b'not so huge')
+
+
+    def test_close_writes_the_member(self):
+        fd = (self.root / 'closed.txt').open('wb')
+        fd.write(b'closed')
+        fd.close()
+        fd.close()
+        with (self.root / 'closed.txt').open() as fd:
+            self.assertEqual(fd.read(), b'closed')
+
+
+class TestExtract(ZipTestCase):
+
+    members = {
+        'a/b/c.txt': b'c' * 100000,
+        'a/d.txt': b'd',
+        'e.txt': b'e' * 1000,
+        'f/g/h.txt': b'',
+        }
+
+    def setUp(self):
+        super(TestExtract, self).setUp()
+        thisdir = os.path.split(os.path.abspath(__file__))[0]
+        self.tmpdir = tempfile.mkdtemp('.temp', 'test-local-fs', thisdir)
+
+
+    def tearDown(self):
+        ARCHIVES.clear()
+        shutil.rmtree(self.tmpdir)
+        memory_path = URI('memory:///archive.zip')
+        if memory_path.exists():
+            memory_path.remove()
+
+
+    def archive(self, container):
+        with container.open('wb') as zip_handle:
+            with ZipFile(zip_handle, 'w', ZIP_DEFLATED) as fp_zip:
+                for name, data in sorted(self.members.items()):
+                    fp_zip.writestr(name, data)
+                fp_zip.writestr('empty/', '')
+        return URI('zip://((%s))/' % container.uri)
+
+
+    def extracted(self, dest):
+        result = {}
+        for base, dirs, files in dest.walk():
+            for name in files:
+                with (base / name).open('rb') as inf:
+                    result[(base / name).path[len(dest.path) + 1:]] = \
+                        inf.read()
+        return result
+
+
+    def check_extract(self, container, dest):
+        root = self.archive(container)
+        report = root.extract(dest, workers=3)
+        self.assertEqual(self.extracted(dest), self.members)
+        self.assertTrue((dest / 'empty').isdir())
+        self.assertEqual((report.files, report.directories, report.bytes),
+                         (4, 5, 101001))
+        self.assertTrue(report.throughput > 0)
+
+
+    def test_extract_from_memory(self):
+        self.check_extract(URI('memory:///archive.zip'),
+                           URI(self.tmpdir) / 'dest')
+
+
+    def test_extract_from_local_file(self):
+        self.check_extract(URI(self.tmpdir) / 'archive.zip',
+                           URI(self.tmpdir) / 'dest')
+
+
+    def test_extract_to_memory(self):
+        dest = URI('memory:///dest')
+        try:
+            self.check_extract(URI(self.tmpdir) / 'archive.zip', dest)
+        finally:
+            dest.remove(recursive=True)
+
+
+    def test_copy_of_the_root_extracts_as_well(self):
+        root = self.archive(URI('memory:///archive.zip'))
+        for workers in (None, 2):
+            dest = URI(self.tmpdir) / ('dest%s' % workers)
+            root.copy(dest, recursive=True, workers=workers)
+            self.assertEqual(self.extracted(dest), self.members)
+
+
+    def test_extract_some_members(self):
+        root = self.archive(URI(self.tmpdir) / 'archive.zip')
+        dest = URI(self.tmpdir) / 'dest'
+        report = root.extract(dest, members=['a/b/c.txt', 'f'])
+        self.assertEqual(self.extracted(dest),
+                         {'a/b/c.txt': self.members['a/b/c.txt'],
+                          'f/g/h.txt': b''})
+        self.assertFalse((dest / 'empty').exists())
+        self.assertEqual(report.files, 2)
+        (root / 'a').extract(dest / 'a_only')
+        self.assertEqual(self.extracted(dest / 'a_only'),
+                         {'b/c.txt': self.members['a/b/c.txt'],
+                          'd.txt': b'd'})
+        self.assertRaises(FileDoesNotExistError, root.extract, dest,
+                          members=['nope.txt'])
+        self.assertRaises(ValueError, root.extract, dest, workers=0)
+
+
+    def test_extract_stays_below_dest(self):
+        container = URI('memory:///archive.zip')
+        with container.open('wb') as zip_handle:
+            with ZipFile(zip_handle, 'w') as fp_zip:
+                fp_zip.writestr('../evil.txt', b'evil')
+                fp_zip.writestr('a/../../../b.txt', b'b')
+                fp_zip.writestr('c/./c.txt', b'c')
+                fp_zip.writestr('.', b'nothing left')
+                fp_zip.writestr('link/d.txt', b'd')
+        outside = URI(self.tmpdir) / 'outside'
+        outside.makedirs()
+        dest = URI(self.tmpdir) / 'dest'
+        dest.makedirs()
+        os.symlink(outside.path, (dest / 'link').path)
+        root = URI('zip://((%s))/' % container.uri)
+        with self.assertRaises(CopyError) as cm:
+            root.extract(dest, workers=2)
+        report = cm.exception.report
+        self.assertEqual(sorted(source.path
+                                for source, _, _ in report.errors),
+                         sorted([(root / '.').path, '/link', '/link/d.txt']))
+        self.assertEqual(os.listdir(outside.path), [])
+        self.assertEqual(os.listdir(self.tmpdir), ['dest', 'outside'])
+        self.assertEqual(self.extracted(dest),
+                         {'evil.txt': b'evil', 'a/b.txt': b'b',
+                          'c/c.txt': b'c'})
+        self.assertEqual(report.files, 3)
+
+
+    def test_extract_collects_errors(self):
+        root = self.archive(URI('memory:///archive.zip'))
+        dest = URI(self.tmpdir) / 'dest'
+        # a directory where a file has to go
+        (dest / 'e.txt').makedirs()
+        with self.assertRaises(CopyError) as cm:
+            root.extract(dest, workers=2)
+        report = cm.exception.report
+        self.assertEqual([(source.path, target.path)
+                          for source, target, _ in report.errors],
+                         [('/e.txt', (dest / 'e.txt').path)])
+        self.assertEqual(report.files, 3)